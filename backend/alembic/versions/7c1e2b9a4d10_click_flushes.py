@@ -0,0 +1,30 @@
+"""click_flushes
+
+Revision ID: 7c1e2b9a4d10
+Revises: 4089dc34b119
+Create Date: 2026-01-12 10:14:32.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e2b9a4d10'
+down_revision = '4089dc34b119'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_flushes',
+    sa.Column('batch_id', sa.String(), nullable=False),
+    sa.Column('flushed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+    op.create_index(op.f('ix_click_flushes_flushed_at'), 'click_flushes', ['flushed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_click_flushes_flushed_at'), table_name='click_flushes')
+    op.drop_table('click_flushes')
@@ -0,0 +1,33 @@
+"""url hash for dedup
+
+Revision ID: a8d2e6f04c19
+Revises: f1c9a3d5b7e2
+Create Date: 2026-02-24 10:12:44.318920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d2e6f04c19'
+down_revision = 'f1c9a3d5b7e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('urls', sa.Column('url_hash', sa.LargeBinary(length=32), nullable=True))
+
+    # Existing rows stay NULL and are simply never matched; only new links are hashed
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_urls_url_hash', 'urls', ['url_hash'], unique=True,
+            postgresql_where=sa.text('url_hash IS NOT NULL'), postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_urls_url_hash', table_name='urls', postgresql_concurrently=True)
+    op.drop_column('urls', 'url_hash')
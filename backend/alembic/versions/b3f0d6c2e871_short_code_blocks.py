@@ -0,0 +1,28 @@
+"""short_code_blocks sequence
+
+Revision ID: b3f0d6c2e871
+Revises: 7c1e2b9a4d10
+Create Date: 2026-01-19 16:42:08.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f0d6c2e871'
+down_revision = '7c1e2b9a4d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # nextval() is the first id of a block; SequenceBlockAllocator reads the
+    # stride back from the sequence, so later CODE_BLOCK_SIZE changes are harmless
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_blocks', increment=settings.CODE_BLOCK_SIZE)))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_blocks')))
@@ -0,0 +1,36 @@
+"""indexes for link listing
+
+Revision ID: b7e1c04f9a25
+Revises: a8d2e6f04c19
+Create Date: 2026-03-03 09:41:27.905117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1c04f9a25'
+down_revision = 'a8d2e6f04c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Built without blocking writes to the hot table
+    with op.get_context().autocommit_block():
+        op.create_index('ix_urls_created_at_id', 'urls', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_urls_access_count_id', 'urls', ['access_count', 'id'], unique=False, postgresql_concurrently=True)
+        # A bounded prefix: btree entries stay small however long the URL, and
+        # text_pattern_ops makes LIKE 'prefix%' usable under any collation
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_urls_url_prefix '
+            'ON urls (substr(url, 1, 255) text_pattern_ops)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_urls_url_prefix')
+        op.drop_index('ix_urls_access_count_id', table_name='urls', postgresql_concurrently=True)
+        op.drop_index('ix_urls_created_at_id', table_name='urls', postgresql_concurrently=True)
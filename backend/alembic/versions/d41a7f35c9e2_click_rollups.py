@@ -0,0 +1,41 @@
+"""click_rollups
+
+Revision ID: d41a7f35c9e2
+Revises: b3f0d6c2e871
+Create Date: 2026-02-03 11:27:45.902318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7f35c9e2'
+down_revision = 'b3f0d6c2e871'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_rollups',
+    sa.Column('short_code', sa.String(), nullable=False),
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('referrer_host', sa.String(), nullable=False),
+    sa.Column('ua_family', sa.String(length=16), nullable=False),
+    sa.Column('country', sa.String(length=2), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('short_code', 'granularity', 'bucket_start', 'referrer_host', 'ua_family', 'country')
+    )
+    op.create_table('click_stream_offsets',
+    sa.Column('stream', sa.String(), nullable=False),
+    sa.Column('last_id', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('stream')
+    )
+    # The aggregator locks this row, so it has to exist before the first run
+    op.execute("INSERT INTO click_stream_offsets (stream, last_id) VALUES ('{clicks}:events', '0-0')")
+
+
+def downgrade() -> None:
+    op.drop_table('click_stream_offsets')
+    op.drop_table('click_rollups')
@@ -0,0 +1,31 @@
+"""per-link redirect policy
+
+Revision ID: e5b2c8f1a7d3
+Revises: d41a7f35c9e2
+Create Date: 2026-02-10 09:14:52.377120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b2c8f1a7d3'
+down_revision = 'd41a7f35c9e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nullable without defaults: a metadata-only change, no table rewrite
+    op.add_column('urls', sa.Column('redirect_status', sa.SmallInteger(), nullable=True))
+    op.add_column('urls', sa.Column('cache_max_age', sa.Integer(), nullable=True))
+    op.create_check_constraint(
+        'ck_urls_redirect_status', 'urls', 'redirect_status IN (301, 302, 307, 308)'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ck_urls_redirect_status', 'urls', type_='check')
+    op.drop_column('urls', 'cache_max_age')
+    op.drop_column('urls', 'redirect_status')
@@ -0,0 +1,60 @@
+"""link expiry and click limits
+
+Revision ID: f1c9a3d5b7e2
+Revises: e5b2c8f1a7d3
+Create Date: 2026-02-17 15:32:10.648213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c9a3d5b7e2'
+down_revision = 'e5b2c8f1a7d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('urls', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('urls', sa.Column('max_clicks', sa.Integer(), nullable=True))
+
+    op.create_table(
+        'urls_archive',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('short_code', sa.String(), nullable=False),
+        sa.Column('access_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('redirect_status', sa.SmallInteger(), nullable=True),
+        sa.Column('cache_max_age', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('max_clicks', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_urls_archive_short_code'), 'urls_archive', ['short_code'], unique=False)
+
+    # Built without blocking writes to the hot table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_urls_expires_at', 'urls', ['expires_at'], unique=False,
+            postgresql_where=sa.text('expires_at IS NOT NULL'), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_urls_max_clicks', 'urls', ['max_clicks'], unique=False,
+            postgresql_where=sa.text('max_clicks IS NOT NULL'), postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_urls_max_clicks', table_name='urls', postgresql_concurrently=True)
+        op.drop_index('ix_urls_expires_at', table_name='urls', postgresql_concurrently=True)
+    op.drop_index(op.f('ix_urls_archive_short_code'), table_name='urls_archive')
+    op.drop_table('urls_archive')
+    op.drop_column('urls', 'max_clicks')
+    op.drop_column('urls', 'expires_at')
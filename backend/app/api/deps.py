@@ -1,13 +1,57 @@
-from fastapi import Depends
+from fastapi import Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from redis.asyncio import Redis
 
 from app.db.session import get_db
-from app.core.redis import get_redis_client
+from app.db.replicas import get_read_db
+from app.core.config import settings
+from app.core.rate_limit import Rate, RateLimitResult
+from app.services.storage import Storage, get_storage
 from app.services.url_service import URLService
 
 async def get_url_service(
     db: AsyncSession = Depends(get_db),
-    redis: Redis = Depends(get_redis_client)
+    read_db: AsyncSession | None = Depends(get_read_db),
+    storage: Storage = Depends(get_storage)
 ) -> URLService:
-    return URLService(db, redis)
+    return URLService(db, storage, read_db)
+
+
+class RateLimit:
+    """
+    Per-route limit from settings.RATE_LIMITS, keyed by API key when the
+    caller sends a known X-API-Key, otherwise by client IP. Raises 429 when
+    exceeded. The X-RateLimit-* headers are added to the response, and also
+    returned for handlers that build their own Response object.
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+
+    async def __call__(
+        self,
+        request: Request,
+        response: Response,
+        storage: Storage = Depends(get_storage)
+    ) -> dict[str, str]:
+        result = await self.check(
+            storage, request.headers.get("X-API-Key"), request.client.host if request.client else None
+        )
+        if result is None:
+            return {}
+        if not result.allowed:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=result.headers())
+        headers = result.headers()
+        response.headers.update(headers)
+        return headers
+
+    async def check(self, storage: Storage, api_key: str | None, client_host: str | None) -> RateLimitResult | None:
+        """Consume one token; None when the route is unlimited or the limiter is unavailable."""
+        if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+            limit = settings.RATE_LIMIT_API_KEYS[api_key]
+            identity = f"key:{api_key}"
+        else:
+            limit = settings.RATE_LIMITS.get(self.route)
+            identity = client_host or "unknown"
+        if not limit:
+            return None
+        return await storage.rate_limit(f"rl:{self.route}:{identity}", Rate.parse(limit))
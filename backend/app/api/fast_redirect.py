@@ -0,0 +1,131 @@
+import logging
+from urllib.parse import quote
+
+from app.api.deps import RateLimit
+from app.core.config import settings
+from app.db.replicas import read_router
+from app.db.session import AsyncSessionLocal
+from app.services.cached_link import MISSING, CachedLink
+from app.services.click_buffer import click_buffer
+from app.services.redirect_policy import not_modified, redirect_headers
+from app.services.storage import Storage, get_storage
+from app.services.url_service import URLService
+
+logger = logging.getLogger(__name__)
+
+
+class _Route:
+    # Stands in for the FastAPI route in scope["route"], so request metrics
+    # label fast-path redirects the same as redirect_to_url
+    path = "/{short_code}"
+
+
+_ROUTE = _Route()
+_EMPTY_BODY_HEADERS = [(b"content-length", b"0")]
+_JSON_HEADERS = [(b"content-type", b"application/json")]
+_NOT_FOUND_BODY = b'{"detail":"URL not found"}'
+_GONE_BODY = b'{"detail":"URL has expired"}'
+_RATE_LIMITED_BODY = b'{"detail":"Rate limit exceeded"}'
+_SERVER_ERROR_BODY = b'{"detail":"Internal Server Error"}'
+# Same characters RedirectResponse leaves unescaped in Location
+_LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;"
+
+
+class FastRedirectMiddleware:
+    """
+    Serves `GET /{short_code}` without FastAPI routing, dependency injection
+    or a Response object: rate limit check, cache lookup and a 301 written
+    straight to `send`. A DB session and URLService are only created when
+    both cache tiers miss, and the click goes into the per-worker
+    ClickBuffer. Behaviour (status codes, bodies, caching and rate limit
+    headers) matches redirect_to_url, which still handles the path when
+    REDIRECT_FAST_PATH is off. Single-segment paths that belong to other
+    routes (/health, /metrics, /docs, ...) are passed through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.rate_limit = RateLimit("redirect")
+        self.country_header = settings.CLICK_COUNTRY_HEADER.lower().encode()
+        self._reserved: frozenset[str] | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        short_code = scope["path"][1:]
+        if not short_code or "/" in short_code:
+            await self.app(scope, receive, send)
+            return
+        if self._reserved is None:
+            paths = (getattr(route, "path", "") for route in scope["app"].routes)
+            self._reserved = frozenset(path[1:] for path in paths if path.count("/") == 1 and "{" not in path)
+        if short_code in self._reserved:
+            await self.app(scope, receive, send)
+            return
+
+        scope["route"] = _ROUTE
+        try:
+            await self._redirect(scope, short_code, send)
+        except Exception:
+            logger.exception("Unhandled error on GET %s", scope["path"])
+            await self._respond(send, 500, _JSON_HEADERS, _SERVER_ERROR_BODY)
+
+    async def _redirect(self, scope, short_code: str, send) -> None:
+        api_key = referrer = user_agent = country = if_none_match = if_modified_since = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value.decode("latin-1")
+            elif name == b"referer":
+                referrer = value.decode("latin-1")
+            elif name == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif name == self.country_header:
+                country = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+            elif name == b"if-modified-since":
+                if_modified_since = value.decode("latin-1")
+
+        storage = await get_storage()
+        client = scope.get("client")
+        limited = await self.rate_limit.check(storage, api_key, client[0] if client else None)
+        rate_headers = [(k.lower().encode(), v.encode()) for k, v in limited.headers().items()] if limited else []
+        if limited is not None and not limited.allowed:
+            await self._respond(send, 429, _JSON_HEADERS + rate_headers, _RATE_LIMITED_BODY)
+            return
+
+        cached = await storage.cache.get(short_code)
+        if cached is None:
+            link = await self._load(short_code, storage)
+        else:
+            link = None if cached == MISSING else CachedLink.decode(cached)
+        if link is None:
+            await self._respond(send, 404, _JSON_HEADERS + rate_headers, _NOT_FOUND_BODY)
+            return
+        if not await storage.admit_click(short_code, link):
+            await self._respond(send, 410, _JSON_HEADERS + rate_headers, _GONE_BODY)
+            return
+
+        status, policy_headers = redirect_headers(link)
+        if not_modified(link, if_none_match, if_modified_since):
+            status = 304
+        location = (b"location", quote(link.url, safe=_LOCATION_SAFE).encode("latin-1"))
+        await self._respond(send, status, [location, *_EMPTY_BODY_HEADERS, *policy_headers, *rate_headers], b"")
+        click_buffer.add(short_code, referrer or "", user_agent or "", country or "")
+
+    async def _load(self, short_code: str, storage: Storage) -> CachedLink | None:
+        async with AsyncSessionLocal() as db:
+            read_db = read_router.session() if read_router.replicas else None
+            try:
+                return await URLService(db, storage, read_db).get_uncached_link(short_code)
+            finally:
+                if read_db is not None:
+                    await read_db.close()
+
+    @staticmethod
+    async def _respond(send, status: int, headers: list, body: bytes) -> None:
+        if body:
+            headers = [*headers, (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
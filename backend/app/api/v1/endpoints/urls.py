@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
-from fastapi.responses import RedirectResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
 
-from app.schemas.url import URLCreate, URLResponse, URLStats, URLUpdate
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from pydantic import ValidationError
+
+from app.schemas.url import (
+    URLCreate, URLPage, URLResponse, URLStats, URLUpdate, URLBulkResult,
+    URLResolveRequest, URLResolveResponse, URLResolveResult, to_utc,
+)
 from app.services.url_service import URLService
-from app.api.deps import get_url_service
+from app.api.deps import get_url_service, RateLimit
+from app.core.config import settings
+from app.db.replicas import read_router
+from app.db.session import AsyncSessionLocal
+from app.services.click_events import GRANULARITIES
+from app.services.link_transfer import Format, export_links, gzip_chunks, import_links, iter_lines
+from app.services.storage import Storage, get_storage
 
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Default look-back per granularity, and the most buckets one request may span
+STATS_DEFAULT_RANGE = {"minute": timedelta(hours=1), "hour": timedelta(days=1), "day": timedelta(days=30)}
+STATS_MAX_BUCKETS = 1500
+LIST_MAX_LIMIT = 200
 
-@router.post("/shorten", response_model=URLResponse, status_code=201)
+@router.post("/shorten", response_model=URLResponse, status_code=201, dependencies=[Depends(RateLimit("create"))])
 async def shorten_url(
     url_in: URLCreate,
     service: URLService = Depends(get_url_service)
@@ -21,7 +38,198 @@ async def shorten_url(
     """
     return await service.create_short_url(url_in)
 
-@router.get("/shorten/{short_code}", response_model=URLResponse)
+@router.get("/shorten", response_model=URLPage, dependencies=[Depends(RateLimit("read"))])
+async def list_urls(
+    sort: Literal["created_at", "access_count"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(50, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    min_clicks: Optional[int] = Query(None, ge=0),
+    url_prefix: Optional[str] = Query(None, max_length=2048),
+    service: URLService = Depends(get_url_service)
+):
+    """
+    List links, newest (or most clicked) first.
+    Pages are cursor based: pass `next_cursor` from a response as `cursor`,
+    keeping the same sort, order and filters.
+    """
+    return await service.list_urls(
+        sort, order == "desc", limit, cursor, created_from, created_to, min_clicks, url_prefix
+    )
+
+class _DuplexStreamingResponse(StreamingResponse):
+    # The body iterator keeps reading the request while we respond, so skip
+    # StreamingResponse's disconnect listener, which would consume receive().
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[bytes]:
+    # Split the body into lines as it arrives instead of buffering it whole
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def _iter_list(items: list) -> AsyncIterator[object]:
+    for item in items:
+        yield item
+
+async def _create_chunk(service: URLService, chunk: list[tuple[int, URLCreate]]) -> list[str]:
+    try:
+        rows = await service.create_short_urls_bulk([url_in for _, url_in in chunk])
+    except HTTPException as exc:
+        return [URLBulkResult(index=index, error=exc.detail).model_dump_json() for index, _ in chunk]
+    return [
+        URLBulkResult(index=index, result=URLResponse.model_validate(row)).model_dump_json()
+        for (index, _), row in zip(chunk, rows)
+    ]
+
+async def _bulk_results(items: AsyncIterator[object], storage: Storage) -> AsyncIterator[str]:
+    # The stream outlives the request's dependencies, so it owns its session
+    async with AsyncSessionLocal() as db:
+        service = URLService(db, storage)
+        chunk: list[tuple[int, URLCreate]] = []
+        index = 0
+        async for item in items:
+            if index >= settings.BULK_MAX_BATCH_SIZE:
+                yield URLBulkResult(index=index, error="Batch size limit exceeded").model_dump_json() + "\n"
+                break
+            try:
+                if isinstance(item, bytes):
+                    url_in = URLCreate.model_validate_json(item)
+                else:
+                    url_in = URLCreate.model_validate(item)
+            except ValidationError as exc:
+                yield URLBulkResult(index=index, error=str(exc)).model_dump_json() + "\n"
+            else:
+                chunk.append((index, url_in))
+            index += 1
+
+            if len(chunk) >= settings.BULK_INSERT_CHUNK:
+                for line in await _create_chunk(service, chunk):
+                    yield line + "\n"
+                chunk = []
+        if chunk:
+            for line in await _create_chunk(service, chunk):
+                yield line + "\n"
+
+@router.post(
+    "/shorten/bulk",
+    status_code=201,
+    response_class=StreamingResponse,
+    dependencies=[Depends(RateLimit("bulk"))],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": URLCreate.model_json_schema()}},
+                NDJSON_MEDIA_TYPE: {"schema": URLCreate.model_json_schema()},
+            },
+        },
+        "responses": {"201": {"content": {NDJSON_MEDIA_TYPE: {"schema": URLBulkResult.model_json_schema()}}}},
+    },
+)
+async def shorten_urls_bulk(
+    request: Request,
+    storage: Storage = Depends(get_storage)
+):
+    """
+    Create many shortened URLs at once.
+    Accepts a JSON array or an NDJSON stream of `{"url": ...}` objects and
+    streams back one NDJSON result line per item, tagged with its index.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        items = _iter_ndjson(request)
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+        if len(payload) > settings.BULK_MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_BATCH_SIZE} URLs per request")
+        items = _iter_list(payload)
+
+    return _DuplexStreamingResponse(_bulk_results(items, storage), status_code=201, media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/shorten/resolve", response_model=URLResolveResponse, dependencies=[Depends(RateLimit("resolve"))])
+async def resolve_urls(
+    body: URLResolveRequest,
+    service: URLService = Depends(get_url_service)
+):
+    """
+    Resolve many short codes to their URLs in one call.
+    Results follow the request order; a code that does not exist or whose
+    link has expired comes back with `error` set instead of `url`.
+    """
+    if len(body.short_codes) > settings.RESOLVE_MAX_CODES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.RESOLVE_MAX_CODES} codes per request")
+    links = await service.resolve_links(body.short_codes)
+    now_ms = int(time.time() * 1000)
+    results = []
+    for short_code in body.short_codes:
+        link = links.get(short_code)
+        if link is None:
+            results.append(URLResolveResult(short_code=short_code, error="not_found"))
+        elif link.expired(now_ms):
+            results.append(URLResolveResult(short_code=short_code, error="expired"))
+        else:
+            results.append(URLResolveResult(short_code=short_code, url=link.url))
+    return URLResolveResponse(results=results)
+
+async def _export_stream(fmt: Format) -> AsyncIterator[bytes]:
+    async with read_router.session() as db:
+        async for chunk in export_links(db, fmt):
+            yield chunk
+
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(RateLimit("export"))])
+async def export_urls(
+    format: Format = "ndjson",
+    compress: bool = Query(False, alias="gzip")
+):
+    """
+    Stream every link as NDJSON or CSV (the format `/import` accepts).
+    Rows are read through a server-side cursor, so the table is never held in memory.
+    """
+    body = _export_stream(format)
+    filename = f"links.{format}"
+    if compress:
+        body = gzip_chunks(body)
+        filename += ".gz"
+    media_type = "application/gzip" if compress else NDJSON_MEDIA_TYPE if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def _import_progress(request: Request, fmt: Format, storage: Storage) -> AsyncIterator[str]:
+    async with AsyncSessionLocal() as db:
+        async for progress in import_links(db, storage, iter_lines(request.stream()), fmt):
+            yield json.dumps(progress.as_dict()) + "\n"
+
+@router.post("/import", response_class=StreamingResponse, dependencies=[Depends(RateLimit("import"))])
+async def import_urls(
+    request: Request,
+    storage: Storage = Depends(get_storage)
+):
+    """
+    Load links from an export file (NDJSON, or CSV when sent as text/csv; gzip
+    is detected). Existing short codes are skipped. Streams one NDJSON progress
+    line per IMPORT_CHUNK rows; the last line holds the totals.
+    """
+    fmt: Format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    return _DuplexStreamingResponse(_import_progress(request, fmt, storage), media_type=NDJSON_MEDIA_TYPE)
+
+@router.get("/shorten/{short_code}", response_model=URLResponse, dependencies=[Depends(RateLimit("read"))])
 async def get_url_metadata(
     short_code: str,
     service: URLService = Depends(get_url_service)
@@ -34,7 +242,7 @@ async def get_url_metadata(
         raise HTTPException(status_code=404, detail="URL not found")
     return url_obj
 
-@router.put("/shorten/{short_code}", response_model=URLResponse)
+@router.put("/shorten/{short_code}", response_model=URLResponse, dependencies=[Depends(RateLimit("write"))])
 async def update_url(
     short_code: str,
     url_in: URLUpdate,
@@ -45,7 +253,7 @@ async def update_url(
     """
     return await service.update_url(short_code, url_in)
 
-@router.delete("/shorten/{short_code}", status_code=204)
+@router.delete("/shorten/{short_code}", status_code=204, dependencies=[Depends(RateLimit("write"))])
 async def delete_url(
     short_code: str,
     service: URLService = Depends(get_url_service)
@@ -56,18 +264,35 @@ async def delete_url(
     await service.delete_url(short_code)
     return Response(status_code=204)
 
-@router.get("/shorten/{short_code}/stats", response_model=URLStats)
+@router.get("/shorten/{short_code}/stats", response_model=URLStats, dependencies=[Depends(RateLimit("read"))])
 async def get_url_stats(
     short_code: str,
+    granularity: Optional[Literal["minute", "hour", "day"]] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
     service: URLService = Depends(get_url_service)
 ):
     """
     Get statistics for a shortened URL.
+
+    With `granularity` the response also carries click counts per bucket in
+    [from, to) and referrer / user agent / country totals for that range.
     """
-    url_obj = await service.get_url_details(short_code)
-    if not url_obj:
+    if granularity is not None:
+        # Naive bounds are UTC, like stored timestamps; comparing them to aware ones would raise
+        try:
+            end = to_utc(end) or datetime.now(timezone.utc)
+            start = to_utc(start) or end - STATS_DEFAULT_RANGE[granularity]
+        except OverflowError:
+            raise HTTPException(status_code=400, detail="'from' or 'to' is out of range")
+        if start >= end:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+        if (end - start).total_seconds() / GRANULARITIES[granularity] > STATS_MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail="Time range too large for this granularity")
+    stats = await service.get_url_stats(short_code, granularity, start, end)
+    if not stats:
         raise HTTPException(status_code=404, detail="URL not found")
-    return url_obj
+    return stats
 
 # Redirect Endpoint
 # We put this at the root router usually, but here we can define it.
@@ -0,0 +1,150 @@
+"""
+Operational commands: `python -m app.cli <command> [options]`.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+
+async def _warmup(args: argparse.Namespace) -> None:
+    from app.db.replicas import read_router
+    from app.services.cache_warmup import warm_cache
+    from app.services.storage import get_storage
+
+    _require_server_backend("warmup", "CACHE_WARMUP_ON_STARTUP")
+    async with read_router.session() as db:
+        loaded = await warm_cache(db, await get_storage(), args.top)
+    print(f"Warmed redirect cache with {loaded} links")
+
+
+async def _export(args: argparse.Namespace) -> None:
+    from app.db.replicas import read_router
+    from app.services.link_transfer import export_links, gzip_chunks
+
+    async def counted(chunks):
+        nonlocal rows
+        async for chunk in chunks:
+            rows += chunk.count(b"\n")
+            yield chunk
+
+    rows, started = 0, time.monotonic()
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        async with read_router.session() as db:
+            chunks = counted(export_links(db, args.format))
+            if args.gzip:
+                chunks = gzip_chunks(chunks)
+            async for chunk in chunks:
+                out.write(chunk)
+                _report(f"exported {rows} rows", rows, started)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(file=sys.stderr)
+
+
+async def _import(args: argparse.Namespace) -> None:
+    from app.db.session import AsyncSessionLocal
+    from app.services.link_transfer import import_links, iter_lines
+    from app.services.storage import get_storage
+
+    async def read_file(handle):
+        while chunk := handle.read(1 << 16):
+            yield chunk
+
+    _require_server_backend("import", "POST /api/v1/import")
+    fmt = args.format or ("csv" if args.path.removesuffix(".gz").endswith(".csv") else "ndjson")
+    storage = await get_storage()
+    handle = open(args.path, "rb") if args.path != "-" else sys.stdin.buffer
+    try:
+        async with AsyncSessionLocal() as db:
+            async for progress in import_links(db, storage, iter_lines(read_file(handle)), fmt):
+                _report(
+                    f"read {progress.read}, imported {progress.imported}, "
+                    f"skipped {progress.skipped}, invalid {progress.invalid}",
+                    progress.read, progress.started,
+                )
+    finally:
+        if handle is not sys.stdin.buffer:
+            handle.close()
+    print(file=sys.stderr)
+
+
+async def _snapshot(args: argparse.Namespace) -> None:
+    from app.db.replicas import read_router
+    from app.services.link_snapshot import Snapshot, delta_path, write_delta, write_snapshot
+
+    started = time.monotonic()
+    async with read_router.session() as db:
+        if not args.delta:
+            count = await write_snapshot(db, args.output)
+            print(f"Wrote {count} links to {args.output} in {time.monotonic() - started:.1f}s", file=sys.stderr)
+            return
+        base = Snapshot(args.output)
+        try:
+            changed, removed = await write_delta(db, base, delta_path(args.output))
+        finally:
+            base.close()
+    print(
+        f"Wrote {changed} changed and {removed} removed links to {delta_path(args.output)} "
+        f"in {time.monotonic() - started:.1f}s ({os.path.getsize(delta_path(args.output))} bytes)",
+        file=sys.stderr,
+    )
+
+
+def _require_server_backend(command: str, instead: str) -> None:
+    # The embedded backend's caches live in the server process, which a CLI process cannot reach
+    if settings.STORAGE_BACKEND == "embedded":
+        sys.exit(f"`{command}` needs STORAGE_BACKEND=server; with the embedded backend use {instead}")
+
+
+def _report(message: str, rows: int, started: float) -> None:
+    rate = rows / max(time.monotonic() - started, 1e-9)
+    print(f"\r{message} ({rate:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    warmup = commands.add_parser("warmup", help="Preload the most-clicked links into Redis")
+    warmup.add_argument("--top", type=int, default=settings.CACHE_WARMUP_TOP_N)
+    warmup.set_defaults(handler=_warmup)
+
+    export = commands.add_parser("export", help="Stream every link to a file (NDJSON or CSV)")
+    export.add_argument("-o", "--output", default="-", help="file to write, - for stdout")
+    export.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export.add_argument("--gzip", action="store_true")
+    export.set_defaults(handler=_export)
+
+    import_ = commands.add_parser("import", help="Load links from an export file, skipping existing codes")
+    import_.add_argument("path", help="NDJSON or CSV file, optionally gzipped; - for stdin")
+    import_.add_argument("--format", choices=["ndjson", "csv"], help="default: from the file extension")
+    import_.set_defaults(handler=_import)
+
+    snapshot = commands.add_parser("snapshot", help="Compile the links into a snapshot file for edge nodes")
+    snapshot.add_argument("-o", "--output", default=settings.SNAPSHOT_PATH, help="snapshot file")
+    snapshot.add_argument(
+        "--delta", action="store_true",
+        help="write OUTPUT.delta with the changes since the snapshot at OUTPUT instead of a new snapshot",
+    )
+    snapshot.set_defaults(handler=_snapshot)
+
+    args = parser.parse_args()
+
+    async def run() -> None:
+        try:
+            await args.handler(args)
+        finally:
+            await redis_client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
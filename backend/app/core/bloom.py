@@ -0,0 +1,48 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Plain bit-array Bloom filter using double hashing over one blake2b digest.
+    No false negatives; false positives at roughly `error_rate` once `capacity`
+    items have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.bits_set = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        bits = self.bits
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                self.bits_set += 1
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+    @property
+    def estimated_false_positive_rate(self) -> float:
+        # Probability that all k probed bits are set, given the current fill ratio
+        return (self.bits_set / self.num_bits) ** self.num_hashes
@@ -0,0 +1,216 @@
+"""
+Where the short:* redirect cache lives (CACHE_REDIS_MODE).
+
+"primary" keeps it on the main Redis. "cluster" uses a Redis Cluster client,
+which routes each key to its slot owner and splits pipelines per node.
+"sharded" spreads codes over standalone nodes with a consistent-hash ring,
+so adding or removing one of N nodes remaps only about 1/N of the codes.
+
+A shard that errors is skipped for CACHE_SHARD_RETRY_AFTER seconds: reads
+treat it as a miss (the caller falls back to the database) and writes are
+remembered, then deleted when the shard answers again so it never serves a
+value that was changed or deleted while it was unreachable.
+
+Links are cached either as one `short:{code}` string key each or as fields of
+`shortb:{n}` hash buckets (CACHE_ENCODING); both are routed by short code, so
+a code's string key and bucket field always sit on the same shard.
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+import zlib
+from collections import defaultdict
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from redis.asyncio import Redis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import CACHE_SHARD_ERRORS, redis_pools
+from app.core.redis import create_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# What an unreachable or overloaded shard raises
+SHARD_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+STRING_PREFIX = "short:"
+BUCKET_PREFIX = "shortb:"
+
+
+def string_key(short_code: str) -> str:
+    return f"{STRING_PREFIX}{short_code}"
+
+
+def bucket_key(short_code: str) -> str:
+    return f"{BUCKET_PREFIX}{zlib.crc32(short_code.encode()) % settings.CACHE_HASH_BUCKETS}"
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing over shard names, with `vnodes` points per shard to even out the spread."""
+
+    def __init__(self, names: list[str], vnodes: int):
+        points = sorted((_point(f"{name}#{i}"), index) for index, name in enumerate(names) for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [owner for _, owner in points]
+
+    def owner(self, key: str) -> int:
+        return self._owners[bisect.bisect(self._points, _point(key)) % len(self._points)]
+
+
+class CacheShard:
+    def __init__(self, name: str, client: Redis | RedisCluster, owned: bool):
+        self.name = name
+        self.client = client
+        self.owned = owned  # False for the shared primary client
+        self.down_until = 0.0
+        # Codes written while unreachable; deleted on recovery. None: too many, clear the whole cache
+        self.dropped: set[str] | None = set()
+
+    @property
+    def pool(self):
+        # For the Redis pool metrics; a cluster client has one pool per node
+        return getattr(self.client, "connection_pool", None)
+
+    @property
+    def cluster(self) -> bool:
+        return isinstance(self.client, RedisCluster)
+
+    def pipeline(self):
+        if self.cluster:
+            return self.client.pipeline()
+        return self.client.pipeline(transaction=False)
+
+
+class CacheStore:
+    def __init__(self):
+        self.shards: list[CacheShard] = []
+        self._ring: HashRing | None = None
+        self._connecting = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        async with self._connecting:
+            if not self.shards:
+                await self._open()
+
+    async def _open(self) -> None:
+        mode = settings.CACHE_REDIS_MODE
+        urls = settings.CACHE_REDIS_URLS
+        if mode == "primary":
+            self.shards = [CacheShard("primary", await get_redis_client(), owned=False)]
+            return
+        if not urls:
+            raise RuntimeError(f"CACHE_REDIS_MODE={mode} needs CACHE_REDIS_URLS")
+        if mode == "cluster":
+            seeds = [urlsplit(url) for url in urls[1:]]
+            client = RedisCluster.from_url(
+                urls[0],
+                startup_nodes=[ClusterNode(seed.hostname, seed.port or 6379) for seed in seeds],
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                decode_responses=True,
+            )
+            self.shards = [CacheShard("cluster", client, owned=True)]
+            return
+        # Named by host:port/db, not list position, so reordering the setting moves no keys
+        names = [f"{parts.hostname}:{parts.port or 6379}{parts.path}" for parts in map(urlsplit, urls)]
+        self.shards = [CacheShard(name, create_client(url), owned=True) for name, url in zip(names, urls)]
+        self._ring = HashRing(names, settings.CACHE_SHARD_VNODES)
+        for shard in self.shards:
+            redis_pools.add(f"cache:{shard.name}", shard)
+
+    async def shard_for(self, short_code: str) -> CacheShard:
+        if not self.shards:
+            await self._connect()
+        return self.shards[self._ring.owner(short_code)] if self._ring else self.shards[0]
+
+    async def route(self, short_codes: Iterable[str]) -> dict[CacheShard, list[str]]:
+        if not self.shards:
+            await self._connect()
+        if self._ring is None:
+            return {self.shards[0]: list(short_codes)}
+        groups: dict[CacheShard, list[str]] = defaultdict(list)
+        for short_code in short_codes:
+            groups[self.shards[self._ring.owner(short_code)]].append(short_code)
+        return groups
+
+    async def available(self, shard: CacheShard) -> bool:
+        """False while the shard is marked down; the first call after the pause tries to bring it back."""
+        if not shard.down_until:
+            return True
+        if time.monotonic() < shard.down_until:
+            return False
+        # Keep other callers off the shard while this one probes it
+        shard.down_until = time.monotonic() + settings.CACHE_SHARD_RETRY_AFTER
+        try:
+            await self._forget_dropped(shard)
+        except SHARD_ERRORS as exc:
+            CACHE_SHARD_ERRORS.labels(shard.name).inc()
+            logger.warning("Cache shard %s still unreachable: %s", shard.name, exc)
+            return False
+        shard.down_until = 0.0
+        shard.dropped = set()
+        logger.info("Cache shard %s is back", shard.name)
+        return True
+
+    def mark_down(self, shard: CacheShard, exc: BaseException, dropped_codes: Iterable[str] = ()) -> None:
+        CACHE_SHARD_ERRORS.labels(shard.name).inc()
+        if not shard.down_until:
+            logger.warning("Cache shard %s unreachable, reading from the database: %s", shard.name, exc)
+        shard.down_until = time.monotonic() + settings.CACHE_SHARD_RETRY_AFTER
+        self.drop(shard, dropped_codes)
+
+    def drop(self, shard: CacheShard, short_codes: Iterable[str]) -> None:
+        """Remember writes that never reached the shard."""
+        if shard.dropped is None:
+            return
+        shard.dropped.update(short_codes)
+        if len(shard.dropped) > settings.CACHE_SHARD_MAX_DROPPED:
+            shard.dropped = None
+
+    async def _forget_dropped(self, shard: CacheShard) -> None:
+        # Both layouts are cleared, whichever CACHE_ENCODING wrote them
+        if shard.dropped is None:
+            for prefix in (STRING_PREFIX, BUCKET_PREFIX):
+                keys = []
+                async for key in shard.client.scan_iter(match=f"{prefix}*", count=1000):
+                    keys.append(key)
+                    if len(keys) >= 1000:
+                        await self._unlink(shard, keys)
+                        keys = []
+                await self._unlink(shard, keys)
+            return
+        dropped = list(shard.dropped)
+        for start in range(0, len(dropped), 1000):
+            async with shard.pipeline() as pipe:
+                for short_code in dropped[start:start + 1000]:
+                    pipe.unlink(string_key(short_code))
+                    pipe.hdel(bucket_key(short_code), short_code)
+                await pipe.execute()
+
+    @staticmethod
+    async def _unlink(shard: CacheShard, keys: list[str]) -> None:
+        # One command per key: a cluster pipeline splits them by slot
+        if keys:
+            async with shard.pipeline() as pipe:
+                for key in keys:
+                    pipe.unlink(key)
+                await pipe.execute()
+
+    async def close(self) -> None:
+        for shard in self.shards:
+            if shard.owned:
+                await shard.client.aclose()
+        self.shards = []
+        self._ring = None
+
+
+cache_store = CacheStore()
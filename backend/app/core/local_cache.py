@@ -0,0 +1,83 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LocalCache:
+    """
+    Per-process LRU cache with a TTL, bounded both by entry count and by an
+    approximate byte budget. Not thread-safe; it is only touched from the
+    event loop.
+
+    `generation` increases on every invalidation. Callers that fill the cache
+    from a slower tier read it before the fetch and pass it to `set`, so a
+    value fetched before an invalidation arrived is never stored after it.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float, int]] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (value, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self.generation += 1
+        if key in self._data:
+            self._drop(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.invalidations += len(self._data)
+        self._data.clear()
+        self._bytes = 0
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
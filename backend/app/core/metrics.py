@@ -0,0 +1,250 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+
+from app.core.local_cache import LocalCache
+
+# Latency buckets reach down to 0.5ms: cache hits are sub-millisecond
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUESTS = Counter("http_requests", "Requests handled", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the response was sent", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+
+# Steps inside URLService; the children are bound once here so the hot path only observes
+SERVICE_LATENCY = Histogram(
+    "url_service_operation_seconds", "Time spent in URLService steps", ["operation"], buckets=LATENCY_BUCKETS
+)
+REDIS_GET_TIME = SERVICE_LATENCY.labels("redis_get")
+DB_FALLBACK_TIME = SERVICE_LATENCY.labels("db_fallback")
+CACHE_FILL_TIME = SERVICE_LATENCY.labels("cache_fill")
+COMMIT_TIME = SERVICE_LATENCY.labels("commit")
+
+# Redis short:* lookups (after an L1 miss); hit ratio = hit / (hit + negative + miss)
+LINK_CACHE_LOOKUPS = Counter("link_cache_lookups", "Redis short:* lookups by outcome", ["result"])
+LINK_CACHE_HIT = LINK_CACHE_LOOKUPS.labels("hit")
+LINK_CACHE_NEGATIVE = LINK_CACHE_LOOKUPS.labels("negative")
+LINK_CACHE_MISS = LINK_CACHE_LOOKUPS.labels("miss")
+# Failed calls per cache shard (see app/core/cache_store.py); the shard is then skipped for a while
+CACHE_SHARD_ERRORS = Counter("cache_shard_errors", "Failed calls to a redirect cache shard", ["shard"])
+
+CLICK_TASKS_PENDING = Gauge(
+    "click_tasks_pending", "Click recordings scheduled as background tasks and not yet finished"
+)
+CLICK_BUFFER_PENDING = Gauge("click_buffer_pending", "Fast-path clicks buffered in this worker, not yet handed to storage")
+# Edge nodes (app/edge.py): 0 for the delta when none is applied
+LINK_SNAPSHOT_CREATED = Gauge(
+    "link_snapshot_created_seconds", "Build time of the snapshot files this worker serves", ["file"]
+)
+
+_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+class MetricsMiddleware:
+    """
+    Per-route request count and latency, labelled with the route template
+    (e.g. /{short_code}) rather than the raw path. Label children are looked
+    up once per (method, route, status) and reused afterwards.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._children: dict[tuple[str, str, int], tuple] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+            key = (method, path, status)
+            children = self._children.get(key)
+            if children is None:
+                children = self._children[key] = (
+                    HTTP_REQUESTS.labels(method, path, str(status)),
+                    HTTP_LATENCY.labels(method, path),
+                )
+            children[0].inc()
+            children[1].observe(time.perf_counter() - started)
+
+
+class LocalCacheCollector:
+    """Reads LocalCache counters at scrape time, so lookups pay nothing for metrics."""
+
+    def __init__(self, name: str, cache: LocalCache):
+        self.name = name
+        self.cache = cache
+
+    def collect(self):
+        labels = [self.name]
+        for metric, doc, value in (
+            ("l1_cache_hits", "In-process cache hits", self.cache.hits),
+            ("l1_cache_misses", "In-process cache misses", self.cache.misses),
+            ("l1_cache_evictions", "Entries evicted by the size or memory cap", self.cache.evictions),
+            ("l1_cache_expirations", "Entries dropped because their TTL passed", self.cache.expirations),
+            ("l1_cache_invalidations", "Entries dropped by invalidation messages", self.cache.invalidations),
+        ):
+            family = CounterMetricFamily(metric, doc, labels=["cache"])
+            family.add_metric(labels, value)
+            yield family
+
+        entries = GaugeMetricFamily("l1_cache_entries", "Entries currently held", labels=["cache"])
+        entries.add_metric(labels, len(self.cache))
+        yield entries
+        size = GaugeMetricFamily("l1_cache_bytes", "Approximate memory held by entries", labels=["cache"])
+        size.add_metric(labels, self.cache.size_bytes)
+        yield size
+
+
+class CodeFilterCollector:
+    """Bloom filter size and false positive rates for the short code filter."""
+
+    def __init__(self, code_filter):
+        self.code_filter = code_filter
+
+    def collect(self):
+        code_filter = self.code_filter
+        bloom = code_filter.bloom
+
+        ready = GaugeMetricFamily("code_filter_ready", "1 once the Bloom filter has been built")
+        ready.add_metric([], 1 if bloom is not None else 0)
+        yield ready
+        rejected = CounterMetricFamily("code_filter_rejected", "Lookups rejected without a DB query")
+        rejected.add_metric([], code_filter.rejected)
+        yield rejected
+        if bloom is None:
+            return
+
+        for metric, doc, value in (
+            ("code_filter_bytes", "Size of the Bloom filter bit array", bloom.size_bytes),
+            ("code_filter_items", "Codes added since the last rebuild", bloom.count),
+            ("code_filter_capacity", "Codes the filter was sized for", bloom.capacity),
+            ("code_filter_hashes", "Hash functions per lookup", bloom.num_hashes),
+            ("code_filter_estimated_fpr", "False positive rate estimated from the fill ratio", bloom.estimated_false_positive_rate),
+            ("code_filter_observed_fpr", "Share of filter hits that missed in the DB since the last rebuild",
+             code_filter.false_positives / code_filter.db_lookups if code_filter.db_lookups else 0.0),
+        ):
+            family = GaugeMetricFamily(metric, doc)
+            family.add_metric([], value)
+            yield family
+
+
+class _PoolStats:
+    def __init__(self, pool):
+        self.pool = pool
+        self.checkouts = 0
+        # Checkouts that left no idle connection and no overflow headroom:
+        # the next caller has to wait up to DB_POOL_TIMEOUT.
+        self.saturated = 0
+        event.listen(pool, "checkout", self._on_checkout)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        if self.pool.checkedin() == 0 and self.pool.overflow() >= self.pool._max_overflow:
+            self.saturated += 1
+
+
+class SQLAlchemyPoolCollector:
+    """Connection pool state of every registered async engine, read at scrape time."""
+
+    def __init__(self):
+        self.pools: dict[str, _PoolStats] = {}
+
+    def add(self, name: str, engine) -> None:
+        self.pools[name] = _PoolStats(engine.sync_engine.pool)
+
+    def collect(self):
+        gauges = [
+            GaugeMetricFamily("db_pool_size", "Configured persistent connections", labels=["pool"]),
+            GaugeMetricFamily("db_pool_checked_out", "Connections currently in use", labels=["pool"]),
+            GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["pool"]),
+            GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=["pool"]),
+        ]
+        checkouts = CounterMetricFamily("db_pool_checkouts", "Connection checkouts", labels=["pool"])
+        saturated = CounterMetricFamily(
+            "db_pool_saturated_checkouts", "Checkouts that exhausted the pool and overflow", labels=["pool"]
+        )
+        for name, stats in self.pools.items():
+            pool = stats.pool
+            for family, value in zip(gauges, (pool.size(), pool.checkedout(), pool.checkedin(), max(pool.overflow(), 0))):
+                family.add_metric([name], value)
+            checkouts.add_metric([name], stats.checkouts)
+            saturated.add_metric([name], stats.saturated)
+        yield from gauges
+        yield checkouts
+        yield saturated
+
+
+class RedisPoolCollector:
+    """Connection pool state of every registered (lazily connected) Redis client."""
+
+    def __init__(self):
+        self.clients: dict[str, object] = {}
+
+    def add(self, name: str, client) -> None:
+        self.clients[name] = client
+
+    def collect(self):
+        gauges = [
+            GaugeMetricFamily("redis_pool_max_connections", "Configured connection cap", labels=["pool"]),
+            GaugeMetricFamily("redis_pool_in_use", "Connections currently in use", labels=["pool"]),
+            GaugeMetricFamily("redis_pool_available", "Idle connections in the pool", labels=["pool"]),
+        ]
+        for name, client in self.clients.items():
+            pool = client.pool
+            if pool is None:
+                continue
+            values = (
+                pool.max_connections,
+                len(getattr(pool, "_in_use_connections", ())),
+                len(getattr(pool, "_available_connections", ())),
+            )
+            for family, value in zip(gauges, values):
+                family.add_metric([name], value)
+        yield from gauges
+
+
+class ReplicaCollector:
+    """Health and replication lag of the read replicas."""
+
+    def __init__(self, router):
+        self.router = router
+
+    def collect(self):
+        healthy = GaugeMetricFamily("db_replica_healthy", "1 if reads are routed to the replica", labels=["replica"])
+        lag = GaugeMetricFamily("db_replica_lag_seconds", "Replication lag at the last check", labels=["replica"])
+        for replica in self.router.replicas:
+            healthy.add_metric([replica.name], 1 if replica.healthy else 0)
+            if replica.lag is not None:
+                lag.add_metric([replica.name], replica.lag)
+        yield healthy
+        yield lag
+
+
+db_pools = SQLAlchemyPoolCollector()
+redis_pools = RedisPoolCollector()
+REGISTRY.register(db_pools)
+REGISTRY.register(redis_pools)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
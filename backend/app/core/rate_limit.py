@@ -0,0 +1,165 @@
+import logging
+import math
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# GCRA (generic cell rate algorithm): one key per client holding the
+# "theoretical arrival time". Uses the Redis clock so every worker agrees.
+# KEYS[1] = bucket key; ARGV = emission interval (ms), limit, quantity
+# Returns {allowed, remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local quantity = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local burst = interval * limit
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + quantity * interval
+local diff = now - (new_tat - burst)
+
+if diff < 0 then
+    local remaining = math.floor((now - (tat - burst)) / interval)
+    return {0, remaining, math.ceil(-diff), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor(diff / interval), 0, math.ceil(new_tat - now)}
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Rate:
+    limit: int
+    period: int  # seconds
+
+    @classmethod
+    @lru_cache(maxsize=64)  # called on every request with a handful of distinct strings
+    def parse(cls, value: str) -> "Rate":
+        """Parse limits such as "10/minute" or "100/day"."""
+        count, _, period = value.partition("/")
+        return cls(int(count), PERIODS[period.strip().rstrip("s")])
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000 / self.limit
+
+
+@dataclass(slots=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after_ms: int
+    reset_after_ms: int
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after_ms / 1000)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after_ms / 1000)))
+        return headers
+
+
+class _Lease:
+    __slots__ = ("tokens", "remaining", "reset_after_ms")
+
+    def __init__(self, tokens: int, remaining: int, reset_after_ms: int):
+        self.tokens = tokens
+        self.remaining = remaining
+        self.reset_after_ms = reset_after_ms
+
+
+class RateLimiter:
+    """
+    Redis-backed GCRA limiter: one EVALSHA round trip per check, shared by all
+    workers. With RATE_LIMIT_LOCAL_BATCH > 1 a worker takes several tokens at
+    once and serves the next checks for that client from memory until the
+    lease runs out or expires (RATE_LIMIT_LOCAL_LEASE seconds).
+    """
+
+    def __init__(self):
+        self._script = None
+        self._leases = LocalCache(
+            max_entries=settings.RATE_LIMIT_LOCAL_MAX_CLIENTS,
+            max_bytes=settings.RATE_LIMIT_LOCAL_MAX_CLIENTS * 512,
+            ttl=settings.RATE_LIMIT_LOCAL_LEASE,
+        )
+
+    async def hit(self, redis: Redis, key: str, rate: Rate) -> RateLimitResult | None:
+        """Consume one token. Returns None if Redis is unavailable (fail open)."""
+        batch = min(settings.RATE_LIMIT_LOCAL_BATCH, rate.limit)
+        if batch > 1:
+            lease = self._leases.get(key)
+            if lease is not None and lease.tokens > 0:
+                lease.tokens -= 1
+                return RateLimitResult(True, rate.limit, lease.remaining + lease.tokens, 0, lease.reset_after_ms)
+
+        try:
+            if batch > 1:
+                result = await self._take(redis, key, rate, batch)
+                if result.allowed:
+                    self._leases.set(key, _Lease(batch - 1, result.remaining, result.reset_after_ms))
+                    result.remaining += batch - 1
+                    return result
+            return await self._take(redis, key, rate, 1)
+        except RedisError:
+            logger.warning("Rate limiter unavailable, allowing request", exc_info=True)
+            return None
+
+    async def _take(self, redis: Redis, key: str, rate: Rate, quantity: int) -> RateLimitResult:
+        if self._script is None or self._script.registered_client is not redis:
+            self._script = redis.register_script(GCRA_SCRIPT)
+        allowed, remaining, retry_after, reset_after = await self._script(
+            keys=[key], args=[rate.interval_ms, rate.limit, quantity]
+        )
+        return RateLimitResult(bool(allowed), rate.limit, int(remaining), int(retry_after), int(reset_after))
+
+
+rate_limiter = RateLimiter()
+
+
+class LocalRateLimiter:
+    """
+    GCRA_SCRIPT on this process's clock, for the embedded backend's single
+    worker: a dict lookup per check. At most RATE_LIMIT_LOCAL_MAX_CLIENTS
+    clients are tracked; the least recently seen are forgotten first.
+    """
+
+    def __init__(self):
+        # A day is the longest period, after which every client's TAT is in the past
+        self._tats = LocalCache(
+            max_entries=settings.RATE_LIMIT_LOCAL_MAX_CLIENTS,
+            max_bytes=settings.RATE_LIMIT_LOCAL_MAX_CLIENTS * 512,
+            ttl=max(PERIODS.values()),
+        )
+
+    def hit(self, key: str, rate: Rate) -> RateLimitResult:
+        now = time.monotonic() * 1000
+        interval = rate.interval_ms
+        burst = interval * rate.limit
+        tat = max(self._tats.get(key) or now, now)
+        new_tat = tat + interval
+        diff = now - (new_tat - burst)
+        if diff < 0:
+            remaining = math.floor((now - (tat - burst)) / interval)
+            return RateLimitResult(False, rate.limit, remaining, math.ceil(-diff), math.ceil(tat - now))
+        self._tats.set(key, new_tat)
+        return RateLimitResult(True, rate.limit, math.floor(diff / interval), 0, math.ceil(new_tat - now))
@@ -1,25 +1,42 @@
 import redis.asyncio as redis
 from app.core.config import settings
+from app.core.metrics import redis_pools
+
+def create_client(url: str) -> redis.Redis:
+    # Blocking pool: under load, requests queue for a connection
+    # instead of failing with "Too many connections".
+    pool = redis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        encoding="utf-8",
+        decode_responses=True
+    )
+    return redis.Redis(connection_pool=pool)
 
 class RedisClient:
     def __init__(self):
-        self.redis_url = settings.REDIS_URL
+        self.redis_url = settings.ASYNC_REDIS_URL
         self._redis: redis.Redis | None = None
 
     async def get_redis(self) -> redis.Redis:
         if not self._redis:
-            self._redis = await redis.from_url(
-                self.redis_url, 
-                encoding="utf-8", 
-                decode_responses=True
-            )
+            self._redis = create_client(self.redis_url)
         return self._redis
 
+    @property
+    def pool(self) -> redis.ConnectionPool | None:
+        return self._redis.connection_pool if self._redis else None
+
     async def close(self):
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose()
+            await self._redis.connection_pool.disconnect()
 
 redis_client = RedisClient()
+redis_pools.add("primary", redis_client)
 
 async def get_redis_client() -> redis.Redis:
     return await redis_client.get_redis()
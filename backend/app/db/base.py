@@ -1,2 +1,17 @@
-from app.db.session import Base
+from sqlalchemy import select
+
+from app.db.session import Base, engine
 from app.models.url import URL
+from app.models.click_flush import ClickFlush
+from app.models.click_rollup import ClickRollup, ClickStreamOffset
+from app.models.url_archive import URLArchive
+from app.services.click_events import STREAM_KEY
+
+
+async def create_schema() -> None:
+    """Create missing tables and indexes: the embedded backend's stand-in for the Alembic migrations."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # Seeded by the click_rollups migration; the aggregator only advances an existing offset
+        if await conn.scalar(select(ClickStreamOffset.stream).where(ClickStreamOffset.stream == STREAM_KEY)) is None:
+            await conn.execute(ClickStreamOffset.__table__.insert().values(stream=STREAM_KEY, last_id="0-0"))
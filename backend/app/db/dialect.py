@@ -0,0 +1,34 @@
+from sqlalchemy import any_, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import functions
+
+
+def insert(db: AsyncSession, table):
+    """
+    INSERT for the session's database, with on_conflict_* and RETURNING.
+    Postgres for the server backend; SQLite for the embedded backend and the
+    benchmark suite.
+    """
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def any_of(db: AsyncSession, column, values: list):
+    """
+    `column = ANY(:values)` on Postgres: a single array parameter however many
+    values there are, so the statement (and its prepared plan) is the same for
+    every batch. IN (...) elsewhere.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return column == any_(literal(values, postgresql.ARRAY(column.type)))
+    return column.in_(values)
+
+
+@compiles(functions.now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has whole seconds and a different text layout from the
+    # values SQLAlchemy binds, which breaks ordering and cursor comparisons.
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
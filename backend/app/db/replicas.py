@@ -0,0 +1,134 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, ReplicaCollector, db_pools
+from app.db.session import AsyncSessionLocal, sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received.
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+        )
+        self.lag: float | None = None
+        self.lagging = False
+        self.down_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return not self.lagging and self.down_until <= time.monotonic()
+
+
+class ReplicaRouter:
+    """
+    Hands out sessions for read-only work, round-robin across healthy
+    replicas. Replicas that error are benched for REPLICA_FAILURE_COOLDOWN
+    seconds and ones further behind than REPLICA_MAX_LAG_SECONDS are skipped;
+    with none available reads go to the primary.
+    """
+
+    def __init__(self, replicas: list[Replica]):
+        self.replicas = replicas
+        self._cycle = itertools.cycle(replicas) if replicas else None
+
+    def session(self) -> AsyncSession:
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy:
+                session = replica.sessionmaker()
+                session.info["replica"] = replica
+                return session
+        return AsyncSessionLocal()
+
+    def mark_failed(self, session: AsyncSession) -> None:
+        replica = session.info.get("replica")
+        if replica is not None:
+            replica.down_until = time.monotonic() + settings.REPLICA_FAILURE_COOLDOWN
+            logger.warning("Read replica %s failed, using primary for %ss", replica.name, settings.REPLICA_FAILURE_COOLDOWN)
+
+    async def check_lag(self) -> None:
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    replica.lag = float(await conn.scalar(LAG_QUERY))
+                replica.lagging = replica.lag > settings.REPLICA_MAX_LAG_SECONDS
+            except Exception:
+                logger.warning("Lag check failed for read replica %s", replica.name, exc_info=True)
+                replica.lag = None
+                replica.down_until = time.monotonic() + settings.REPLICA_FAILURE_COOLDOWN
+
+
+def _create_replica(index: int, uri: str) -> Replica:
+    engine = create_async_engine(
+        uri,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    name = f"replica-{index}"
+    db_pools.add(name, engine)
+    return Replica(name, engine)
+
+
+def _create_embedded_reader() -> Replica:
+    # Read-only connections to the embedded backend's SQLite file. In WAL mode
+    # they never wait for the writer and see every committed write, so this
+    # "replica" is never behind and needs no lag checks.
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    sqlite_pragmas(engine, read_only=True)
+    db_pools.add("reader", engine)
+    replica = Replica("reader", engine)
+    replica.lag = 0.0
+    return replica
+
+
+if settings.STORAGE_BACKEND == "embedded":
+    read_router = ReplicaRouter([_create_embedded_reader()])
+else:
+    read_router = ReplicaRouter(
+        [_create_replica(index, uri) for index, uri in enumerate(settings.POSTGRES_REPLICA_URIS)]
+    )
+REGISTRY.register(ReplicaCollector(read_router))
+
+
+async def get_read_db():
+    # Without replicas the service reuses its primary session
+    if not read_router.replicas:
+        yield None
+        return
+    async with read_router.session() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def run_replica_monitor() -> None:
+    if not read_router.replicas or settings.STORAGE_BACKEND == "embedded":
+        return
+    while True:
+        await read_router.check_lag()
+        await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL)
@@ -1,13 +1,54 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
+from app.core.metrics import db_pools
+# Registers the SQLite now() override before any table or statement is compiled
+from app.db import dialect  # noqa: F401
 
-engine = create_async_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    echo=False,
-    future=True
-)
+
+def sqlite_pragmas(engine: AsyncEngine, read_only: bool = False) -> None:
+    """Connection settings for the embedded backend's SQLite file."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            # WAL lets readers run alongside the writer; NORMAL syncs at checkpoints only
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.EMBEDDED_MMAP_SIZE)}")
+        cursor.execute("PRAGMA case_sensitive_like=ON")  # LIKE behaves as on Postgres
+        cursor.close()
+
+
+if settings.STORAGE_BACKEND == "embedded":
+    # SQLite takes one writer at a time: a single pooled connection, which
+    # aiosqlite runs on its own thread, queues writes in the pool instead of
+    # failing them with SQLITE_BUSY. Reads go to the reader pool (db.replicas).
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    sqlite_pragmas(engine)
+else:
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        echo=False,
+        future=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+db_pools.add("primary", engine)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
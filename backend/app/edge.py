@@ -0,0 +1,72 @@
+"""
+Redirect-only app for edge nodes: `SERVER_APP=app.edge:app python -m app.server`.
+
+Answers GET /{short_code} from the memory-mapped snapshot at SNAPSHOT_PATH
+(and its delta) instead of Redis and Postgres, so a node needs only the
+snapshot files. Responses match redirect_to_url in main.py: the same status,
+Cache-Control and validators, 304 for conditional requests and 410 for
+expired links. Codes the snapshot doesn't have (new since the snapshot,
+or click-limited) get a 307 to SNAPSHOT_FALLBACK_URL if it is set, else
+404. Edge redirects are not counted as clicks and are not rate limited.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from urllib.parse import quote
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import RedirectResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from app.core.config import settings
+from app.core.exceptions import generic_exception_handler, http_exception_handler
+from app.core.metrics import MetricsMiddleware, metrics_response
+from app.services.cached_link import CachedLink
+from app.services.link_snapshot import run_snapshot_reloader, snapshots
+from app.services.redirect_policy import not_modified, redirect_headers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No snapshot, no service: fail the start instead of answering 404 to everything
+    snapshots.reload()
+    reloader = asyncio.create_task(run_snapshot_reloader())
+    yield
+    reloader.cancel()
+    with suppress(asyncio.CancelledError):
+        await reloader
+
+
+app = FastAPI(title=f"{settings.PROJECT_NAME} (edge)", lifespan=lifespan, openapi_url=None)
+app.add_middleware(MetricsMiddleware)
+app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+app.add_exception_handler(Exception, generic_exception_handler)
+
+
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+@app.get("/{short_code}", response_class=RedirectResponse, status_code=301)
+async def redirect_to_url(request: Request, short_code: str):
+    value = snapshots.get(short_code)
+    if value is None:
+        if settings.SNAPSHOT_FALLBACK_URL:
+            location = f"{settings.SNAPSHOT_FALLBACK_URL.rstrip('/')}/{quote(short_code, safe='')}"
+            return Response(status_code=307, headers={"location": location, "cache-control": "no-store"})
+        raise StarletteHTTPException(status_code=404, detail="URL not found")
+    link = CachedLink.decode(value)
+    if link.expired(int(time.time() * 1000)):
+        raise StarletteHTTPException(status_code=410, detail="URL has expired")
+
+    status_code, policy_headers = redirect_headers(link)
+    headers = {name.decode(): value.decode() for name, value in policy_headers}
+    if not_modified(link, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return RedirectResponse(url=link.url, status_code=status_code, headers=headers)
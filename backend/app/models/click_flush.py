@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class ClickFlush(Base):
+    """
+    Journal of click-counter batches already folded into urls.access_count.
+    Written in the same transaction as the counter UPDATE so a batch that is
+    retried after a crash is never applied twice.
+    """
+    __tablename__ = "click_flushes"
+
+    batch_id: Mapped[str] = mapped_column(String, primary_key=True)
+    flushed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.session import Base
+
+class ClickRollup(Base):
+    """
+    Click counts per short code and time bucket (minute/hour/day), split by
+    referrer host, user-agent family and country. Built from the click
+    event stream by app/services/click_events.py.
+    """
+    __tablename__ = "click_rollups"
+
+    short_code: Mapped[str] = mapped_column(String, primary_key=True)
+    granularity: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    referrer_host: Mapped[str] = mapped_column(String, primary_key=True, default="")
+    ua_family: Mapped[str] = mapped_column(String(16), primary_key=True, default="")
+    country: Mapped[str] = mapped_column(String(2), primary_key=True, default="")
+    clicks: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+class ClickStreamOffset(Base):
+    """Last click-stream entry folded into click_rollups; updated in the same transaction."""
+    __tablename__ = "click_stream_offsets"
+
+    stream: Mapped[str] = mapped_column(String, primary_key=True)
+    last_id: Mapped[str] = mapped_column(String, nullable=False)
@@ -1,22 +1,94 @@
+import os
+import time
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime, Text, Index
+from sqlalchemy import DDL, Column, String, Integer, SmallInteger, DateTime, Text, Sequence, Index, LargeBinary, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 
+from app.core.config import settings
 from app.db.session import Base
 
+# Each nextval() returns the first of INCREMENT BY consecutive ids, leased to one
+# worker (see code_allocator). The stride is fixed when the sequence is created.
+code_block_sequence = Sequence("short_code_blocks", increment=settings.CODE_BLOCK_SIZE, metadata=Base.metadata)
+
+# Room left in each heap page so a click flush can write the new row version
+# next to the old one instead of on a fresh page. Those updates are not HOT:
+# ix_urls_access_count_id (keyset listings by clicks) must get the new value.
+URLS_FILLFACTOR = 90
+PARTITIONED = settings.URLS_PARTITIONS > 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7): a 48-bit Unix millisecond
+    timestamp, then random bits. New ids land at the right edge of the
+    primary key index instead of on random pages.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version
+    value = value & ~(0x3 << 62) | 0x2 << 62  # variant
+    return uuid.UUID(int=value)
+
+
 class URL(Base):
     __tablename__ = "urls"
 
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     url: Mapped[str] = mapped_column(Text, nullable=False)
-    short_code: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    # Partitioned, the primary key must contain the partition key: (id, short_code).
+    # The ORM then updates and deletes by both, which prunes to one partition.
+    short_code: Mapped[str] = mapped_column(String, primary_key=PARTITIONED, unique=True, index=True, nullable=False)
     access_count: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    # Per-link redirect policy; NULL means the REDIRECT_* defaults from settings
+    redirect_status: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)
+    cache_max_age: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Optional limits; enforced on redirect from the cached value, rows removed by the link sweeper
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    max_clicks: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # SHA-256 of the URL for links eligible for dedup (DEDUP_URLS); NULL otherwise
+    url_hash: Mapped[bytes | None] = mapped_column(LargeBinary(32), nullable=True)
 
     __table_args__ = (
-        Index("ix_urls_short_code", "short_code"),
+        # Partial: only the few links that can expire are indexed, so the
+        # sweeper's scans stay small and plain inserts pay nothing extra
+        Index(
+            "ix_urls_expires_at", "expires_at",
+            postgresql_where=expires_at.isnot(None), sqlite_where=expires_at.isnot(None),
+        ),
+        Index(
+            "ix_urls_max_clicks", "max_clicks",
+            postgresql_where=max_clicks.isnot(None), sqlite_where=max_clicks.isnot(None),
+        ),
+        # Keyset pagination for listings: ORDER BY key, id is a range scan of one index
+        Index("ix_urls_created_at_id", "created_at", "id"),
+        Index("ix_urls_access_count_id", "access_count", "id"),
+        # Bounded prefix of the URL for url_prefix filters (LIKE 'prefix%')
+        Index(
+            "ix_urls_url_prefix", func.substr(url, 1, 255).label("url_prefix"),
+            postgresql_ops={"url_prefix": "text_pattern_ops"},
+        ),
+        # A fixed 32-byte key instead of the unbounded url column; unique so
+        # concurrent creates of the same URL settle on a single row. Partitioned
+        # it can't be (DEDUP_URLS is refused there), so it only serves lookups.
+        Index(
+            "ix_urls_url_hash", "url_hash", unique=not PARTITIONED,
+            postgresql_where=url_hash.isnot(None), sqlite_where=url_hash.isnot(None),
+        ),
+        # Storage parameters go on the partitions, created below
+        {"postgresql_partition_by": "HASH (short_code)"} if PARTITIONED
+        else {"postgresql_with": {"fillfactor": URLS_FILLFACTOR}},
     )
+
+
+if PARTITIONED:
+    for remainder in range(settings.URLS_PARTITIONS):
+        event.listen(URL.__table__, "after_create", DDL(
+            f"CREATE TABLE urls_p{remainder} PARTITION OF urls "
+            f"FOR VALUES WITH (MODULUS {settings.URLS_PARTITIONS}, REMAINDER {remainder}) "
+            f"WITH (fillfactor = {URLS_FILLFACTOR})"
+        ).execute_if(dialect="postgresql"))
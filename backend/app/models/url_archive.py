@@ -0,0 +1,27 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import String, Integer, SmallInteger, DateTime, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class URLArchive(Base):
+    """
+    Expired links moved out of `urls` by the link sweeper (LINK_SWEEP_MODE=archive).
+    Same columns as URL; short_code is not unique here since codes can be reissued.
+    """
+    __tablename__ = "urls_archive"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    short_code: Mapped[str] = mapped_column(String, index=True, nullable=False)
+    access_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    redirect_status: Mapped[int | None] = mapped_column(SmallInteger, nullable=True)
+    cache_max_age: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    max_clicks: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,15 +1,48 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from datetime import datetime, timezone
+from typing import Dict, List, Literal, Optional
 from uuid import UUID
 
 class URLBase(BaseModel):
     url: str
 
-class URLCreate(URLBase):
+class URLInput(URLBase):
+    # Control characters are never valid in a URL; \x1f also separates the fields of a cached link
+    @field_validator("url")
+    @classmethod
+    def no_control_characters(cls, value: str) -> str:
+        if any(ord(char) < 0x20 or ord(char) == 0x7f for char in value):
+            raise ValueError("URL must not contain control characters")
+        return value
+
+class RedirectPolicy(BaseModel):
+    # None falls back to REDIRECT_STATUS / REDIRECT_MAX_AGE
+    redirect_status: Optional[Literal[301, 302, 307, 308]] = None
+    cache_max_age: Optional[int] = Field(None, ge=0, description="Browser cache lifetime of the redirect, in seconds")
+
+def _assume_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive datetimes are taken as UTC, like every timestamp in the API; aware ones are converted."""
+    value = _assume_utc(value)
+    return value.astimezone(timezone.utc) if value is not None else None
+
+class LinkLimits(BaseModel):
+    expires_at: Optional[datetime] = None
+    max_clicks: Optional[int] = Field(None, ge=1, description="Redirects allowed before the link stops working")
+
+    @field_validator("expires_at")
+    @classmethod
+    def assume_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return _assume_utc(value)
+
+class URLCreate(URLInput, RedirectPolicy, LinkLimits):
     pass
 
-class URLUpdate(URLBase):
+class URLUpdate(URLInput, RedirectPolicy, LinkLimits):
     pass
 
 class URLInDBBase(URLBase):
@@ -18,11 +51,60 @@ class URLInDBBase(URLBase):
     access_count: int
     created_at: datetime
     updated_at: datetime
+    redirect_status: Optional[int] = None
+    cache_max_age: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    max_clicks: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 class URLResponse(URLInDBBase):
     pass
 
+class URLPage(BaseModel):
+    items: List[URLResponse]
+    # Pass back as `cursor` for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class ClickBucket(BaseModel):
+    bucket: datetime
+    clicks: int
+
 class URLStats(URLInDBBase):
-    pass
+    # Only filled in when a granularity is requested
+    granularity: Optional[str] = None
+    timeseries: Optional[List[ClickBucket]] = None
+    referrers: Optional[Dict[str, int]] = None
+    user_agents: Optional[Dict[str, int]] = None
+    countries: Optional[Dict[str, int]] = None
+
+class URLRecord(URLInput, RedirectPolicy, LinkLimits):
+    """One link in an export file, and the row format accepted by import."""
+    short_code: str = Field(min_length=1, max_length=64)
+    access_count: int = Field(0, ge=0)
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @field_validator("created_at", "updated_at")
+    @classmethod
+    def timestamps_assume_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        return _assume_utc(value)
+
+class URLBulkResult(BaseModel):
+    """One NDJSON line of a bulk shorten response; `index` is the item's position in the request."""
+    index: int
+    result: Optional[URLResponse] = None
+    error: Optional[str] = None
+
+class URLResolveRequest(BaseModel):
+    short_codes: List[str] = Field(min_length=1)
+
+class URLResolveResult(BaseModel):
+    short_code: str
+    url: Optional[str] = None
+    # Set instead of url when the code does not exist or the link has expired
+    error: Optional[Literal["not_found", "expired"]] = None
+
+class URLResolveResponse(BaseModel):
+    # One per requested code, in request order (repeats included)
+    results: List[URLResolveResult]
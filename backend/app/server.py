@@ -0,0 +1,32 @@
+"""
+Production entrypoint: `python -m app.server`.
+
+Runs uvicorn's multi-process manager with WEB_CONCURRENCY workers. Each
+worker has its own event loop, DB/Redis pools and background tasks, so
+size DB_POOL_SIZE / REDIS_MAX_CONNECTIONS per worker, not per host.
+"""
+import uvicorn
+
+from app.core.config import settings
+
+
+def main() -> None:
+    uvicorn.run(
+        settings.SERVER_APP,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.WEB_CONCURRENCY,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE,
+        # X-Forwarded-For is only trusted from FORWARDED_ALLOW_IPS (uvicorn's
+        # env var, 127.0.0.1 by default): client addresses key the rate limits
+        proxy_headers=True,
+        # Per-request access logging costs more than the redirect itself
+        access_log=settings.ENVIRONMENT != "production",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.replicas import read_router
+from app.models.url import URL
+from app.services.cached_link import CachedLink
+from app.services.link_cache import LINK_COLUMNS
+from app.services.storage import Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_KEY = "lock:cache-warmup"
+WARMUP_CHUNK = 1000
+
+
+async def warm_cache(db: AsyncSession, storage: Storage, top_n: int) -> int:
+    """Preload the `top_n` most-clicked links into the redirect cache with pipelined writes."""
+    cache = storage.cache
+    result = await db.stream(
+        select(URL.short_code, *LINK_COLUMNS)
+        .order_by(URL.access_count.desc())
+        .limit(top_n)
+        .execution_options(yield_per=WARMUP_CHUNK)
+    )
+    loaded = 0
+    async for rows in result.partitions():
+        await cache.set_many({row.short_code: CachedLink.from_row(row) for row in rows})
+        loaded += len(rows)
+    return loaded
+
+
+async def warm_cache_on_startup() -> None:
+    # Every worker runs the lifespan; only the one that takes the lock warms up
+    storage = await get_storage()
+    if not await storage.claim(WARMUP_LOCK_KEY, 300):
+        return
+    try:
+        async with read_router.session() as db:
+            loaded = await warm_cache(db, storage, settings.CACHE_WARMUP_TOP_N)
+        logger.info("Warmed redirect cache with %d links", loaded)
+    except Exception:
+        logger.exception("Cache warm-up failed")
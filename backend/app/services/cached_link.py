@@ -0,0 +1,125 @@
+"""
+CachedLink, the value a redirect is served from, and its storage encoding.
+
+Kept apart from link_cache, which needs Redis and the database: edge nodes
+(app/edge.py) decode snapshot values with only this module and settings.
+"""
+import math
+import random
+import time
+import zlib
+from datetime import datetime
+from typing import NamedTuple
+
+from app.core.config import settings
+
+CACHE_TTL = 86400  # 24 hours
+
+# Cached "no such code" marker, stored with a short TTL in both tiers
+MISSING = ""
+
+# Separates the fields of an encoded CachedLink; never appears in a valid URL
+_SEP = "\x1f"
+
+# Compressed values start with this byte, then a raw deflate stream primed
+# with _URL_DICTIONARY. Plain values start with _SEP, a URL character or
+# nothing (MISSING), so the two never collide. A different dictionary needs
+# a new marker byte: values written with the old one stay in Redis for a day.
+_DEFLATE_V1 = 0x01
+# Pieces common in long links; zlib finds matches nearer the end more cheaply,
+# so the most frequent come last.
+_URL_DICTIONARY = (
+    "index.html&id=&ref=&lang=en&page=1&sort=&q=%20%2F%3D%26.pdf.php.aspx/en-us/en/"
+    "/products//product//article//blog//watch?v=/dp/youtube.com/amazon.com/"
+    "&utm_term=&utm_content=&gclid=&fbclid=&mc_cid=&mc_eid=&_hsenc=&_hsmi="
+    "facebookinstagramtwitterlinkedinnewslettere-mailemailsocialpaidcpcreferral"
+    "?utm_source=&utm_medium=&utm_campaign=.co.uk/.org/.net/.com/https://https://www."
+).encode()
+
+
+def cache_ttl() -> int:
+    # Jittered so keys filled together (warm-up, a burst of misses) don't expire together
+    return int(CACHE_TTL * (1 - random.uniform(0, settings.CACHE_TTL_JITTER)))
+
+
+def _epoch_ms(value: datetime | None) -> int:
+    return int(value.timestamp() * 1000) if value else 0
+
+
+def _optional_int(value: str) -> int | None:
+    return int(value) if value else None
+
+
+def pack(value: str) -> bytes:
+    """A value as stored in Redis: UTF-8, deflated if it reaches CACHE_COMPRESS_MIN_BYTES and that shrinks it."""
+    raw = value.encode()
+    minimum = settings.CACHE_COMPRESS_MIN_BYTES
+    if minimum and len(raw) >= minimum:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=_URL_DICTIONARY)
+        packed = bytes((_DEFLATE_V1,)) + compressor.compress(raw) + compressor.flush()
+        if len(packed) < len(raw):
+            return packed
+    return raw
+
+
+def unpack(raw: bytes) -> str:
+    if raw[:1] == bytes((_DEFLATE_V1,)):
+        decompressor = zlib.decompressobj(-15, zdict=_URL_DICTIONARY)
+        raw = decompressor.decompress(raw[1:]) + decompressor.flush()
+    return raw.decode()
+
+
+class CachedLink(NamedTuple):
+    """
+    A cached redirect: the target plus its per-link policy. `status` and
+    `max_age` are None when the link uses the global defaults, which are
+    applied when the response is built, so changing them needs no cache flush.
+    `updated` and `expires` are epoch milliseconds (0 if unknown / never).
+    """
+    url: str
+    status: int | None = None
+    max_age: int | None = None
+    updated: int = 0
+    expires: int = 0
+    max_clicks: int | None = None
+
+    @classmethod
+    def from_row(cls, row) -> "CachedLink":
+        return cls(
+            row.url, row.redirect_status, row.cache_max_age,
+            _epoch_ms(row.updated_at), _epoch_ms(row.expires_at), row.max_clicks,
+        )
+
+    def expired(self, now_ms: int) -> bool:
+        return 0 < self.expires <= now_ms
+
+    def encode(self) -> str:
+        fields = (
+            self.status, self.max_age, self.updated, self.expires, self.max_clicks,
+        )
+        return _SEP + _SEP.join("" if field is None else str(field) for field in fields) + _SEP + self.url
+
+    @classmethod
+    def decode(cls, value: str) -> "CachedLink":
+        # Entries written before the policy fields existed hold the bare URL
+        if not value.startswith(_SEP):
+            return cls(value)
+        # The URL is the last field and is split off whole, whatever it contains
+        fields = value.split(_SEP, 6)
+        if len(fields) < 7 or not fields[4].isdigit():  # written before expiry was added
+            _, status, max_age, updated, url = value.split(_SEP, 4)
+            return cls(url, _optional_int(status), _optional_int(max_age), int(updated))
+        _, status, max_age, updated, expires, max_clicks, url = fields
+        return cls(
+            url, _optional_int(status), _optional_int(max_age), int(updated), int(expires), _optional_int(max_clicks)
+        )
+
+    def ttl(self) -> int:
+        """Redis TTL: the jittered default, cut short by the link's expiry."""
+        ttl = cache_ttl()
+        if self.expires:
+            remaining = math.ceil(self.expires / 1000 - time.time())
+            # Expired but not yet swept: keep it briefly, like a cached miss
+            ttl = min(ttl, remaining) if remaining > 0 else settings.NEGATIVE_CACHE_TTL
+        return ttl
+
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+# Purges in flight (keeps the tasks referenced until they finish)
+_pending: set[asyncio.Task] = set()
+
+
+def purge_later(short_code: str) -> None:
+    """
+    Ask the CDN / reverse proxy to drop its cached redirect for `short_code`,
+    without holding up the request that changed the link. Sends
+    CDN_PURGE_METHOD to CDN_PURGE_URL (with {short_code} filled in); does
+    nothing when no purge URL is configured.
+    """
+    if not settings.CDN_PURGE_URL:
+        return
+    task = asyncio.create_task(_purge(short_code))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _purge(short_code: str) -> None:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=settings.CDN_PURGE_TIMEOUT)
+    url = settings.CDN_PURGE_URL.format(short_code=short_code)
+    try:
+        response = await _client.request(settings.CDN_PURGE_METHOD, url)
+        if response.status_code >= 400:
+            logger.warning("CDN purge of %s returned %s", short_code, response.status_code)
+    except httpx.HTTPError:
+        logger.warning("CDN purge of %s failed", short_code, exc_info=True)
+
+
+async def close() -> None:
+    global _client
+    if _pending:
+        await asyncio.wait(_pending, timeout=settings.CDN_PURGE_TIMEOUT)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter
+
+from app.core.config import settings
+from app.core.metrics import CLICK_BUFFER_PENDING
+from app.services.click_events import click_dimensions
+from app.services.storage import CLICK_BATCH_RETRY_SECONDS, Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """
+    Per-worker click accumulator for the fast redirect path.
+
+    `add` is a dict increment: no task, coroutine or Redis call per click.
+    Every CLICK_BUFFER_INTERVAL seconds the buffer is swapped out and handed
+    to the storage backend as one count per code and one per (code, referrer
+    host, UA family, country); on Redis that is a single script call. Clicks
+    still buffered when a worker dies are lost, so the interval bounds the
+    loss.
+
+    A batch whose write fails may still have been applied (e.g. a timeout
+    after Redis ran it), so it is kept as is and retried under the same
+    batch id, which the backend applies at most once. New clicks wait behind
+    it in the buffer.
+    """
+
+    def __init__(self):
+        self._clicks: Counter = Counter()
+        # (batch_id, created, per-code counts, events) of the batch last written without success
+        self._unconfirmed: tuple[str, float, Counter, Counter] | None = None
+
+    def add(self, short_code: str, referrer: str, user_agent: str, country: str) -> None:
+        self._clicks[(short_code, referrer, user_agent, country)] += 1
+
+    def pending(self) -> int:
+        unconfirmed = sum(self._unconfirmed[2].values()) if self._unconfirmed else 0
+        return sum(self._clicks.values()) + unconfirmed
+
+    async def flush(self, storage: Storage) -> int:
+        recorded = 0
+        if self._unconfirmed is not None:
+            batch_id, created, per_code, events = self._unconfirmed
+            if time.monotonic() - created > CLICK_BATCH_RETRY_SECONDS:
+                # Past the window in which the backend remembers the id, a retry could count it twice
+                logger.error("Dropping %d clicks that could not be recorded", sum(per_code.values()))
+                self._unconfirmed = None
+            else:
+                try:
+                    await storage.record_clicks(per_code, events, batch_id)
+                except Exception:
+                    if len(self._clicks) > settings.CLICK_BUFFER_MAX_KEYS:
+                        self._clicks = Counter()
+                    raise
+                self._unconfirmed = None
+                recorded = sum(per_code.values())
+
+        if not self._clicks:
+            return recorded
+        clicks, self._clicks = self._clicks, Counter()
+
+        per_code: Counter = Counter()
+        events: Counter = Counter()
+        for (short_code, referrer, user_agent, country), count in clicks.items():
+            per_code[short_code] += count
+            events[(short_code, click_dimensions(referrer, user_agent, country))] += count
+
+        batch_id = uuid.uuid4().hex
+        try:
+            await storage.record_clicks(per_code, events, batch_id)
+        except Exception:
+            self._unconfirmed = (batch_id, time.monotonic(), per_code, events)
+            raise
+        return recorded + sum(per_code.values())
+
+
+click_buffer = ClickBuffer()
+CLICK_BUFFER_PENDING.set_function(click_buffer.pending)
+
+
+async def flush_click_buffer() -> int:
+    return await click_buffer.flush(await get_storage())
+
+
+async def run_click_buffer_flusher() -> None:
+    """Background loop started from the app lifespan; one per worker process."""
+    while True:
+        await asyncio.sleep(settings.CLICK_BUFFER_INTERVAL)
+        try:
+            await flush_click_buffer()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Click buffer flush failed")
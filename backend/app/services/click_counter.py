@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import Integer, String, bindparam, column, delete, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.db.session import AsyncSessionLocal
+from app.models.click_flush import ClickFlush
+from app.models.url import URL
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# All keys share the {clicks} hash tag so the Lua scripts stay single-slot on Redis Cluster.
+PENDING_KEY = "{clicks}:pending"
+BATCHES_KEY = "{clicks}:batches"
+BATCH_KEY_PREFIX = "{clicks}:batch:"
+
+# Atomically move the live counters into a fresh batch key and register it.
+# New clicks start accumulating in an empty PENDING_KEY straight away.
+HANDOFF_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+redis.call('SADD', KEYS[2], KEYS[3])
+return 1
+"""
+
+# Clicks for one code that are not yet in Postgres: live counter plus unflushed batches.
+PENDING_SCRIPT = """
+local total = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+for _, batch in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    total = total + tonumber(redis.call('HGET', batch, ARGV[1]) or '0')
+end
+return total
+"""
+
+
+async def apply_click_deltas(db: AsyncSession, deltas: list[tuple[str, int]]) -> int:
+    """
+    Add (short_code, clicks) pairs to urls.access_count, one UPDATE ... FROM
+    (VALUES ...) per CLICK_FLUSH_BATCH_SIZE codes. The caller commits.
+    Returns the clicks added.
+    """
+    if db.bind.dialect.name == "sqlite":
+        # No column aliases on a VALUES list; a prepared statement run per code is as cheap in process
+        table = URL.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.short_code == bindparam("code"))
+            .values(access_count=table.c.access_count + bindparam("delta"), updated_at=table.c.updated_at),
+            [{"code": code, "delta": delta} for code, delta in deltas],
+        )
+        return sum(count for _, count in deltas)
+    size = settings.CLICK_FLUSH_BATCH_SIZE
+    for start in range(0, len(deltas), size):
+        chunk = values(
+            column("short_code", String), column("delta", Integer), name="v"
+        ).data(deltas[start:start + size])
+        await db.execute(
+            update(URL)
+            .where(URL.short_code == chunk.c.short_code)
+            # Keep updated_at untouched: clicks are not an edit of the link.
+            .values(access_count=URL.access_count + chunk.c.delta, updated_at=URL.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+    return sum(count for _, count in deltas)
+
+
+async def prune_click_journal(db: AsyncSession) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.CLICK_FLUSH_JOURNAL_DAYS)
+    await db.execute(delete(ClickFlush).where(ClickFlush.flushed_at < cutoff))
+    await db.commit()
+
+
+def _batch_created_ms(batch_key: str) -> int:
+    try:
+        return int(batch_key[len(BATCH_KEY_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return 0
+
+
+class ClickCounter:
+    """
+    Write-behind access counter.
+
+    Redirects only do a HINCRBY on a shared Redis hash. A flusher periodically
+    renames that hash into a batch key and folds it into urls.access_count with
+    one UPDATE ... FROM (VALUES ...) per chunk. Every batch is recorded in the
+    click_flushes journal inside the same transaction, so a batch left behind by
+    a crashed worker is retried exactly once.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._handoff = redis.register_script(HANDOFF_SCRIPT)
+        self._pending = redis.register_script(PENDING_SCRIPT)
+
+    async def incr(self, short_code: str, amount: int = 1) -> None:
+        await self.redis.hincrby(PENDING_KEY, short_code, amount)
+
+    def queue_incr(self, pipe: Pipeline, short_code: str, amount: int = 1) -> None:
+        pipe.hincrby(PENDING_KEY, short_code, amount)
+
+    async def pending(self, short_code: str) -> int:
+        return int(await self._pending(keys=[PENDING_KEY, BATCHES_KEY], args=[short_code]))
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Apply the pending counters plus any batches orphaned by other workers.
+        Returns the number of clicks written to the database.
+        """
+        batch_key = f"{BATCH_KEY_PREFIX}{int(time.time() * 1000)}-{uuid.uuid4().hex}"
+        await self._handoff(keys=[PENDING_KEY, BATCHES_KEY, batch_key])
+
+        recover_before = (time.time() - settings.CLICK_FLUSH_RECOVERY_AGE) * 1000
+        applied = 0
+        for key in await self.redis.smembers(BATCHES_KEY):
+            # Young batches from other workers are most likely mid-flush; leave them be.
+            if key != batch_key and _batch_created_ms(key) > recover_before:
+                continue
+            applied += await self._apply_batch(db, key)
+        return applied
+
+    async def _apply_batch(self, db: AsyncSession, batch_key: str) -> int:
+        raw = await self.redis.hgetall(batch_key)
+        deltas = [(code, int(count)) for code, count in raw.items() if int(count)]
+        batch_id = batch_key[len(BATCH_KEY_PREFIX):]
+
+        applied = 0
+        try:
+            claimed = await db.execute(
+                insert(db, ClickFlush)
+                .values(batch_id=batch_id)
+                .on_conflict_do_nothing()
+                .returning(ClickFlush.batch_id)
+            )
+            # No row back means another worker already applied this batch.
+            if claimed.first() is not None:
+                applied = await apply_click_deltas(db, deltas)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(batch_key)
+            pipe.srem(BATCHES_KEY, batch_key)
+            await pipe.execute()
+        return applied
+
+
+async def flush_clicks() -> int:
+    storage = await get_storage()
+    async with AsyncSessionLocal() as db:
+        return await storage.flush_clicks(db)
+
+
+async def run_click_flusher() -> None:
+    """Background loop started from the app lifespan; one per worker process."""
+    last_prune = 0.0
+    while True:
+        await asyncio.sleep(settings.CLICK_FLUSH_INTERVAL)
+        try:
+            storage = await get_storage()
+            async with AsyncSessionLocal() as db:
+                applied = await storage.flush_clicks(db)
+                if applied:
+                    logger.info("Flushed %d clicks to the database", applied)
+                if time.monotonic() - last_prune > 3600:
+                    await prune_click_journal(db)
+                    last_prune = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Click counter flush failed")
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.db.session import AsyncSessionLocal
+from app.models.click_rollup import ClickRollup, ClickStreamOffset
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "{clicks}:events"
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Ordered: the first marker found in the User-Agent wins
+_UA_FAMILIES = (
+    ("bot", ("bot", "crawler", "spider", "slurp", "preview")),
+    ("tool", ("curl", "wget", "python", "go-http", "okhttp", "java/")),
+    ("edge", ("edg/",)),
+    ("opera", ("opr/", "opera")),
+    ("chrome", ("chrome", "crios")),
+    ("firefox", ("firefox", "fxios")),
+    ("safari", ("safari",)),
+)
+
+
+@lru_cache(maxsize=4096)  # a handful of User-Agent strings make up most traffic
+def ua_family(user_agent: str) -> str:
+    ua = user_agent.lower()
+    for family, markers in _UA_FAMILIES:
+        if any(marker in ua for marker in markers):
+            return family
+    return "other" if ua else ""
+
+
+def referrer_host(referrer: str) -> str:
+    try:
+        return (urlsplit(referrer).hostname or "")[:255]
+    except ValueError:
+        return ""
+
+
+def click_dimensions(referrer: str, user_agent: str, country: str) -> tuple[str, str, str]:
+    return referrer_host(referrer), ua_family(user_agent), country[:2].upper()
+
+
+def queue_click_event(pipe: Pipeline, short_code: str, referrer: str, user_agent: str, country: str) -> None:
+    """Append one compact click event to the stream; the entry id carries the timestamp."""
+    queue_click_events(pipe, short_code, click_dimensions(referrer, user_agent, country), 1)
+
+
+def queue_click_events(pipe: Pipeline, short_code: str, dimensions: tuple[str, str, str], count: int) -> None:
+    """Append `count` identical clicks as one entry."""
+    host, family, country = dimensions
+    fields = {"c": short_code, "r": host, "u": family, "g": country}
+    if count != 1:
+        fields["n"] = count
+    pipe.xadd(STREAM_KEY, fields, maxlen=settings.CLICK_STREAM_MAXLEN, approximate=True)
+
+
+def _bucket(timestamp_ms: int, seconds: int) -> datetime:
+    start = timestamp_ms // 1000 // seconds * seconds
+    return datetime.fromtimestamp(start, tz=timezone.utc)
+
+
+def count_rollups(
+    counts: Counter, short_code: str, timestamp_ms: int, dimensions: tuple[str, str, str], clicks: int
+) -> None:
+    """Add `clicks` to the code's bucket at every granularity in `counts`, the input of write_rollups."""
+    for granularity, seconds in GRANULARITIES.items():
+        counts[(short_code, granularity, _bucket(timestamp_ms, seconds)) + dimensions] += clicks
+
+
+async def write_rollups(db: AsyncSession, counts: Counter) -> None:
+    """Upsert the counts from count_rollups into click_rollups; the caller commits."""
+    rows = [
+        {
+            "short_code": code, "granularity": granularity, "bucket_start": bucket,
+            "referrer_host": referrer, "ua_family": family, "country": country, "clicks": clicks,
+        }
+        for (code, granularity, bucket, referrer, family, country), clicks in counts.items()
+    ]
+    # 7 parameters per row; stay well under the driver's bind parameter limit
+    for start in range(0, len(rows), 2000):
+        stmt = insert(db, ClickRollup).values(rows[start:start + 2000])
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    ClickRollup.short_code, ClickRollup.granularity, ClickRollup.bucket_start,
+                    ClickRollup.referrer_host, ClickRollup.ua_family, ClickRollup.country,
+                ],
+                set_={"clicks": ClickRollup.clicks + stmt.excluded.clicks},
+            )
+        )
+
+
+async def aggregate_click_events(db: AsyncSession, redis: Redis) -> int:
+    """
+    Fold the next slice of the click stream into click_rollups.
+
+    The offset row is locked (SKIP LOCKED) before the stream is read, and the
+    rollup upserts and the new offset commit together, so with any number of
+    workers each event is counted exactly once. Returns the entries processed.
+    """
+    offset = await db.scalar(
+        select(ClickStreamOffset)
+        .where(ClickStreamOffset.stream == STREAM_KEY)
+        .with_for_update(skip_locked=True)
+    )
+    if offset is None:
+        await db.rollback()
+        return 0  # another worker is aggregating
+
+    entries = await redis.xrange(STREAM_KEY, min=f"({offset.last_id}", count=settings.CLICK_ROLLUP_BATCH)
+    if not entries:
+        await db.rollback()
+        return 0
+
+    counts: Counter = Counter()
+    for entry_id, fields in entries:
+        dims = (fields.get("r", ""), fields.get("u", ""), fields.get("g", ""))
+        count_rollups(counts, fields["c"], int(entry_id.split("-", 1)[0]), dims, int(fields.get("n", 1)))
+    try:
+        await write_rollups(db, counts)
+        last_id = entries[-1][0]
+        offset.last_id = last_id
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    # Everything before the committed offset is no longer needed
+    await redis.xtrim(STREAM_KEY, minid=last_id, approximate=True)
+    return len(entries)
+
+
+async def prune_minute_rollups(db: AsyncSession) -> None:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.CLICK_ROLLUP_MINUTE_RETENTION_DAYS)
+    await db.execute(
+        delete(ClickRollup).where(ClickRollup.granularity == "minute", ClickRollup.bucket_start < cutoff)
+    )
+    await db.commit()
+
+
+async def run_click_aggregator() -> None:
+    """Background loop started from the app lifespan; workers take turns via the offset row lock."""
+    if not settings.CLICK_EVENTS_ENABLED:
+        return
+    last_prune = 0.0
+    while True:
+        try:
+            storage = await get_storage()
+            async with AsyncSessionLocal() as db:
+                processed = await storage.aggregate_click_events(db)
+                if time.monotonic() - last_prune > 3600:
+                    await prune_minute_rollups(db)
+                    last_prune = time.monotonic()
+            # A full batch means we're behind; go again right away
+            if processed >= settings.CLICK_ROLLUP_BATCH:
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Click event aggregation failed")
+        await asyncio.sleep(settings.CLICK_ROLLUP_INTERVAL)
+
+
+async def click_timeseries(
+    db: AsyncSession, short_code: str, granularity: str, start: datetime, end: datetime
+) -> tuple[list[tuple[datetime, int]], dict[str, dict[str, int]]]:
+    """Clicks per bucket in [start, end), plus per-dimension totals over the same range."""
+    in_range = (
+        ClickRollup.short_code == short_code,
+        ClickRollup.granularity == granularity,
+        ClickRollup.bucket_start >= start,
+        ClickRollup.bucket_start < end,
+    )
+    series = await db.execute(
+        select(ClickRollup.bucket_start, func.sum(ClickRollup.clicks))
+        .where(*in_range)
+        .group_by(ClickRollup.bucket_start)
+        .order_by(ClickRollup.bucket_start)
+    )
+    breakdowns = {}
+    for name, column in (
+        ("referrers", ClickRollup.referrer_host),
+        ("user_agents", ClickRollup.ua_family),
+        ("countries", ClickRollup.country),
+    ):
+        result = await db.execute(select(column, func.sum(ClickRollup.clicks)).where(*in_range).group_by(column))
+        breakdowns[name] = {key or "unknown": int(clicks) for key, clicks in result.all()}
+    return [(bucket, int(clicks)) for bucket, clicks in series.all()], breakdowns
@@ -0,0 +1,97 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from nanoid import generate
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.url import code_block_sequence
+
+CODE_LENGTH = 8
+BASE62_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE62_SPACE = 62 ** CODE_LENGTH
+
+# Multiplier coprime to 62**8, so id -> (id * M + C) mod 62**8 is a bijection.
+# It scatters sequential ids so codes are not trivially enumerable.
+_SCRAMBLE_MULTIPLIER = 134941606347813  # ~0.618 * 62**8 (Fibonacci hashing)
+_SCRAMBLE_OFFSET = 11
+
+# The block size stored with the sequence, not CODE_BLOCK_SIZE: workers started
+# with a different setting must still lease disjoint id ranges
+_STRIDE_QUERY = text(
+    "SELECT increment_by FROM pg_sequences"
+    " WHERE schemaname = current_schema() AND sequencename = 'short_code_blocks'"
+)
+
+
+def encode_base62(number: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+class CodeAllocator(ABC):
+    """
+    Produces candidate short codes. Uniqueness is enforced by the unique index
+    on urls.short_code with INSERT ... ON CONFLICT, never by a prior SELECT.
+    """
+
+    @abstractmethod
+    async def allocate(self, db: AsyncSession, count: int) -> list[str]:
+        """Return `count` distinct candidate codes."""
+
+
+class RandomCodeAllocator(CodeAllocator):
+    """NanoID codes; collisions are rare and simply retried by the caller."""
+
+    async def allocate(self, db: AsyncSession, count: int) -> list[str]:
+        codes: set[str] = set()
+        while len(codes) < count:
+            codes.add(generate(size=CODE_LENGTH))
+        return list(codes)
+
+
+class SequenceBlockAllocator(CodeAllocator):
+    """
+    Leases blocks of ids from a Postgres sequence and hands them out from
+    memory, so a worker needs one round trip per block of codes and workers
+    never compete for the same ids. nextval() is the first id of a block and
+    the sequence's INCREMENT BY its size.
+    """
+
+    def __init__(self):
+        self._stride: int | None = None
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, db: AsyncSession, count: int) -> list[str]:
+        codes = []
+        async with self._lock:
+            while len(codes) < count:
+                if self._next >= self._end:
+                    if self._stride is None:
+                        self._stride = await db.scalar(_STRIDE_QUERY)
+                    self._next = await db.scalar(code_block_sequence.next_value())
+                    self._end = self._next + self._stride
+                take = min(count - len(codes), self._end - self._next)
+                for value in range(self._next, self._next + take):
+                    codes.append(encode_base62((value * _SCRAMBLE_MULTIPLIER + _SCRAMBLE_OFFSET) % BASE62_SPACE))
+                self._next += take
+        return codes
+
+
+_allocator: CodeAllocator | None = None
+
+
+def get_code_allocator() -> CodeAllocator:
+    global _allocator
+    if _allocator is None:
+        if settings.CODE_ALLOCATOR == "sequence":
+            _allocator = SequenceBlockAllocator()
+        else:
+            _allocator = RandomCodeAllocator()
+    return _allocator
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.core.metrics import REGISTRY, CodeFilterCollector
+from app.db.session import AsyncSessionLocal
+from app.models.url import URL
+
+logger = logging.getLogger(__name__)
+
+
+class CodeFilter:
+    """
+    Per-worker Bloom filter of every existing short code, used to answer
+    "definitely not a link" without querying Postgres.
+
+    Until the first rebuild finishes (or after the create broadcasts may have
+    been missed) the filter is not ready and answers "maybe" for everything.
+    """
+
+    def __init__(self):
+        self.bloom: BloomFilter | None = None
+        self._backlog: list[str] | None = None
+        self.rejected = 0
+        self.db_lookups = 0
+        self.false_positives = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.bloom is not None
+
+    def add(self, short_code: str) -> None:
+        if self.bloom is not None:
+            self.bloom.add(short_code)
+        if self._backlog is not None:
+            self._backlog.append(short_code)
+
+    def might_contain(self, short_code: str) -> bool:
+        if self.bloom is None:
+            return True
+        if short_code in self.bloom:
+            self.db_lookups += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_false_positive(self) -> None:
+        if self.bloom is not None:
+            self.false_positives += 1
+
+    def mark_stale(self) -> None:
+        self.bloom = None
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        capacity = settings.BLOOM_CAPACITY
+        if self.bloom is not None:
+            capacity = max(capacity, self.bloom.count * 2)
+
+        while True:
+            bloom = BloomFilter(capacity, settings.BLOOM_ERROR_RATE)
+            # Codes created while we scan are collected and replayed before the swap
+            self._backlog = []
+            try:
+                result = await db.stream_scalars(
+                    select(URL.short_code).execution_options(yield_per=settings.BLOOM_REBUILD_CHUNK)
+                )
+                async for short_code in result:
+                    bloom.add(short_code)
+                for short_code in self._backlog:
+                    bloom.add(short_code)
+            finally:
+                self._backlog = None
+            if bloom.count <= capacity:
+                break
+            # Overfilled filters degrade quickly; size for twice the current table
+            capacity = bloom.count * 2
+
+        self.bloom = bloom
+        self.false_positives = 0
+        self.db_lookups = 0
+        logger.info(
+            "Rebuilt short code filter: %d codes, %d bytes, %d hashes",
+            bloom.count, bloom.size_bytes, bloom.num_hashes,
+        )
+
+
+known_codes = CodeFilter()
+REGISTRY.register(CodeFilterCollector(known_codes))
+
+
+async def run_code_filter_rebuilder() -> None:
+    """Build the filter at startup, then rebuild it periodically (and whenever it went stale)."""
+    elapsed = settings.BLOOM_REBUILD_INTERVAL
+    while True:
+        if elapsed >= settings.BLOOM_REBUILD_INTERVAL or not known_codes.ready:
+            try:
+                # From the primary: a replica may not have replayed codes created just
+                # before the scan, and the backlog only catches those created during it
+                async with AsyncSessionLocal() as db:
+                    await known_codes.rebuild(db)
+                elapsed = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Short code filter rebuild failed")
+        await asyncio.sleep(5)
+        elapsed += 5
@@ -0,0 +1,127 @@
+import time
+from collections import Counter
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.rate_limit import LocalRateLimiter, Rate, RateLimitResult
+from app.db.session import AsyncSessionLocal
+from app.services.cached_link import CachedLink
+from app.services.click_counter import apply_click_deltas
+from app.services.click_events import click_dimensions, count_rollups, write_rollups
+from app.services.link_cache import LocalLinkCache
+from app.services.storage import Storage
+
+
+class EmbeddedStorage(Storage):
+    """
+    Storage for STORAGE_BACKEND=embedded: plain dicts in the one worker
+    process. Redirects are answered from the L1 (LocalLinkCache) and the
+    SQLite reader pool; clicks and click events are counted here and written
+    by the click flusher and aggregator on their usual intervals, and once
+    more at shutdown, so a crash loses at most an interval's worth. Quotas
+    and rate limits start afresh after a restart; quotas are recreated from
+    access_count as click-limited links are loaded, as after a Redis eviction.
+    """
+
+    def __init__(self):
+        self.cache = LocalLinkCache()
+        self._quotas: dict[str, int] = {}  # code -> clicks left; dropped by the sweeper with the link
+        self._clicks: Counter = Counter()
+        self._flushing: Counter = Counter()  # taken by a flush that has not committed yet
+        # (code, minute start in epoch ms, click_dimensions) -> clicks
+        self._events: Counter = Counter()
+        self._rate_limiter = LocalRateLimiter()
+
+    async def admit_click(self, short_code: str, link: CachedLink) -> bool:
+        now_ms = int(time.time() * 1000)
+        if link.expired(now_ms):
+            return False
+        if link.max_clicks is None:
+            return True
+        remaining = self._quotas.get(short_code)
+        # No quota (never set, or lost in a restart) lets the click through, like a missing Redis key
+        if remaining is None:
+            return True
+        if remaining <= 0:
+            return False
+        self._quotas[short_code] = remaining - 1
+        return True
+
+    async def set_quota(self, short_code: str, link: CachedLink, used: int = 0, only_if_missing: bool = False) -> None:
+        if link.max_clicks is None:
+            self._quotas.pop(short_code, None)
+            return
+        if only_if_missing and short_code in self._quotas:
+            return
+        self._quotas[short_code] = max(link.max_clicks - used, 0)
+
+    async def clear_quotas(self, short_codes: list[str]) -> None:
+        for short_code in short_codes:
+            self._quotas.pop(short_code, None)
+
+    async def record_click(self, short_code: str, referrer: str = "", user_agent: str = "", country: str = "") -> None:
+        self._clicks[short_code] += 1
+        if settings.CLICK_EVENTS_ENABLED:
+            self._events[(short_code, _minute_ms()) + click_dimensions(referrer, user_agent, country)] += 1
+
+    async def record_clicks(self, clicks: Counter, events: Counter, batch_id: str) -> None:
+        # In process memory nothing can fail halfway, so batch_id is not needed
+        self._clicks.update(clicks)
+        if settings.CLICK_EVENTS_ENABLED:
+            minute = _minute_ms()
+            for (short_code, dimensions), count in events.items():
+                self._events[(short_code, minute) + dimensions] += count
+
+    async def pending_clicks(self, short_code: str) -> int:
+        return self._clicks.get(short_code, 0) + self._flushing.get(short_code, 0)
+
+    async def flush_clicks(self, db: AsyncSession) -> int:
+        if not self._clicks:
+            return 0
+        self._flushing, self._clicks = self._clicks, Counter()
+        try:
+            applied = await apply_click_deltas(db, list(self._flushing.items()))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._clicks.update(self._flushing)
+            raise
+        finally:
+            self._flushing = Counter()
+        return applied
+
+    async def aggregate_click_events(self, db: AsyncSession) -> int:
+        if not self._events:
+            return 0
+        events, self._events = self._events, Counter()
+        counts: Counter = Counter()
+        for (short_code, minute, *dimensions), clicks in events.items():
+            count_rollups(counts, short_code, minute, tuple(dimensions), clicks)
+        try:
+            await write_rollups(db, counts)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # Kept for the next run, up to as many as the Redis stream would hold
+            if len(self._events) + len(events) <= settings.CLICK_STREAM_MAXLEN:
+                self._events.update(events)
+            raise
+        return len(events)
+
+    async def rate_limit(self, key: str, rate: Rate) -> RateLimitResult | None:
+        return self._rate_limiter.hit(key, rate)
+
+    async def claim(self, name: str, seconds: int) -> bool:
+        return True  # the only worker
+
+    async def close(self) -> None:
+        # Events live only in this process; write the last ones before it exits
+        if settings.CLICK_EVENTS_ENABLED and self._events:
+            async with AsyncSessionLocal() as db:
+                await self.aggregate_click_events(db)
+
+
+def _minute_ms() -> int:
+    # Events are kept per minute, the finest rollup granularity
+    return int(time.time()) // 60 * 60000
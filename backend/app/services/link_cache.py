@@ -0,0 +1,438 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
+from sqlalchemy import select
+
+from app.core.cache_store import SHARD_ERRORS, CacheShard, bucket_key, cache_store, string_key
+from app.core.config import settings
+from app.core.local_cache import LocalCache
+from app.core.metrics import (
+    LINK_CACHE_HIT, LINK_CACHE_MISS, LINK_CACHE_NEGATIVE, REDIS_GET_TIME, REGISTRY, LocalCacheCollector,
+)
+from app.core.redis import get_redis_client
+from app.db.replicas import read_router
+from app.models.url import URL
+from app.services.cached_link import MISSING, CachedLink, cache_ttl, pack, unpack
+from app.services.code_filter import known_codes
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+CREATED_CHANNEL = "cache:created"
+
+# What a redirect needs besides the URL, read from the DB on a cache fill
+LINK_COLUMNS = (
+    URL.url, URL.redirect_status, URL.cache_max_age, URL.updated_at, URL.expires_at, URL.max_clicks,
+)
+
+# One L1 per worker process, shared by every request handled by that worker.
+local_links = LocalCache(
+    max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+    max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+    ttl=settings.LOCAL_CACHE_TTL,
+)
+REGISTRY.register(LocalCacheCollector("links", local_links))
+
+# Per-worker single-flight: concurrent misses for one code share a single DB load
+_inflight: dict[str, asyncio.Future] = {}
+# Early refreshes currently running (also keeps the tasks referenced)
+_refreshing: dict[str, asyncio.Task] = {}
+
+
+class LinkCache:
+    """
+    short_code -> CachedLink lookups: in-process L1 in front of Redis, where
+    each link is a `short:{code}` key or a field of a `shortb:{n}` hash bucket
+    (CACHE_ENCODING). Values are stored encoded (CachedLink.encode, then
+    pack), and read without the client's UTF-8 decoding since compressed ones
+    are binary. Writers publish the code on INVALIDATION_CHANNEL so every
+    worker drops its L1 copy.
+
+    The keys live in cache_store (the main Redis, a cluster or consistent-hash
+    shards); `redis` is the main client, used for pub/sub. Batch writes send
+    one pipeline per shard. A failing shard never fails the request: reads
+    count as misses and go to the database, and writes are dropped.
+
+    `get` returns the encoded value, MISSING for codes recently confirmed not
+    to exist, and None when neither tier knows the code. Hot keys close to expiry are refreshed
+    early in the background, with a probability that rises as the remaining
+    TTL shrinks (XFetch), so they rarely expire under load.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.store = cache_store
+
+    async def get(self, short_code: str) -> str | None:
+        if settings.LOCAL_CACHE_ENABLED:
+            value = local_links.get(short_code)
+            if value is not None:
+                return value
+
+        generation = local_links.generation
+        shard = await self.store.shard_for(short_code)
+        if not await self.store.available(shard):
+            LINK_CACHE_MISS.inc()
+            return None
+        try:
+            with REDIS_GET_TIME.time():
+                value, ttl_ms = await self._fetch(shard, short_code)
+        except SHARD_ERRORS as exc:
+            self.store.mark_down(shard, exc)
+            LINK_CACHE_MISS.inc()
+            return None
+        if value is None:
+            LINK_CACHE_MISS.inc()
+            return None
+        (LINK_CACHE_NEGATIVE if value == MISSING else LINK_CACHE_HIT).inc()
+        if settings.LOCAL_CACHE_ENABLED:
+            local_links.set(short_code, value, generation)
+        if value != MISSING and self._should_refresh(ttl_ms):
+            self._refresh_in_background(short_code)
+        return value
+
+    async def _fetch(self, shard: CacheShard, short_code: str) -> tuple[str | None, int]:
+        """
+        The value cached for `short_code` and its remaining TTL in ms, in one
+        round trip. Hash mode also reads the string key (CACHE_STRING_FALLBACK)
+        so links cached before the switch are still hits.
+        """
+        encoding = settings.CACHE_ENCODING
+        key = string_key(short_code)
+        async with shard.pipeline() as pipe:
+            if encoding == "hash":
+                bucket = bucket_key(short_code)
+                pipe.execute_command("HGET", bucket, short_code, **{NEVER_DECODE: []})
+                pipe.hpttl(bucket, short_code)
+            if encoding != "hash" or settings.CACHE_STRING_FALLBACK:
+                pipe.execute_command("GET", key, **{NEVER_DECODE: []})
+                pipe.pttl(key)
+            replies = await pipe.execute()
+        if encoding == "hash":
+            value, ttls = replies[:2]
+            if value is not None:
+                return unpack(value), ttls[0]
+            replies = replies[2:]
+        if replies and replies[0] is not None:
+            return unpack(replies[0]), replies[1]
+        return None, -2
+
+    async def get_many(self, short_codes: list[str]) -> dict[str, str]:
+        """
+        `get` for many codes; codes neither tier knows are left out. Redis is
+        read with one MGET per shard (HMGET per bucket in hash mode), every
+        shard at once. There is no early refresh here.
+        """
+        found = {}
+        if settings.LOCAL_CACHE_ENABLED:
+            for short_code in short_codes:
+                value = local_links.get(short_code)
+                if value is not None:
+                    found[short_code] = value
+        generation = local_links.generation
+        asked = [short_code for short_code in short_codes if short_code not in found]
+        groups = await self.store.route(asked)
+        fetched = 0
+        for values in await asyncio.gather(*(self._fetch_many(shard, codes) for shard, codes in groups.items())):
+            for short_code, value in values.items():
+                (LINK_CACHE_NEGATIVE if value == MISSING else LINK_CACHE_HIT).inc()
+                if settings.LOCAL_CACHE_ENABLED:
+                    local_links.set(short_code, value, generation)
+            fetched += len(values)
+            found.update(values)
+        LINK_CACHE_MISS.inc(len(asked) - fetched)
+        return found
+
+    async def _fetch_many(self, shard: CacheShard, short_codes: list[str]) -> dict[str, str]:
+        if not await self.store.available(shard):
+            return {}
+        encoding = settings.CACHE_ENCODING
+        buckets: dict[str, list[str]] = defaultdict(list)
+        if encoding == "hash":
+            for short_code in short_codes:
+                buckets[bucket_key(short_code)].append(short_code)
+        read_strings = encoding != "hash" or settings.CACHE_STRING_FALLBACK
+        try:
+            async with shard.pipeline() as pipe:
+                for bucket, fields in buckets.items():
+                    pipe.execute_command("HMGET", bucket, *fields, **{NEVER_DECODE: []})
+                if read_strings and shard.cluster:
+                    # A cluster only runs multi-key commands within one slot
+                    for short_code in short_codes:
+                        pipe.execute_command("GET", string_key(short_code), **{NEVER_DECODE: []})
+                elif read_strings:
+                    pipe.execute_command("MGET", *map(string_key, short_codes), **{NEVER_DECODE: []})
+                replies = await pipe.execute()
+        except SHARD_ERRORS as exc:
+            self.store.mark_down(shard, exc)
+            return {}
+        found = {}
+        for fields, values in zip(buckets.values(), replies):
+            found.update((short_code, unpack(value)) for short_code, value in zip(fields, values) if value is not None)
+        if read_strings:
+            strings = replies[len(buckets):] if shard.cluster else replies[len(buckets)]
+            for short_code, value in zip(short_codes, strings):
+                if value is not None and short_code not in found:
+                    found[short_code] = unpack(value)
+        return found
+
+    async def load(
+        self, short_code: str, loader: Callable[[], Awaitable[CachedLink | None]]
+    ) -> CachedLink | None:
+        """
+        Run `loader` (DB lookup + cache fill) for a cache miss, at most once per
+        code at a time: concurrent callers in this worker await the same
+        result, and a short Redis lock makes other workers wait for the fill
+        instead of all querying Postgres.
+        """
+        future = _inflight.get(short_code)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[short_code] = future
+        try:
+            value = await self._load_locked(short_code, loader)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved; nobody may be waiting
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del _inflight[short_code]
+
+    async def _load_locked(
+        self, short_code: str, loader: Callable[[], Awaitable[CachedLink | None]]
+    ) -> CachedLink | None:
+        # The lock sits on the code's own shard; without the shard, just load
+        shard = await self.store.shard_for(short_code)
+        if not await self.store.available(shard):
+            return await loader()
+        lock_key = f"lock:short:{short_code}"
+        try:
+            locked = await shard.client.set(lock_key, "1", nx=True, px=settings.CACHE_FILL_LOCK_MS)
+        except SHARD_ERRORS as exc:
+            self.store.mark_down(shard, exc)
+            return await loader()
+        if locked:
+            try:
+                return await loader()
+            finally:
+                try:
+                    await shard.client.delete(lock_key)
+                except SHARD_ERRORS:
+                    pass  # expires after CACHE_FILL_LOCK_MS
+
+        # Another worker is filling this code; poll briefly for its result
+        deadline = time.monotonic() + settings.CACHE_FILL_WAIT_MS / 1000
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                value, _ = await self._fetch(shard, short_code)
+                if value is not None:
+                    return CachedLink.decode(value) if value else None
+        except SHARD_ERRORS as exc:
+            self.store.mark_down(shard, exc)
+        return await loader()
+
+    def _should_refresh(self, ttl_ms: int) -> bool:
+        window = settings.CACHE_EARLY_REFRESH_WINDOW
+        if window <= 0 or ttl_ms < 0:
+            return False
+        return ttl_ms / 1000 < -window * math.log(1 - random.random())
+
+    def _refresh_in_background(self, short_code: str):
+        if short_code not in _refreshing:
+            task = asyncio.create_task(self._refresh(short_code))
+            _refreshing[short_code] = task
+            task.add_done_callback(lambda _: _refreshing.pop(short_code, None))
+
+    async def _refresh(self, short_code: str):
+        try:
+            async with read_router.session() as db:
+                row = (await db.execute(select(*LINK_COLUMNS).where(URL.short_code == short_code))).first()
+            if row is not None:
+                await self.set(short_code, CachedLink.from_row(row))
+        except Exception:
+            logger.warning("Early refresh of %s failed", short_code, exc_info=True)
+
+    async def set(self, short_code: str, link: CachedLink, broadcast: bool = False):
+        messages = [(INVALIDATION_CHANNEL, short_code)] if broadcast else []
+        if broadcast:
+            local_links.invalidate(short_code)
+        await self._write({short_code: (link.encode(), link.ttl())}, messages)
+
+    async def set_missing(self, short_code: str):
+        await self._write({short_code: (MISSING, settings.NEGATIVE_CACHE_TTL)})
+        if settings.LOCAL_CACHE_ENABLED:
+            local_links.set(short_code, MISSING)
+
+    async def set_many(self, links: dict[str, CachedLink], missing: list[str] = ()):
+        """Cache `links`, and `missing` as known not to exist, in one write."""
+        entries = {short_code: (link.encode(), link.ttl()) for short_code, link in links.items()}
+        entries.update((short_code, (MISSING, settings.NEGATIVE_CACHE_TTL)) for short_code in missing)
+        await self._write(entries)
+        if settings.LOCAL_CACHE_ENABLED:
+            for short_code in missing:
+                local_links.set(short_code, MISSING)
+
+    async def add_created(self, short_code: str, link: CachedLink):
+        await self.add_created_many({short_code: link})
+
+    async def add_created_many(self, links: dict[str, CachedLink]):
+        # Overwrites any negative entries; other workers add the codes to their
+        # Bloom filter and drop cached misses for them. One round trip per shard.
+        if not links:
+            return
+        for short_code in links:
+            known_codes.add(short_code)
+            local_links.invalidate(short_code)
+        await self._write(
+            {short_code: (link.encode(), link.ttl()) for short_code, link in links.items()},
+            [(CREATED_CHANNEL, " ".join(links))],
+        )
+
+    async def invalidate(self, short_code: str):
+        # Deleted codes stay in the Bloom filter until the next rebuild, so
+        # cache the miss instead of just dropping the key.
+        await self.invalidate_many([short_code])
+
+    async def invalidate_many(self, short_codes: list[str]):
+        for short_code in short_codes:
+            local_links.invalidate(short_code)
+        await self._write(
+            {short_code: (MISSING, settings.NEGATIVE_CACHE_TTL) for short_code in short_codes},
+            [(INVALIDATION_CHANNEL, short_code) for short_code in short_codes],
+        )
+
+    async def _write(self, entries: dict[str, tuple[str, int]], messages: list[tuple[str, str]] = ()):
+        """
+        Store every entry in the CACHE_ENCODING layout, one pipeline per shard, then publish
+        `messages` on the main Redis. When the cache shares the main Redis the
+        messages ride in the same pipeline, so the whole call is one round trip.
+        """
+        groups = await self.store.route(entries)
+        delivered = await asyncio.gather(*(
+            self._write_shard(shard, short_codes, entries, messages if shard.client is self.redis else ())
+            for shard, short_codes in groups.items()
+        ))
+        if messages and not any(delivered):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for channel, message in messages:
+                    pipe.publish(channel, message)
+                await pipe.execute()
+
+    async def _write_shard(
+        self, shard: CacheShard, short_codes: list[str], entries: dict[str, tuple[str, int]], messages
+    ) -> bool:
+        """True if `messages` went out with the writes."""
+        if not await self.store.available(shard):
+            self.store.drop(shard, short_codes)
+            return False
+        encoding = settings.CACHE_ENCODING
+        try:
+            async with shard.pipeline() as pipe:
+                for short_code in short_codes:
+                    value, ttl = entries[short_code]
+                    value = pack(value)
+                    if encoding != "hash":
+                        pipe.set(string_key(short_code), value, ex=ttl)
+                    elif settings.CACHE_STRING_FALLBACK:
+                        # A leftover string would be read whenever the field is missing
+                        pipe.unlink(string_key(short_code))
+                    if encoding != "string":
+                        bucket = bucket_key(short_code)
+                        pipe.hset(bucket, short_code, value)
+                        pipe.hexpire(bucket, ttl, short_code)
+                for channel, message in messages:
+                    pipe.publish(channel, message)
+                await pipe.execute()
+        except SHARD_ERRORS as exc:
+            self.store.mark_down(shard, exc, short_codes)
+            return False
+        return bool(messages)
+
+
+class LocalLinkCache(LinkCache):
+    """
+    LinkCache for the embedded backend, where the per-process L1 is the only
+    tier. There is a single process, so every write reaches every cached copy
+    and nothing is published. Misses are still loaded once per code at a
+    time; entries last LOCAL_CACHE_TTL whatever the Redis TTL would be.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.store = None
+
+    async def get(self, short_code: str) -> str | None:
+        if not settings.LOCAL_CACHE_ENABLED:
+            return None
+        return local_links.get(short_code)
+
+    async def get_many(self, short_codes: list[str]) -> dict[str, str]:
+        if not settings.LOCAL_CACHE_ENABLED:
+            return {}
+        found = {}
+        for short_code in short_codes:
+            value = local_links.get(short_code)
+            if value is not None:
+                found[short_code] = value
+        return found
+
+    async def _load_locked(
+        self, short_code: str, loader: Callable[[], Awaitable[CachedLink | None]]
+    ) -> CachedLink | None:
+        return await loader()
+
+    async def _write(self, entries: dict[str, tuple[str, int]], messages: list[tuple[str, str]] = ()):
+        if settings.LOCAL_CACHE_ENABLED:
+            for short_code, (value, _) in entries.items():
+                local_links.set(short_code, value)
+
+
+async def run_invalidation_listener() -> None:
+    """
+    Drop L1 entries changed by other workers and learn codes they created.
+    If the subscription breaks we may have missed messages, so the whole L1 is
+    cleared and the Bloom filter is marked stale (forcing a rebuild) before
+    resubscribing; LOCAL_CACHE_TTL bounds staleness even if the listener is
+    down entirely.
+    """
+    if settings.STORAGE_BACKEND == "embedded":
+        return
+    while True:
+        try:
+            redis = await get_redis_client()
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL, CREATED_CHANNEL)
+                local_links.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    if message["channel"] == CREATED_CHANNEL:
+                        # Bulk creates announce many space-separated codes at once
+                        for short_code in message["data"].split():
+                            known_codes.add(short_code)
+                            local_links.invalidate(short_code)
+                    else:
+                        local_links.invalidate(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener failed, retrying")
+            local_links.clear()
+            known_codes.mark_stale()
+            await asyncio.sleep(1)
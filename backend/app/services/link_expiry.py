@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+
+from redis.asyncio import Redis
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.url import URL
+from app.models.url_archive import URLArchive
+from app.services.cdn_purge import purge_later
+from app.services.cached_link import CachedLink
+from app.services.storage import Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_PREFIX = "quota:"
+
+# Take one click from a link's remaining quota. A missing key (never set, or
+# evicted) lets the click through; the sweeper still removes the link once
+# access_count reaches max_clicks.
+CONSUME_SCRIPT = """
+local remaining = redis.call('GET', KEYS[1])
+if not remaining then
+    return 1
+end
+if tonumber(remaining) <= 0 then
+    return 0
+end
+redis.call('DECR', KEYS[1])
+return 1
+"""
+
+_consume = None
+
+
+async def admit_click(redis: Redis, short_code: str, link: CachedLink) -> bool:
+    """
+    False if the link has expired or used up its clicks. Links without limits
+    cost nothing; a click-limited link costs one EVALSHA.
+    """
+    if link.expired(int(time.time() * 1000)):
+        return False
+    if link.max_clicks is None:
+        return True
+    global _consume
+    if _consume is None or _consume.registered_client is not redis:
+        _consume = redis.register_script(CONSUME_SCRIPT)
+    return bool(await _consume(keys=[f"{QUOTA_KEY_PREFIX}{short_code}"]))
+
+
+async def set_quota(redis: Redis, short_code: str, link: CachedLink, used: int = 0, only_if_missing: bool = False):
+    """Store the clicks left for a click-limited link; expires with the link."""
+    key = f"{QUOTA_KEY_PREFIX}{short_code}"
+    if link.max_clicks is None:
+        await redis.delete(key)
+        return
+    await redis.set(
+        key, max(link.max_clicks - used, 0), pxat=link.expires or None, nx=only_if_missing
+    )
+
+
+def _expired_codes(limit: int):
+    # Walks the partial index on expires_at; SKIP LOCKED lets several workers sweep side by side
+    return (
+        select(URL.short_code)
+        .where(URL.expires_at.isnot(None), URL.expires_at <= func.now())
+        .order_by(URL.expires_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _used_up_codes(limit: int):
+    return (
+        select(URL.short_code)
+        .where(URL.max_clicks.isnot(None), URL.access_count >= URL.max_clicks)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+async def _sweep_batch(db: AsyncSession, selected) -> list[str]:
+    # Rows are matched by short_code: unique, and the partition key when urls is partitioned
+    if settings.LINK_SWEEP_MODE == "archive":
+        # Lookup-only columns such as url_hash are not archived
+        columns = [column.name for column in URLArchive.__table__.columns if column.name in URL.__table__.c]
+        moved = (
+            delete(URL)
+            .where(URL.short_code.in_(selected.scalar_subquery()))
+            .returning(*(URL.__table__.c[name] for name in columns))
+            .cte("moved")
+        )
+        stmt = insert(URLArchive).from_select(columns, select(*moved.c)).returning(URLArchive.short_code)
+    else:
+        stmt = delete(URL).where(URL.short_code.in_(selected.scalar_subquery())).returning(URL.short_code)
+    try:
+        codes = list(await db.scalars(stmt))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return codes
+
+
+async def sweep_links(db: AsyncSession, storage: Storage) -> int:
+    """
+    Remove expired and used-up links in LINK_SWEEP_BATCH-row transactions,
+    then drop them from every cache tier. Returns the number removed.
+    """
+    batch = settings.LINK_SWEEP_BATCH
+    removed = 0
+    for select_codes in (_expired_codes, _used_up_codes):
+        while True:
+            codes = await _sweep_batch(db, select_codes(batch))
+            if codes:
+                await storage.cache.invalidate_many(codes)
+                await storage.clear_quotas(codes)
+                for code in codes:
+                    purge_later(code)
+                removed += len(codes)
+            if len(codes) < batch:
+                break
+    return removed
+
+
+async def run_link_sweeper() -> None:
+    """Background loop started from the app lifespan; workers share the work via SKIP LOCKED."""
+    while True:
+        await asyncio.sleep(settings.LINK_SWEEP_INTERVAL)
+        try:
+            storage = await get_storage()
+            async with AsyncSessionLocal() as db:
+                removed = await sweep_links(db, storage)
+            if removed:
+                logger.info("Swept %d expired links (%s)", removed, settings.LINK_SWEEP_MODE)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Link sweep failed")
@@ -0,0 +1,314 @@
+"""
+Immutable on-disk snapshots of the urls table, for edge redirect nodes
+(app/edge.py) that have no Postgres or Redis.
+
+A file is a header, the records (short code + CachedLink.encode() value)
+and an open-addressing hash index over the codes. Readers mmap it, so a
+lookup is a couple of reads from the page cache: O(1), no load step, and
+every worker process on a host shares the same pages.
+
+A delta has the same layout and names the snapshot it applies to. It holds
+every link that differs from that snapshot (changed or new) and an empty
+value for every code that is gone, so only the latest delta is ever needed.
+Files are written next to their target and renamed into place, and edge
+workers swap to a new file on their next stat, without a restart.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import uuid
+import zlib
+from array import array
+from contextlib import suppress
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import LINK_SNAPSHOT_CREATED
+from app.services.cached_link import MISSING, CachedLink
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"URLSNAP1"
+VERSION = 1
+FLAG_DELTA = 1
+# magic, version, flags, records, index slots, index offset, created (epoch ms), id, base id
+_HEADER = struct.Struct("<8sIIQQQQ16s16s")
+_RECORD = struct.Struct("<BI")  # code length, value length; then code and value bytes
+# Index slot: the high 24 bits of the code's CRC-32 above a 40-bit record offset; 0 = empty
+_SLOT = struct.Struct("<Q")
+_OFFSET_BITS = 40
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+_MAX_LOAD = 0.7
+
+
+def _hash(code: bytes) -> int:
+    # Codes come from the allocator, so CRC-32 spreads them evenly, at a tenth of blake2b's cost
+    return zlib.crc32(code)
+
+
+def _fingerprint(code_hash: int) -> int:
+    return code_hash >> 8 << _OFFSET_BITS
+
+
+def delta_path(path: str) -> str:
+    return f"{path}.delta"
+
+
+class SnapshotWriter:
+    """Builds a snapshot (or a delta of `base_id`) in a temporary file, renamed over `path` by finish()."""
+
+    def __init__(self, path: str, base_id: bytes | None = None):
+        self.path = path
+        self.base_id = base_id
+        self.id = uuid.uuid4().bytes
+        self._tmp = f"{path}.tmp-{os.getpid()}"
+        self._file = open(self._tmp, "wb")
+        self._file.write(bytes(_HEADER.size))
+        self._position = _HEADER.size
+        self._hashes = array("Q")
+        self._offsets = array("Q")
+
+    def add(self, short_code: str, value: str) -> None:
+        code, data = short_code.encode(), value.encode()
+        if self._position > _OFFSET_MASK:
+            raise ValueError("snapshot larger than 1 TiB")
+        self._file.write(_RECORD.pack(len(code), len(data)) + code + data)
+        self._hashes.append(_hash(code))
+        self._offsets.append(self._position)
+        self._position += _RECORD.size + len(code) + len(data)
+
+    def finish(self) -> int:
+        """Write the index and header, then publish the file. Returns the record count."""
+        count = len(self._hashes)
+        self._file.write(bytes(-self._position % 8))
+        index_offset = self._position + -self._position % 8
+        # Linear probing at most _MAX_LOAD full keeps the expected probe count under ~2
+        slots = int(count / _MAX_LOAD) + 1
+        table = array("Q", bytes(_SLOT.size * slots))
+        for code_hash, offset in zip(self._hashes, self._offsets):
+            slot = code_hash % slots
+            while table[slot]:
+                slot = slot + 1 if slot + 1 < slots else 0
+            table[slot] = _fingerprint(code_hash) | offset
+        if sys.byteorder == "big":
+            table.byteswap()
+        self._file.write(table.tobytes())
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(
+            MAGIC, VERSION, FLAG_DELTA if self.base_id else 0, count, slots, index_offset,
+            int(time.time() * 1000), self.id, self.base_id or bytes(16),
+        ))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        return count
+
+    def abort(self) -> None:
+        self._file.close()
+        with suppress(FileNotFoundError):
+            os.unlink(self._tmp)
+
+
+class Snapshot:
+    """A read-only, memory-mapped snapshot or delta file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.stat = os.fstat(file.fileno())
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (
+                magic, version, flags, self.count, self._slots, self._index, self.created, self.id, base_id,
+            ) = _HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} link snapshot")
+        self.base_id = base_id if flags & FLAG_DELTA else None
+
+    def _find(self, code: bytes) -> tuple[int, int]:
+        """(slot, record offset) for `code`, or (-1, 0)."""
+        code_hash = _hash(code)
+        fingerprint = _fingerprint(code_hash)
+        slot = code_hash % self._slots
+        while True:
+            entry, = _SLOT.unpack_from(self._map, self._index + slot * _SLOT.size)
+            if not entry:
+                return -1, 0
+            if entry & ~_OFFSET_MASK == fingerprint:
+                offset = entry & _OFFSET_MASK
+                length = self._map[offset]
+                if self._map[offset + _RECORD.size:offset + _RECORD.size + length] == code:
+                    return slot, offset
+            slot = slot + 1 if slot + 1 < self._slots else 0
+
+    def _value(self, offset: int) -> str:
+        code_length, value_length = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size + code_length
+        return self._map[start:start + value_length].decode()
+
+    def get(self, short_code: str) -> str | None:
+        """The encoded link; MISSING for a code a delta removes; None if the file doesn't mention it."""
+        return self.lookup(short_code)[1]
+
+    def lookup(self, short_code: str) -> tuple[int, str | None]:
+        """(index slot, value) for the code; the slot is -1 if it isn't in the file."""
+        slot, offset = self._find(short_code.encode())
+        return slot, self._value(offset) if slot >= 0 else None
+
+    def codes(self) -> Iterator[tuple[int, str]]:
+        """(slot, short code) for every record, in index order."""
+        for slot in range(self._slots):
+            entry, = _SLOT.unpack_from(self._map, self._index + slot * _SLOT.size)
+            if entry:
+                offset = entry & _OFFSET_MASK
+                length = self._map[offset]
+                yield slot, self._map[offset + _RECORD.size:offset + _RECORD.size + length].decode()
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    def close(self) -> None:
+        self._map.close()
+
+
+async def _snapshot_rows(db: AsyncSession) -> AsyncIterator[tuple[str, str]]:
+    # Imported here: edge nodes load this module to read snapshots and have no database
+    from app.models.url import URL
+    from app.services.link_cache import LINK_COLUMNS
+
+    # Click-limited links need Redis to count clicks; edge nodes leave them to the origin
+    result = await db.stream(
+        select(URL.short_code, *LINK_COLUMNS)
+        .where(URL.max_clicks.is_(None))
+        .execution_options(yield_per=settings.EXPORT_CHUNK)
+    )
+    async for rows in result.partitions():
+        for row in rows:
+            yield row.short_code, CachedLink.from_row(row).encode()
+
+
+async def write_snapshot(db: AsyncSession, path: str) -> int:
+    """Compile every link into a new snapshot at `path`. Returns the number of links."""
+    writer = SnapshotWriter(path)
+    try:
+        async for short_code, value in _snapshot_rows(db):
+            writer.add(short_code, value)
+        return writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+async def write_delta(db: AsyncSession, base: Snapshot, path: str) -> tuple[int, int]:
+    """
+    Compile the changes since `base` into a delta at `path`: links that are
+    new or differ, then a removal for every base code no longer in the table.
+    Returns (changed, removed).
+    """
+    if base.base_id is not None:
+        raise ValueError("a delta can only be built against a full snapshot")
+    writer = SnapshotWriter(path, base_id=base.id)
+    seen = bytearray(base.slots)
+    changed = removed = 0
+    try:
+        async for short_code, value in _snapshot_rows(db):
+            slot, current = base.lookup(short_code)
+            if slot >= 0:
+                seen[slot] = 1
+            if current != value:
+                writer.add(short_code, value)
+                changed += 1
+        for slot, short_code in base.codes():
+            if not seen[slot]:
+                writer.add(short_code, MISSING)
+                removed += 1
+        writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    return changed, removed
+
+
+def _file_version(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class SnapshotStore:
+    """
+    The snapshot at `path` plus its delta, as served by one edge worker.
+    reload() opens files that were replaced since the last call and swaps
+    them in with one assignment; lookups are synchronous, so no request
+    ever sees a half-swapped pair or a closed mapping.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._files: tuple[Snapshot, Snapshot | None] | None = None
+
+    def get(self, short_code: str) -> str | None:
+        """The encoded link, or None if the code isn't in the snapshot or the delta removes it."""
+        base, delta = self._files
+        if delta is not None:
+            value = delta.get(short_code)
+            if value is not None:
+                return value or None
+        return base.get(short_code)
+
+    def reload(self) -> bool:
+        """Pick up new files; True if anything changed. Raises if there is no usable snapshot yet."""
+        base, delta = self._files or (None, None)
+        base_version = _file_version(self.path)
+        delta_version = _file_version(delta_path(self.path))
+        if base is None or base_version != (base.stat.st_ino, base.stat.st_mtime_ns):
+            base = Snapshot(self.path)
+            delta = None
+        if delta is not None and delta_version != (delta.stat.st_ino, delta.stat.st_mtime_ns):
+            delta = None
+        if delta is None and delta_version is not None:
+            delta = Snapshot(delta_path(self.path))
+            if delta.base_id != base.id:
+                # A delta for another snapshot; wait for the matching one
+                delta.close()
+                delta = None
+        if self._files is not None and (base, delta) == self._files:
+            return False
+        previous, self._files = self._files, (base, delta)
+        if previous is not None:
+            for old in previous:
+                if old is not None and old is not base and old is not delta:
+                    old.close()
+        LINK_SNAPSHOT_CREATED.labels("snapshot").set(base.created / 1000)
+        LINK_SNAPSHOT_CREATED.labels("delta").set(delta.created / 1000 if delta else 0)
+        logger.info(
+            "Serving snapshot with %d links%s", base.count,
+            f" and a delta of {delta.count} changes" if delta else "",
+        )
+        return True
+
+
+snapshots = SnapshotStore(settings.SNAPSHOT_PATH)
+
+
+async def run_snapshot_reloader() -> None:
+    """Background loop started from the edge app lifespan."""
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_RELOAD_INTERVAL)
+        try:
+            snapshots.reload()
+        except Exception:
+            logger.exception("Snapshot reload failed; still serving the previous files")
@@ -0,0 +1,260 @@
+"""
+Streaming export and import of the urls table (NDJSON or CSV, optionally gzipped).
+
+Both directions work in fixed-size chunks, so memory stays flat however many
+links there are: export reads through a server-side cursor, import writes
+each chunk with COPY (or multi-row INSERTs off Postgres) and fills the
+redirect cache for the chunk with one write.
+"""
+import csv
+import io
+import json
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.url import URL, uuid7
+from app.schemas.url import URLRecord
+from app.services.cached_link import CachedLink
+from app.services.link_cache import LINK_COLUMNS
+from app.services.storage import Storage
+from app.services.url_service import url_hash
+
+Format = Literal["ndjson", "csv"]
+
+EXPORT_FIELDS = (
+    "short_code", "url", "access_count", "created_at", "updated_at",
+    "redirect_status", "cache_max_age", "expires_at", "max_clicks",
+)
+_EXPORT_COLUMNS = tuple(URL.__table__.c[name] for name in EXPORT_FIELDS)
+_COPY_FIELDS = ("id", *EXPORT_FIELDS, "url_hash")
+_RETURNED = (URL.short_code, URL.access_count, *LINK_COLUMNS)
+_STAGING_TABLE = "urls_import"
+_GZIP_MAGIC = b"\x1f\x8b"
+_CSV_INT_FIELDS = frozenset(("access_count", "redirect_status", "cache_max_age", "max_clicks"))
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _encode(rows, fmt: Format) -> bytes:
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        for row in rows:
+            writer.writerow([
+                "" if value is None else _iso(value) if isinstance(value, datetime) else value
+                for value in row
+            ])
+        return out.getvalue().encode()
+    return "".join(
+        json.dumps(
+            {name: _iso(value) if isinstance(value, datetime) else value for name, value in zip(EXPORT_FIELDS, row)},
+            separators=(",", ":"),
+        ) + "\n"
+        for row in rows
+    ).encode()
+
+
+async def export_links(db: AsyncSession, fmt: Format) -> AsyncIterator[bytes]:
+    """Every link, one encoded chunk of EXPORT_CHUNK rows at a time."""
+    if fmt == "csv":
+        yield (",".join(EXPORT_FIELDS) + "\n").encode()
+    # stream() + yield_per keeps a server-side cursor open instead of buffering the result
+    result = await db.stream(select(*_EXPORT_COLUMNS).execution_options(yield_per=settings.EXPORT_CHUNK))
+    async for rows in result.partitions():
+        yield _encode(rows, fmt)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into non-empty lines, gunzipping it if it starts with the gzip magic."""
+    decompressor = None
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        if first:
+            first = False
+            if chunk.startswith(_GZIP_MAGIC):
+                decompressor = zlib.decompressobj(31)
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+@dataclass(slots=True)
+class ImportProgress:
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0  # short code already taken
+    invalid: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.read / max(time.monotonic() - self.started, 1e-9)
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read, "imported": self.imported, "skipped": self.skipped,
+            "invalid": self.invalid, "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+def _parse_csv(line: bytes, header: list[str]) -> URLRecord:
+    values = next(csv.reader([line.decode()]))
+    # CSV has only strings, and redirect_status (a Literal of ints) takes no numeric string
+    return URLRecord.model_validate({
+        name: int(value) if name in _CSV_INT_FIELDS else value
+        for name, value in zip(header, values) if value != ""
+    })
+
+
+async def import_links(
+    db: AsyncSession, storage: Storage, lines: AsyncIterator[bytes], fmt: Format
+) -> AsyncIterator[ImportProgress]:
+    """
+    Insert the links in `lines`, skipping short codes that already exist.
+    Yields the running totals after every IMPORT_CHUNK rows and once at the end.
+    """
+    progress = ImportProgress()
+    header: list[str] | None = None
+    batch: list[URLRecord] = []
+    async for line in lines:
+        if fmt == "csv" and header is None:
+            header = next(csv.reader([line.decode()]))
+            continue
+        progress.read += 1
+        try:
+            batch.append(_parse_csv(line, header) if fmt == "csv" else URLRecord.model_validate_json(line))
+        except (ValidationError, ValueError):
+            progress.invalid += 1
+        if len(batch) >= settings.IMPORT_CHUNK:
+            await _write_batch(db, storage, batch, progress)
+            batch = []
+            yield progress
+    if batch:
+        await _write_batch(db, storage, batch, progress)
+    yield progress
+
+
+async def _dedup_keys(db: AsyncSession, batch: list[URLRecord]) -> list[bytes | None]:
+    """
+    url_hash for each record, as create_short_url would store it. A URL
+    that is already shared, or repeated earlier in the batch, gets none:
+    its row is still imported under its own code, it just isn't the link
+    new creates of that URL return.
+    """
+    if not settings.DEDUP_URLS:
+        return [None] * len(batch)
+    # As in create_short_url, links with their own policy or limits get no dedup key
+    keys = [
+        url_hash(record.url)
+        if record.redirect_status is None and record.cache_max_age is None
+        and record.expires_at is None and record.max_clicks is None
+        else None
+        for record in batch
+    ]
+    wanted = {key for key in keys if key is not None}
+    if not wanted:
+        return keys
+    taken = set((await db.scalars(select(URL.url_hash).where(URL.url_hash.in_(wanted)))).all())
+    for index, key in enumerate(keys):
+        if key in taken:
+            keys[index] = None
+        elif key is not None:
+            taken.add(key)
+    return keys
+
+
+async def _write_batch(db: AsyncSession, storage: Storage, batch: list[URLRecord], progress: ImportProgress) -> None:
+    now = datetime.now(timezone.utc)
+    keys = await _dedup_keys(db, batch)
+    rows = [
+        {
+            "id": uuid7(),
+            "short_code": record.short_code,
+            "url": record.url,
+            "access_count": record.access_count,
+            "created_at": record.created_at or now,
+            "updated_at": record.updated_at or record.created_at or now,
+            "redirect_status": record.redirect_status,
+            "cache_max_age": record.cache_max_age,
+            "expires_at": record.expires_at,
+            "max_clicks": record.max_clicks,
+            "url_hash": key,
+        }
+        for record, key in zip(batch, keys)
+    ]
+    try:
+        if db.bind.dialect.driver == "asyncpg":
+            inserted = await _copy_rows(db, rows)
+        else:
+            inserted = []
+            for start in range(0, len(rows), settings.BULK_INSERT_CHUNK):
+                result = await db.execute(
+                    insert(db, URL)
+                    .values(rows[start:start + settings.BULK_INSERT_CHUNK])
+                    .on_conflict_do_nothing(index_elements=[URL.short_code])
+                    .returning(*_RETURNED)
+                )
+                inserted.extend(result.all())
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    links = {row.short_code: CachedLink.from_row(row) for row in inserted}
+    await storage.cache.add_created_many(links)
+    for row in inserted:
+        if row.max_clicks is not None:
+            await storage.set_quota(row.short_code, links[row.short_code], row.access_count)
+    progress.imported += len(inserted)
+    progress.skipped += len(rows) - len(inserted)
+
+
+async def _copy_rows(db: AsyncSession, rows: list[dict]) -> list:
+    # COPY into a session-local staging table, then one INSERT ... SELECT so
+    # existing short codes are skipped instead of aborting the whole COPY.
+    # Only short codes are skipped: a url_hash taken since _dedup_keys looked
+    # fails the chunk rather than dropping the row.
+    await db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} (LIKE urls INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    ))
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        _STAGING_TABLE,
+        records=[tuple(row[name] for name in _COPY_FIELDS) for row in rows],
+        columns=_COPY_FIELDS,
+    )
+    staging = table(_STAGING_TABLE, *(column(name) for name in _COPY_FIELDS))
+    result = await db.execute(
+        insert(db, URL)
+        .from_select(_COPY_FIELDS, select(*staging.c))
+        .on_conflict_do_nothing(index_elements=[URL.short_code])
+        .returning(*_RETURNED)
+    )
+    return result.all()
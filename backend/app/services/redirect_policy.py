@@ -0,0 +1,62 @@
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+
+from app.core.config import settings
+from app.services.cached_link import CachedLink
+
+
+@lru_cache(maxsize=256)
+def _cache_control(max_age: int, shared: int | None) -> bytes:
+    if max_age <= 0 and shared is None:
+        return b"no-store"
+    value = f"public, max-age={max(max_age, 0)}"
+    if shared is not None:
+        value += f", s-maxage={shared}"
+    return value.encode()
+
+
+@lru_cache(maxsize=4096)
+def _validators(updated: int) -> tuple[tuple[bytes, bytes], ...]:
+    if not updated:
+        return ()
+    return (
+        (b"etag", f'"{updated:x}"'.encode()),
+        (b"last-modified", formatdate(updated // 1000, usegmt=True).encode()),
+    )
+
+
+def redirect_headers(link: CachedLink) -> tuple[int, list[tuple[bytes, bytes]]]:
+    """
+    Status code plus Cache-Control / ETag / Last-Modified for a redirect.
+    The ETag and Last-Modified come from updated_at, so any edit of the link
+    changes them. Header values are built once and reused.
+
+    Click-limited links are never cached, since every hit has to be counted;
+    links with an expiry are cached no longer than they have left to live.
+    """
+    status = link.status or settings.REDIRECT_STATUS
+    if link.max_clicks is not None:
+        return status, [(b"cache-control", b"no-store"), *_validators(link.updated)]
+    max_age = settings.REDIRECT_MAX_AGE if link.max_age is None else link.max_age
+    shared = settings.REDIRECT_SHARED_MAX_AGE
+    if link.expires:
+        left = max((link.expires - int(time.time() * 1000)) // 1000, 0)
+        max_age = min(max_age, left)
+        shared = None if shared is None else min(shared, left)
+    return status, [(b"cache-control", _cache_control(max_age, shared)), *_validators(link.updated)]
+
+
+def not_modified(link: CachedLink, if_none_match: str | None, if_modified_since: str | None) -> bool:
+    """Whether a conditional request (e.g. a CDN revalidating) can get a 304."""
+    if not link.updated:
+        return False
+    if if_none_match is not None:
+        etag = f'"{link.updated:x}"'
+        return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= link.updated // 1000
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,98 @@
+from collections import Counter
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.rate_limit import Rate, RateLimitResult, rate_limiter
+from app.services.cached_link import CachedLink
+from app.services.click_counter import PENDING_KEY, ClickCounter
+from app.services.click_events import STREAM_KEY, aggregate_click_events, queue_click_event
+from app.services.link_cache import LinkCache
+from app.services.link_expiry import QUOTA_KEY_PREFIX, admit_click, set_quota
+from app.services.storage import CLICK_BATCH_RETRY_SECONDS, Storage
+
+# Marks a click buffer batch as applied, so a retry of the same batch is a no-op
+BUFFERED_BATCH_KEY_PREFIX = "{clicks}:buffered:"
+
+# Applies one click buffer batch atomically, unless its marker (KEYS[3]) is
+# already set. ARGV: marker TTL, stream MAXLEN, number of codes, then a
+# (code, count) pair per code and a (code, host, family, country, count)
+# group per click event.
+RECORD_BATCH_SCRIPT = """
+if not redis.call('SET', KEYS[3], '1', 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+local i = 4
+for _ = 1, tonumber(ARGV[3]) do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+while i <= #ARGV do
+    local fields = {'c', ARGV[i], 'r', ARGV[i + 1], 'u', ARGV[i + 2], 'g', ARGV[i + 3]}
+    if ARGV[i + 4] ~= '1' then
+        fields[9], fields[10] = 'n', ARGV[i + 4]
+    end
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(fields))
+    i = i + 5
+end
+return 1
+"""
+
+
+class RedisStorage(Storage):
+    """
+    Storage for STORAGE_BACKEND=server: the redirect cache on cache_store,
+    everything else on the main Redis, shared by all workers and hosts.
+    Clicks go to the write-behind ClickCounter and the click event stream.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.cache = LinkCache(redis)
+        self.clicks = ClickCounter(redis)
+        self._record_batch = redis.register_script(RECORD_BATCH_SCRIPT)
+
+    async def admit_click(self, short_code: str, link: CachedLink) -> bool:
+        return await admit_click(self.redis, short_code, link)
+
+    async def set_quota(self, short_code: str, link: CachedLink, used: int = 0, only_if_missing: bool = False) -> None:
+        await set_quota(self.redis, short_code, link, used, only_if_missing)
+
+    async def clear_quotas(self, short_codes: list[str]) -> None:
+        if short_codes:
+            await self.redis.delete(*(f"{QUOTA_KEY_PREFIX}{short_code}" for short_code in short_codes))
+
+    async def record_click(self, short_code: str, referrer: str = "", user_agent: str = "", country: str = "") -> None:
+        # One round trip: the write-behind counter (folded into access_count by
+        # the click flusher) plus an analytics event for the rollup aggregator.
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self.clicks.queue_incr(pipe, short_code)
+            if settings.CLICK_EVENTS_ENABLED:
+                queue_click_event(pipe, short_code, referrer, user_agent, country)
+            await pipe.execute()
+
+    async def record_clicks(self, clicks: Counter, events: Counter, batch_id: str) -> None:
+        # One script call: a HINCRBY per code and a stream entry per distinct event with its count
+        args = [2 * CLICK_BATCH_RETRY_SECONDS, settings.CLICK_STREAM_MAXLEN, len(clicks)]
+        for short_code, count in clicks.items():
+            args += (short_code, count)
+        if settings.CLICK_EVENTS_ENABLED:
+            for (short_code, dimensions), count in events.items():
+                args += (short_code, *dimensions, count)
+        await self._record_batch(keys=[PENDING_KEY, STREAM_KEY, f"{BUFFERED_BATCH_KEY_PREFIX}{batch_id}"], args=args)
+
+    async def pending_clicks(self, short_code: str) -> int:
+        return await self.clicks.pending(short_code)
+
+    async def flush_clicks(self, db: AsyncSession) -> int:
+        return await self.clicks.flush(db)
+
+    async def aggregate_click_events(self, db: AsyncSession) -> int:
+        return await aggregate_click_events(db, self.redis)
+
+    async def rate_limit(self, key: str, rate: Rate) -> RateLimitResult | None:
+        return await rate_limiter.hit(self.redis, key, rate)
+
+    async def claim(self, name: str, seconds: int) -> bool:
+        return bool(await self.redis.set(name, "1", nx=True, ex=seconds))
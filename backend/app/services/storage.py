@@ -0,0 +1,96 @@
+"""
+Where link state outside the SQL database lives (STORAGE_BACKEND).
+
+URLService, the redirect paths and the background loops keep the redirect
+cache, click counters and events, click quotas and rate limits behind the
+Storage interface. SQL goes through SQLAlchemy sessions (app/db), which the
+two backends share: Postgres or SQLite, picked by SQLALCHEMY_DATABASE_URI.
+
+"server" (RedisStorage) keeps that state in Redis, shared by every worker
+and host. "embedded" (EmbeddedStorage) keeps it in process memory next to a
+SQLite file, for a single worker with no network hops.
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.rate_limit import Rate, RateLimitResult
+from app.core.redis import get_redis_client
+from app.services.cached_link import CachedLink
+from app.services.link_cache import LinkCache
+
+
+# How long the click buffer may retry a failed batch under the same id
+CLICK_BATCH_RETRY_SECONDS = 600
+
+
+class Storage(ABC):
+    # short_code -> CachedLink lookups in front of the database
+    cache: LinkCache
+
+    @abstractmethod
+    async def admit_click(self, short_code: str, link: CachedLink) -> bool:
+        """False if the link has expired or used up its clicks; otherwise takes one click from its quota."""
+
+    @abstractmethod
+    async def set_quota(self, short_code: str, link: CachedLink, used: int = 0, only_if_missing: bool = False) -> None:
+        """Store the clicks left for a click-limited link (or drop the quota of one that no longer is)."""
+
+    @abstractmethod
+    async def clear_quotas(self, short_codes: list[str]) -> None:
+        """Forget the quotas of deleted links."""
+
+    @abstractmethod
+    async def record_click(self, short_code: str, referrer: str = "", user_agent: str = "", country: str = "") -> None:
+        """Count one click and, with CLICK_EVENTS_ENABLED, queue its analytics event."""
+
+    @abstractmethod
+    async def record_clicks(self, clicks: Counter, events: Counter, batch_id: str) -> None:
+        """
+        Batch form of record_click for the click buffer: `clicks` maps codes
+        to counts, `events` maps (code, click_dimensions) to counts. A batch
+        is applied whole or not at all, and at most once per `batch_id`
+        within CLICK_BATCH_RETRY_SECONDS, so a failed call can be retried
+        with the same id even if it did reach the backend.
+        """
+
+    @abstractmethod
+    async def pending_clicks(self, short_code: str) -> int:
+        """Clicks counted but not yet added to urls.access_count."""
+
+    @abstractmethod
+    async def flush_clicks(self, db: AsyncSession) -> int:
+        """Add the pending clicks to urls.access_count. Returns the number written."""
+
+    @abstractmethod
+    async def aggregate_click_events(self, db: AsyncSession) -> int:
+        """Fold queued click events into click_rollups. Returns the entries processed."""
+
+    @abstractmethod
+    async def rate_limit(self, key: str, rate: Rate) -> RateLimitResult | None:
+        """Consume one token from `key`'s bucket; None when the limiter is unavailable (fail open)."""
+
+    @abstractmethod
+    async def claim(self, name: str, seconds: int) -> bool:
+        """True for the one caller, across all workers, that gets to run the job `name` in the next `seconds`."""
+
+    async def close(self) -> None:
+        """Called at shutdown, after the final click flush."""
+
+
+_storage: Storage | None = None
+
+
+async def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        # Imported here: the implementations build on services that themselves use get_storage
+        if settings.STORAGE_BACKEND == "embedded":
+            from app.services.embedded_storage import EmbeddedStorage
+            _storage = EmbeddedStorage()
+        else:
+            from app.services.redis_storage import RedisStorage
+            _storage = RedisStorage(await get_redis_client())
+    return _storage
@@ -1,77 +1,375 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from redis.asyncio import Redis
-from fastapi import HTTPException, status
-from nanoid import generate
-from datetime import timedelta
+from sqlalchemy import Row, func, literal, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import BackgroundTasks, HTTPException, status
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import json
 import logging
+import uuid
+from urllib.parse import urlsplit, urlunsplit
 
 from app.models.url import URL
-from app.schemas.url import URLCreate, URLUpdate
+from app.schemas.url import ClickBucket, URLCreate, URLPage, URLResponse, URLUpdate, URLStats
 from app.core.config import settings
+from app.core.metrics import CACHE_FILL_TIME, CLICK_TASKS_PENDING, COMMIT_TIME, DB_FALLBACK_TIME
+from app.db.dialect import any_of, insert
+from app.db.replicas import read_router
+from app.services.click_events import click_timeseries
+from app.services.cdn_purge import purge_later
+from app.services.cached_link import MISSING, CachedLink
+from app.services.link_cache import LINK_COLUMNS
+from app.services.storage import Storage
+from app.services.code_filter import known_codes
+from app.services.code_allocator import get_code_allocator
 
 logger = logging.getLogger(__name__)
 
-CACHE_TTL = 86400  # 24 hours
+# Columns of URLResponse: returned by bulk creates and by read-only lookups
+URL_COLUMNS = (
+    URL.id, URL.url, URL.short_code, URL.access_count, URL.created_at, URL.updated_at,
+    URL.redirect_status, URL.cache_max_age, URL.expires_at, URL.max_clicks,
+)
+
+# Sort keys for listing; each has a (key, id) index so any page is one index range scan
+LIST_SORT_COLUMNS = {"created_at": URL.created_at, "access_count": URL.access_count}
+# Length of the indexed URL prefix (ix_urls_url_prefix)
+URL_PREFIX_INDEX_LEN = 255
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Case-fold scheme and host and drop a default port; the rest is kept as given."""
+    try:
+        parts = urlsplit(url.strip())
+        host, port = parts.hostname or "", parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and _DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    userinfo = parts.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    return urlunsplit((scheme, netloc, parts.path or ("/" if netloc else ""), parts.query, parts.fragment))
+
+def url_hash(url: str) -> bytes:
+    """Dedup key: SHA-256 of the normalised URL."""
+    return hashlib.sha256(normalize_url(url).encode()).digest()
+
+def _dedup_key(url_in: URLCreate | URLUpdate) -> bytes | None:
+    # Links with their own policy or limits are never shared
+    if (
+        url_in.redirect_status is None and url_in.cache_max_age is None
+        and url_in.expires_at is None and url_in.max_clicks is None
+    ):
+        return url_hash(str(url_in.url))
+    return None
 
 class URLService:
-    def __init__(self, db: AsyncSession, redis: Redis):
+    def __init__(self, db: AsyncSession, storage: Storage, read_db: AsyncSession | None = None):
         self.db = db
-        self.redis = redis
+        # Read-only lookups go here; a replica session when replicas are configured
+        self.read_db = read_db or db
+        # Cache, click counters and quotas: Redis or in-process (STORAGE_BACKEND)
+        self.storage = storage
+        self.cache = storage.cache
+        self.allocator = get_code_allocator()
 
     async def create_short_url(self, url_in: URLCreate) -> URL:
-        # Generate unique short code
-        # Loop to ensure uniqueness (though with NanoID collision is rare)
+        # The unique index arbitrates collisions: no read-before-write, and
+        # two workers racing for the same code cannot both win. With DEDUP_URLS
+        # the url_hash index arbitrates the same way, so a new URL still costs
+        # a single INSERT and only a repeat pays for the lookup.
+        key = _dedup_key(url_in) if settings.DEDUP_URLS else None
         for _ in range(5):
-            short_code = generate(size=8)
-            existing = await self.get_url_by_code_db(short_code)
-            if not existing:
+            short_code, = await self.allocator.allocate(self.db, 1)
+            result = await self.db.execute(
+                insert(self.db, URL)
+                .values(
+                    url=str(url_in.url),
+                    short_code=short_code,
+                    redirect_status=url_in.redirect_status,
+                    cache_max_age=url_in.cache_max_age,
+                    expires_at=url_in.expires_at,
+                    max_clicks=url_in.max_clicks,
+                    url_hash=key,
+                )
+                .on_conflict_do_nothing(index_elements=None if key else [URL.short_code])
+                .returning(URL)
+            )
+            db_obj = result.scalar_one_or_none()
+            if db_obj:
                 break
+            if key is not None:
+                existing = await self.db.scalar(select(URL).where(URL.url_hash == key))
+                if existing:
+                    return existing
         else:
+            await self.db.rollback()
             raise HTTPException(status_code=500, detail="Could not generate unique code")
 
-        db_obj = URL(
-            url=str(url_in.url),
-            short_code=short_code
-        )
-        self.db.add(db_obj)
-        await self.db.commit()
-        await self.db.refresh(db_obj)
+        await self._commit()
 
-        # Cache the new URL (mapped short_code -> url)
-        await self._cache_url(short_code, str(url_in.url))
+        # Cache the new URL (mapped short_code -> url) and announce the code
+        link = CachedLink.from_row(db_obj)
+        await self.cache.add_created(short_code, link)
+        if link.max_clicks is not None:
+            await self.storage.set_quota(short_code, link)
         
         return db_obj
 
+    async def create_short_urls_bulk(self, urls_in: list[URLCreate]) -> list[Row]:
+        """
+        Create many links with one multi-row INSERT ... ON CONFLICT DO NOTHING
+        RETURNING per attempt. Only rows whose code collided are retried, and
+        the cache is filled with a single pipeline. Results keep input order.
+        """
+        results: list[Row | None] = [None] * len(urls_in)
+        pending = list(range(len(urls_in)))
+        # As in create_short_url, links with their own policy or limits get no dedup key
+        hashes = [_dedup_key(url_in) for url_in in urls_in] if settings.DEDUP_URLS else [None] * len(urls_in)
+        deduped = any(key is not None for key in hashes)
+        for _ in range(5):
+            candidates = await self.allocator.allocate(self.db, len(pending))
+            codes = dict(zip(candidates, pending))
+
+            inserted = await self.db.execute(
+                insert(self.db, URL)
+                .values([
+                    {
+                        "url": str(urls_in[index].url),
+                        "short_code": code,
+                        "redirect_status": urls_in[index].redirect_status,
+                        "cache_max_age": urls_in[index].cache_max_age,
+                        "expires_at": urls_in[index].expires_at,
+                        "max_clicks": urls_in[index].max_clicks,
+                        "url_hash": hashes[index],
+                    }
+                    for code, index in codes.items()
+                ])
+                .on_conflict_do_nothing(index_elements=None if deduped else [URL.short_code])
+                .returning(*URL_COLUMNS)
+            )
+            for row in inserted.all():
+                results[codes[row.short_code]] = row
+
+            pending = [index for index in pending if results[index] is None]
+            hashed = {hashes[index] for index in pending if hashes[index] is not None}
+            if hashed:
+                # Rows skipped for their hash (already stored, or repeated in this batch)
+                existing = await self.db.execute(select(*URL_COLUMNS).where(URL.url_hash.in_(hashed)))
+                by_hash = {url_hash(row.url): row for row in existing.all()}
+                for index in pending:
+                    if hashes[index] is not None:
+                        results[index] = by_hash.get(hashes[index])
+                pending = [index for index in pending if results[index] is None]
+            if not pending:
+                break
+        else:
+            await self.db.rollback()
+            raise HTTPException(status_code=500, detail="Could not generate unique code")
+
+        await self._commit()
+        links = {row.short_code: CachedLink.from_row(row) for row in results}
+        await self.cache.add_created_many(links)
+        for short_code, link in links.items():
+            if link.max_clicks is not None:
+                await self.storage.set_quota(short_code, link)
+        return results
+
+    async def get_link(self, short_code: str) -> CachedLink | None:
+        # Try the in-process cache, then Redis
+        cached = await self.cache.get(short_code)
+        if cached is not None:
+            return None if cached == MISSING else CachedLink.decode(cached)
+        return await self.get_uncached_link(short_code)
+
     async def get_url(self, short_code: str) -> str | None:
-        # Try Redis first
-        cached_url = await self.redis.get(f"short:{short_code}")
-        if cached_url:
-            return cached_url
+        link = await self.get_link(short_code)
+        return link.url if link else None
 
-        # Fallback to DB
-        db_obj = await self.get_url_by_code_db(short_code)
-        if db_obj:
-            await self._cache_url(short_code, db_obj.url)
-            return db_obj.url
-        
+    async def get_uncached_link(self, short_code: str) -> CachedLink | None:
+        """Resolve a code that missed both cache tiers."""
+        # Codes the Bloom filter has never seen cannot be in the DB
+        if not known_codes.might_contain(short_code):
+            return None
+
+        # Fallback to DB, once per code no matter how many requests missed together
+        return await self.cache.load(short_code, lambda: self._load_link(short_code))
+
+    async def _load_link(self, short_code: str) -> CachedLink | None:
+        with DB_FALLBACK_TIME.time():
+            row = await self.get_url_by_code_read(short_code)
+        if row:
+            link = CachedLink.from_row(row)
+            await self._cache_link(short_code, link)
+            if link.max_clicks is not None:
+                # Recreate a lost quota from the flushed count (slightly generous)
+                await self.storage.set_quota(short_code, link, row.access_count, only_if_missing=True)
+            return link
+
+        known_codes.record_false_positive()
+        await self.cache.set_missing(short_code)
         return None
 
-    async def get_url_details(self, short_code: str) -> URL | None:
-        return await self.get_url_by_code_db(short_code)
+    async def resolve_links(self, short_codes: list[str]) -> dict[str, CachedLink]:
+        """
+        Look up many codes at once: one cache read per shard, one query for
+        the codes neither cache tier knows and one write caching the answers,
+        misses included. Codes that don't exist are left out. Unlike a
+        redirect this takes no click, so used-up click quotas are not checked.
+        """
+        codes = list(dict.fromkeys(short_codes))
+        cached = await self.cache.get_many(codes)
+        links = {code: CachedLink.decode(value) for code, value in cached.items() if value != MISSING}
+        misses = [code for code in codes if code not in cached and known_codes.might_contain(code)]
+        if not misses:
+            return links
+
+        rows = await self.get_links_by_codes_read(misses)
+        loaded = {row.short_code: CachedLink.from_row(row) for row in rows}
+        missing = [code for code in misses if code not in loaded]
+        for _ in missing:
+            known_codes.record_false_positive()
+        await self.cache.set_many(loaded, missing)
+        for row in rows:
+            if row.max_clicks is not None:
+                # The redirect path will hit the cache now, so it won't recreate a lost quota
+                await self.storage.set_quota(
+                    row.short_code, loaded[row.short_code], row.access_count, only_if_missing=True
+                )
+        links.update(loaded)
+        return links
+
+    async def get_url_details(self, short_code: str) -> Row | None:
+        return await self.get_url_by_code_read(short_code)
+
+    async def list_urls(
+        self,
+        sort: str = "created_at",
+        descending: bool = True,
+        limit: int = 50,
+        cursor: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        min_clicks: int | None = None,
+        url_prefix: str | None = None,
+    ) -> URLPage:
+        """
+        One page of links ordered by `sort`, then id. Keyset pagination: the
+        cursor holds the last row's (sort value, id) and the next page starts
+        right after it, so deep pages cost the same as the first. Sorting by
+        access_count follows live counts, so a link may move between pages.
+        """
+        key = LIST_SORT_COLUMNS[sort]
+        stmt = select(*URL_COLUMNS)
+        if created_from is not None:
+            stmt = stmt.where(URL.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(URL.created_at < created_to)
+        if min_clicks is not None:
+            stmt = stmt.where(URL.access_count >= min_clicks)
+        if url_prefix:
+            # The substr() condition can use the prefix index; the second one covers longer prefixes
+            stmt = stmt.where(
+                func.substr(URL.url, 1, URL_PREFIX_INDEX_LEN).startswith(
+                    url_prefix[:URL_PREFIX_INDEX_LEN], autoescape=True
+                )
+            )
+            if len(url_prefix) > URL_PREFIX_INDEX_LEN:
+                stmt = stmt.where(URL.url.startswith(url_prefix, autoescape=True))
+        if cursor is not None:
+            value, last_id = self._decode_cursor(cursor, sort)
+            position = tuple_(key, URL.id)
+            after = tuple_(literal(value, key.type), literal(last_id, URL.id.type))
+            stmt = stmt.where(position < after if descending else position > after)
+        if descending:
+            stmt = stmt.order_by(key.desc(), URL.id.desc())
+        else:
+            stmt = stmt.order_by(key.asc(), URL.id.asc())
+
+        rows = (await self.read_db.execute(stmt.limit(limit + 1))).all()
+        page = URLPage(items=[URLResponse.model_validate(row) for row in rows[:limit]])
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            page.next_cursor = self._encode_cursor(getattr(last, sort), last.id)
+        return page
+
+    @staticmethod
+    def _encode_cursor(value, last_id: uuid.UUID) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([value, str(last_id)], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            value, last_id = json.loads(raw)
+            # Only what _encode_cursor writes: an ISO timestamp or an int, then a UUID string
+            if sort == "created_at":
+                if not isinstance(value, str):
+                    raise TypeError
+                value = datetime.fromisoformat(value)
+            elif type(value) is not int:
+                raise TypeError
+            if not isinstance(last_id, str):
+                raise TypeError
+            return value, uuid.UUID(last_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def get_url_stats(
+        self,
+        short_code: str,
+        granularity: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> URLStats | None:
+        row = await self.get_url_by_code_read(short_code)
+        if not row:
+            return None
+
+        # Clicks still buffered in storage are not in access_count yet
+        stats = URLStats.model_validate(row)
+        stats.access_count += await self.storage.pending_clicks(short_code)
+
+        if granularity is not None:
+            # Rollups trail the redirects by up to CLICK_ROLLUP_INTERVAL seconds
+            series, breakdowns = await click_timeseries(self.read_db, short_code, granularity, start, end)
+            stats.granularity = granularity
+            stats.timeseries = [ClickBucket(bucket=bucket, clicks=clicks) for bucket, clicks in series]
+            stats.referrers = breakdowns["referrers"]
+            stats.user_agents = breakdowns["user_agents"]
+            stats.countries = breakdowns["countries"]
+        return stats
 
     async def update_url(self, short_code: str, url_in: URLUpdate) -> URL:
         db_obj = await self.get_url_by_code_db(short_code)
         if not db_obj:
             raise HTTPException(status_code=404, detail="URL not found")
 
+        if db_obj.url_hash is not None and db_obj.url_hash != _dedup_key(url_in):
+            db_obj.url_hash = None  # no longer the shared link for its old URL
         db_obj.url = str(url_in.url)
+        db_obj.redirect_status = url_in.redirect_status
+        db_obj.cache_max_age = url_in.cache_max_age
+        db_obj.expires_at = url_in.expires_at
+        db_obj.max_clicks = url_in.max_clicks
         self.db.add(db_obj)
-        await self.db.commit()
+        await self._commit()
         await self.db.refresh(db_obj)
 
-        # Update cache
-        await self._cache_url(short_code, str(url_in.url))
+        # Update cache, drop stale copies held by other workers and by the CDN
+        link = CachedLink.from_row(db_obj)
+        await self.cache.set(short_code, link, broadcast=True)
+        used = db_obj.access_count + await self.storage.pending_clicks(short_code) if link.max_clicks is not None else 0
+        await self.storage.set_quota(short_code, link, used)
+        purge_later(short_code)
 
         return db_obj
 
@@ -81,29 +379,76 @@ class URLService:
             raise HTTPException(status_code=404, detail="URL not found")
 
         await self.db.delete(db_obj)
-        await self.db.commit()
+        await self._commit()
 
         # Invalidate cache
-        await self.redis.delete(f"short:{short_code}")
+        await self.cache.invalidate(short_code)
+        await self.storage.clear_quotas([short_code])
+        purge_later(short_code)
 
     # Helper to clean code
     async def get_url_by_code_db(self, short_code: str) -> URL | None:
         result = await self.db.execute(select(URL).filter(URL.short_code == short_code))
         return result.scalars().first()
 
-    async def increment_access_count(self, short_code: str):
-        # We can implement this optimization: 
-        # Increment in Redis for speed, and sync to DB periodically?
-        # But requirement says "Persist async DB update" upon redirect.
-        # We will do this in the background task.
-        db_obj = await self.get_url_by_code_db(short_code)
-        if db_obj:
-            db_obj.access_count += 1
-            self.db.add(db_obj)
-            await self.db.commit()
+    async def get_url_by_code_read(self, short_code: str) -> Row | None:
+        """
+        Lookup on the read session. Falls back to the primary when the replica
+        errors, and on a miss, since a replica may not yet have replayed a
+        link created moments ago. Returns a plain row of URL_COLUMNS: read
+        paths only serialize it, so there is no ORM object to build and track.
+        """
+        stmt = select(*URL_COLUMNS).where(URL.short_code == short_code)
+        if "replica" in self.read_db.info:
+            try:
+                row = (await self.read_db.execute(stmt)).first()
+                if row:
+                    return row
+            except (SQLAlchemyError, OSError):
+                read_router.mark_failed(self.read_db)
+                await self.read_db.rollback()
+        return (await self.db.execute(stmt)).first()
+
+    async def get_links_by_codes_read(self, short_codes: list[str]) -> list[Row]:
+        """
+        Batch form of get_url_by_code_read for cache fills: one
+        `short_code = ANY(:codes)` query, and codes the replica doesn't have
+        are retried on the primary.
+        """
+        def lookup(db: AsyncSession, codes: list[str]):
+            return select(URL.short_code, URL.access_count, *LINK_COLUMNS).where(any_of(db, URL.short_code, codes))
+
+        rows = []
+        if "replica" in self.read_db.info:
+            try:
+                rows = (await self.read_db.execute(lookup(self.read_db, short_codes))).all()
+            except (SQLAlchemyError, OSError):
+                read_router.mark_failed(self.read_db)
+                await self.read_db.rollback()
+            found = {row.short_code for row in rows}
+            short_codes = [code for code in short_codes if code not in found]
+            if not short_codes:
+                return rows
+        return rows + (await self.db.execute(lookup(self.db, short_codes))).all()
 
-            # Update cache if we were caching stats, but we are only caching URL for redirect
-            # If we want to cache stats, we would set another key.
-    
-    async def _cache_url(self, short_code: str, url: str):
-        await self.redis.set(f"short:{short_code}", url, ex=CACHE_TTL)
+    def schedule_click(self, background_tasks: BackgroundTasks, short_code: str, referrer: str, user_agent: str, country: str):
+        """Record the click after the response is sent, tracked by the click_tasks_pending gauge."""
+        CLICK_TASKS_PENDING.inc()
+        background_tasks.add_task(self._record_scheduled_click, short_code, referrer, user_agent, country)
+
+    async def _record_scheduled_click(self, *args):
+        try:
+            await self.record_click(*args)
+        finally:
+            CLICK_TASKS_PENDING.dec()
+
+    async def record_click(self, short_code: str, referrer: str = "", user_agent: str = "", country: str = ""):
+        await self.storage.record_click(short_code, referrer, user_agent, country)
+
+    async def _cache_link(self, short_code: str, link: CachedLink):
+        with CACHE_FILL_TIME.time():
+            await self.cache.set(short_code, link)
+
+    async def _commit(self):
+        with COMMIT_TIME.time():
+            await self.db.commit()
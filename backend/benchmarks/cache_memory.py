@@ -0,0 +1,174 @@
+"""
+Redis memory per cached link for each redirect cache layout:
+`python -m benchmarks.cache_memory --redis-url redis://localhost:6379/15`
+from the backend directory.
+
+The same links are written through LinkCache once per layout (string keys
+and hash buckets, each with and without compression) into an empty Redis
+database, which is flushed in between. Bytes per link is the growth of
+INFO used_memory divided by the link count; "payload" is what was sent
+(keys, fields and values) for comparison. The links come from an export
+file (`python -m app.cli export`) or are generated, a --tracking share of
+them long URLs with utm_* / click-id parameters.
+
+Needs a real Redis (fakeredis does not account memory), 7.4 or later for the
+hash layout's per-field TTLs. The database must be empty; it is flushed
+again at the end.
+
+    python -m benchmarks.cache_memory --redis-url redis://localhost:6379/15 --links 200000
+    python -m benchmarks.cache_memory --redis-url redis://localhost:6379/15 --from links.ndjson.gz
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+import sys
+from collections import Counter
+
+from benchmarks.run import _configure_environment
+
+LAYOUTS = (
+    ("string", "string", False),
+    ("string+zlib", "string", True),
+    ("hash", "hash", False),
+    ("hash+zlib", "hash", True),
+)
+_CAMPAIGNS = ("spring_sale", "newsletter_weekly", "black_friday_2026", "launch", "retargeting_q3")
+_SOURCES = ("newsletter", "facebook", "twitter", "linkedin", "google", "instagram")
+_MEDIUMS = ("email", "social", "cpc", "paid", "referral")
+
+
+def _code(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=8))
+
+
+def _generated_links(count: int, tracking: float, rng: random.Random) -> dict[str, str]:
+    links = {}
+    while len(links) < count:
+        host = rng.choice(("example.com", "www.shop-example.co.uk", "blog.example.org", "news.example.net"))
+        path = "/".join(rng.choice(("products", "article", "en", "2026", "p", _code(rng).lower())) for _ in range(3))
+        url = f"https://{host}/{path}"
+        if rng.random() < tracking:
+            url += (
+                f"?utm_source={rng.choice(_SOURCES)}&utm_medium={rng.choice(_MEDIUMS)}"
+                f"&utm_campaign={rng.choice(_CAMPAIGNS)}&utm_content={_code(rng).lower()}"
+                f"&{rng.choice(('fbclid', 'gclid'))}={''.join(rng.choices(string.ascii_letters + string.digits, k=60))}"
+            )
+        links[_code(rng)] = url
+    return links
+
+
+async def _exported_links(path: str, limit: int) -> dict[str, str]:
+    from app.services.link_transfer import iter_lines
+
+    async def read_file(handle):
+        while chunk := handle.read(1 << 16):
+            yield chunk
+
+    links = {}
+    with open(path, "rb") as handle:
+        async for line in iter_lines(read_file(handle)):
+            record = json.loads(line)
+            links[record["short_code"]] = record["url"]
+            if len(links) >= limit:
+                break
+    return links
+
+
+async def _measure(args: argparse.Namespace) -> dict:
+    from app.core.config import settings
+    from app.core.redis import redis_client
+    from app.services.cached_link import CachedLink, pack
+    from app.services.link_cache import LinkCache
+
+    redis = await redis_client.get_redis()
+    if await redis.dbsize():
+        sys.exit("The Redis database is not empty; point --redis-url at a scratch database")
+    version = (await redis.info("server"))["redis_version"]
+    listpack = await redis.config_get("hash-max-listpack-*")
+
+    rng = random.Random(args.seed)
+    links = await _exported_links(args.source, args.links) if args.source else _generated_links(
+        args.links, args.tracking, rng
+    )
+    cached = {code: CachedLink(url, updated=1_760_000_000_000) for code, url in links.items()}
+    settings.CACHE_HASH_BUCKETS = args.buckets or max(1, len(cached) // 100)
+    settings.CACHE_STRING_FALLBACK = False
+    print(
+        f"Redis {version}, {len(cached)} links, {settings.CACHE_HASH_BUCKETS} buckets, "
+        + ", ".join(f"{name} {value}" for name, value in sorted(listpack.items()))
+    )
+
+    results = {}
+    try:
+        for name, encoding, compress in LAYOUTS:
+            if encoding == "hash" and tuple(map(int, version.split(".")[:2])) < (7, 4):
+                print(f"{name:<12} skipped: per-field TTLs need Redis 7.4")
+                continue
+            settings.CACHE_ENCODING = encoding
+            settings.CACHE_COMPRESS_MIN_BYTES = args.compress_min if compress else 0
+            await redis.flushdb()
+            before = (await redis.info("memory"))["used_memory"]
+            items = list(cached.items())
+            cache = LinkCache(redis)
+            for start in range(0, len(items), 1000):
+                await cache.set_many(dict(items[start:start + 1000]))
+            used = (await redis.info("memory"))["used_memory"] - before
+
+            values = sum(len(pack(link.encode())) for link in cached.values())
+            keys = sum(len(f"short:{code}") if encoding == "string" else len(code) for code in cached)
+            encodings = Counter()
+            async for key in redis.scan_iter(match="short*", count=1000):
+                encodings[await redis.object("encoding", key)] += 1
+                if sum(encodings.values()) >= 200:
+                    break
+            results[name] = {
+                "bytes_per_link": round(used / len(cached), 1),
+                "payload_bytes_per_link": round((keys + values) / len(cached), 1),
+                "encodings": dict(encodings),
+            }
+            result = results[name]
+            print(
+                f"{name:<12} {result['bytes_per_link']:>8.1f} B/link  payload {result['payload_bytes_per_link']:>7.1f} B/link  "
+                + " ".join(f"{kind}:{count}" for kind, count in encodings.most_common())
+            )
+    finally:
+        await redis.flushdb()
+        await redis_client.close()
+
+    baseline = results.get("string", {}).get("bytes_per_link")
+    if baseline:
+        for name, result in results.items():
+            print(f"{name:<12} {(result['bytes_per_link'] - baseline) / baseline * 100:+.1f}% vs string")
+    return {"config": {"redis": version, "links": len(cached), "buckets": settings.CACHE_HASH_BUCKETS}, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cache_memory")
+    parser.add_argument("--redis-url", required=True, help="An empty scratch database, e.g. redis://localhost:6379/15")
+    parser.add_argument("--links", type=int, default=100_000, help="Links to cache (at most this many from --from)")
+    parser.add_argument("--from", dest="source", metavar="PATH", help="NDJSON export to take the URLs from")
+    parser.add_argument("--tracking", type=float, default=0.5, help="Share of generated URLs with tracking parameters")
+    parser.add_argument("--buckets", type=int, help="CACHE_HASH_BUCKETS (default: one per 100 links)")
+    parser.add_argument("--compress-min", type=int, default=64, help="CACHE_COMPRESS_MIN_BYTES for the zlib layouts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    _configure_environment(argparse.Namespace(
+        database_url=None, redis_url=args.redis_url, embedded=False, rate_limits=False,
+        local_cache=False, click_events=False, fast_redirect=False,
+    ))
+    report = asyncio.run(_measure(args))
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Load test for the redirect / create / update / stats / metadata / list paths:
+`python -m benchmarks.run [options]` from the backend directory.
+
+The app runs in-process behind httpx's ASGI transport. By default it talks to
+a throwaway SQLite database and fakeredis, so the numbers measure the
+application code (queries issued, Redis round trips, serialization) rather
+than the network; pass --database-url / --redis-url to run against real
+Postgres and Redis, or --embedded for the embedded storage backend (SQLite
+file, in-process state, no Redis at all). The lifespan is not started, so background loops (click
+flusher, aggregator, listeners) stay out of the measurement; only the
+fast-path click buffer flusher runs, since redirects depend on it.
+
+    python -m benchmarks.run --workload redirect --concurrency 64 --requests 20000
+    python -m benchmarks.run --workload redirect --embedded
+    python -m benchmarks.run --json baseline.json
+    python -m benchmarks.run --compare baseline.json
+    python -m benchmarks.run --workload metadata --trace-allocations
+
+CPU time per request is the process CPU spent while the workload ran (the
+httpx client included, so compare runs rather than reading it as absolute).
+--trace-allocations adds the peak memory tracemalloc saw above the starting
+point, a proxy for per-request garbage with N requests in flight; it slows
+the run down considerably.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from itertools import accumulate
+
+WORKLOADS = ("redirect", "create", "update", "stats", "metadata", "list")
+EXPECTED_STATUS = {"redirect": 301, "create": 201, "update": 200, "stats": 200, "metadata": 200, "list": 200}
+
+
+class Counters:
+    """Database statements and Redis round trips issued while a workload runs."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.redis_round_trips = 0
+
+
+counters = Counters()
+
+
+def _configure_environment(args: argparse.Namespace) -> None:
+    # Settings are read at import time, so this must run before any app import
+    if args.embedded:
+        os.environ["STORAGE_BACKEND"] = "embedded"
+        os.environ["EMBEDDED_DB_PATH"] = f"{tempfile.mkdtemp()}/benchmark.db"
+    else:
+        database_url = args.database_url or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/benchmark.db"
+        os.environ["DATABASE_URL"] = database_url
+    for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+        os.environ.setdefault(name, "benchmark")
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    if not args.rate_limits:
+        os.environ["RATE_LIMITS"] = "{}"
+    os.environ["LOCAL_CACHE_ENABLED"] = "true" if args.local_cache else "false"
+    os.environ["CLICK_EVENTS_ENABLED"] = "true" if args.click_events else "false"
+    os.environ["REDIRECT_FAST_PATH"] = "true" if args.fast_redirect else "false"
+    os.environ.setdefault("ENVIRONMENT", "benchmark")
+
+
+def _instrument(engine, use_fakeredis: bool):
+    """Count statements on the engine and commands / pipelines sent to Redis."""
+    from redis.asyncio import Redis
+    from redis.asyncio.client import Pipeline
+    from sqlalchemy import event
+
+    from app.core.config import settings
+    from app.db.replicas import read_router
+
+    def _count_query(*_):
+        counters.db_queries += 1
+
+    # Reads may go to replicas (or the embedded backend's reader pool)
+    for counted in (engine, *(replica.engine for replica in read_router.replicas)):
+        event.listen(counted.sync_engine, "before_cursor_execute", _count_query)
+
+    if engine.dialect.name == "sqlite" and settings.STORAGE_BACKEND != "embedded":
+        @event.listens_for(engine.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA case_sensitive_like=ON")  # LIKE behaves as on Postgres
+            cursor.close()
+
+    execute_command = Redis.execute_command
+    execute_pipeline = Pipeline.execute
+
+    async def counted_command(self, *args, **options):
+        counters.redis_round_trips += 1
+        return await execute_command(self, *args, **options)
+
+    async def counted_pipeline(self, *args, **options):
+        if self.command_stack:
+            counters.redis_round_trips += 1
+        return await execute_pipeline(self, *args, **options)
+
+    # Pipeline overrides execute_command to queue, so only direct calls hit this
+    Redis.execute_command = counted_command
+    Pipeline.execute = counted_pipeline
+
+    if use_fakeredis:
+        import fakeredis
+
+        from app.core.redis import redis_client
+
+        redis_client._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def _seed(links: int) -> list[str]:
+    from sqlalchemy import insert, select
+
+    from app.db.session import AsyncSessionLocal, Base, engine
+    from app.models.url import URL
+    from app.services.code_allocator import RandomCodeAllocator
+    from app.services.code_filter import known_codes
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        existing = list(await db.scalars(select(URL.short_code).limit(links)))
+        if len(existing) < links:
+            codes = await RandomCodeAllocator().allocate(db, links - len(existing))
+            for start in range(0, len(codes), 1000):
+                await db.execute(
+                    insert(URL),
+                    [{"url": f"https://example.com/page/{code}", "short_code": code} for code in codes[start:start + 1000]],
+                )
+            await db.commit()
+            existing += codes
+        await known_codes.rebuild(db)
+    return existing
+
+
+def _zipf_picker(codes: list[str], exponent: float, rng: random.Random):
+    # Rank 1 is the most popular link; P(rank k) is proportional to 1 / k**exponent
+    cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(codes) + 1)))
+    return lambda: rng.choices(codes, cum_weights=cum_weights)[0]
+
+
+def _request_factory(workload: str, pick, api: str):
+    if workload == "redirect":
+        return lambda: ("GET", f"/{pick()}", None)
+    if workload == "create":
+        return lambda: ("POST", f"{api}/shorten", {"url": f"https://example.com/new/{random.getrandbits(64):x}"})
+    if workload == "update":
+        return lambda: ("PUT", f"{api}/shorten/{pick()}", {"url": f"https://example.com/edit/{random.getrandbits(64):x}"})
+    if workload == "metadata":
+        return lambda: ("GET", f"{api}/shorten/{pick()}", None)
+    if workload == "list":
+        return lambda: ("GET", f"{api}/shorten?limit=50", None)
+    return lambda: ("GET", f"{api}/shorten/{pick()}/stats", None)
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _AllocationTracer:
+    """Peak traced memory above the starting point between start() and stop()."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.peak_bytes = 0
+
+    def start(self) -> None:
+        if self.enabled:
+            tracemalloc.start()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+
+    def stop(self) -> None:
+        if self.enabled:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1] - self._baseline
+            tracemalloc.stop()
+
+
+async def _run_workload(
+    client, workload: str, next_request, total: int, concurrency: int, warmup: int, trace_allocations: bool = False
+) -> dict:
+    async def drive(count: int, latencies: list[float] | None, errors: dict[str, int]) -> None:
+        remaining = count
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                method, path, body = next_request()
+                started = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                elapsed = time.perf_counter() - started
+                if response.status_code != EXPECTED_STATUS[workload]:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                if latencies is not None:
+                    latencies.append(elapsed)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    await drive(warmup, None, {})
+
+    from app.services.click_buffer import flush_click_buffer
+
+    await flush_click_buffer()
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    counters.db_queries = counters.redis_round_trips = 0
+    allocations = _AllocationTracer(trace_allocations)
+    allocations.start()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await drive(total, latencies, errors)
+    duration = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    allocations.stop()
+    # Buffered fast-path clicks belong to this workload's Redis traffic
+    await flush_click_buffer()
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "rps": round(total / duration, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+        "db_queries_per_request": round(counters.db_queries / total, 3),
+        "redis_round_trips_per_request": round(counters.redis_round_trips / total, 3),
+        "cpu_ms_per_request": round(cpu / total * 1000, 4),
+        **({"alloc_peak_kib": round(allocations.peak_bytes / 1024, 1)} if trace_allocations else {}),
+    }
+
+
+@contextmanager
+def _quiet_logs():
+    import logging
+
+    previous = logging.root.manager.disable
+    logging.disable(logging.WARNING)
+    try:
+        yield
+    finally:
+        logging.disable(previous)
+
+
+async def _benchmark(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app.core.config import settings
+    from app.core.redis import redis_client
+    from app.db.session import engine
+    from app.services.click_buffer import run_click_buffer_flusher
+    from main import app
+
+    _instrument(engine, use_fakeredis=not args.redis_url and not args.embedded)
+    rng = random.Random(args.seed)
+    # The only background loop that belongs on the request path's bill
+    flusher = asyncio.create_task(run_click_buffer_flusher())
+    try:
+        codes = await _seed(args.links)
+        rng.shuffle(codes)
+        pick = _zipf_picker(codes, args.zipf, rng)
+
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for workload in args.workload or WORKLOADS:
+                next_request = _request_factory(workload, pick, settings.API_V1_STR)
+                with _quiet_logs():
+                    results[workload] = await _run_workload(
+                        client, workload, next_request, args.requests, args.concurrency, args.warmup,
+                        args.trace_allocations,
+                    )
+                _print_result(workload, results[workload])
+    finally:
+        flusher.cancel()
+        await redis_client.close()
+        await engine.dispose()
+
+    return {
+        "config": {
+            "database": engine.dialect.name,
+            "storage": settings.STORAGE_BACKEND,
+            "redis": "none" if args.embedded else "redis" if args.redis_url else "fakeredis",
+            "links": args.links,
+            "zipf": args.zipf,
+            "local_cache": args.local_cache,
+            "click_events": args.click_events,
+            "fast_redirect": args.fast_redirect,
+            "rate_limits": args.rate_limits,
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+
+
+def _print_result(workload: str, result: dict) -> None:
+    latency = result["latency_ms"]
+    errors = f"  errors {result['errors']}" if result["errors"] else ""
+    peak = f"  alloc peak {result['alloc_peak_kib']:>8.1f}KiB" if "alloc_peak_kib" in result else ""
+    print(
+        f"{workload:<9} {result['rps']:>9.1f} req/s  "
+        f"p50 {latency['p50']:>7.2f}ms  p95 {latency['p95']:>7.2f}ms  p99 {latency['p99']:>7.2f}ms  "
+        f"db/req {result['db_queries_per_request']:>5.2f}  redis/req {result['redis_round_trips_per_request']:>5.2f}  "
+        f"cpu/req {result['cpu_ms_per_request']:>6.3f}ms{peak}{errors}"
+    )
+
+
+def _print_comparison(baseline: dict, current: dict) -> None:
+    print("\nChange vs baseline (negative latency / query counts are improvements):")
+    for workload, result in current["results"].items():
+        before = baseline.get("results", {}).get(workload)
+        if not before:
+            continue
+
+        def change(new: float, old: float) -> str:
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(
+            f"{workload:<9} rps {change(result['rps'], before['rps']):>8}  "
+            f"p50 {change(result['latency_ms']['p50'], before['latency_ms']['p50']):>8}  "
+            f"p99 {change(result['latency_ms']['p99'], before['latency_ms']['p99']):>8}  "
+            f"db/req {result['db_queries_per_request'] - before['db_queries_per_request']:+.2f}  "
+            f"redis/req {result['redis_round_trips_per_request'] - before['redis_round_trips_per_request']:+.2f}"
+            + (f"  cpu/req {change(result['cpu_ms_per_request'], before['cpu_ms_per_request']):>8}"
+               if "cpu_ms_per_request" in before else "")
+            + (f"  alloc peak {change(result['alloc_peak_kib'], before['alloc_peak_kib']):>8}"
+               if "alloc_peak_kib" in result and "alloc_peak_kib" in before else "")
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--workload", action="append", choices=WORKLOADS,
+                        help="Workload to run; repeat for several (default: all)")
+    parser.add_argument("--requests", type=int, default=5000, help="Measured requests per workload")
+    parser.add_argument("--warmup", type=int, default=500, help="Unmeasured requests before each workload")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--links", type=int, default=10000, help="Links seeded before the run")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for link popularity (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="SQLAlchemy URL (default: temporary SQLite file)")
+    parser.add_argument("--redis-url", help="Redis URL (default: in-process fakeredis)")
+    parser.add_argument("--embedded", action="store_true",
+                        help="STORAGE_BACKEND=embedded: a temporary SQLite file and no Redis")
+    parser.add_argument("--no-local-cache", dest="local_cache", action="store_false",
+                        help="Disable the per-worker L1 cache")
+    parser.add_argument("--no-click-events", dest="click_events", action="store_false",
+                        help="Skip the analytics event on redirects")
+    parser.add_argument("--no-fast-redirect", dest="fast_redirect", action="store_false",
+                        help="Serve redirects through the FastAPI route instead of the ASGI fast path")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the configured rate limits")
+    parser.add_argument("--trace-allocations", action="store_true",
+                        help="Report peak traced memory during each workload (tracemalloc; slow)")
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON ('-' for stdout)")
+    parser.add_argument("--compare", metavar="PATH", help="Print the change against a previous --json run")
+    args = parser.parse_args()
+
+    _configure_environment(args)
+    report = asyncio.run(_benchmark(args))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            _print_comparison(json.load(baseline), report)
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
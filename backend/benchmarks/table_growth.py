@@ -0,0 +1,199 @@
+"""
+Insert, lookup and click-flush latency on the urls table as it grows:
+`python -m benchmarks.table_growth` from the backend directory.
+
+The table is bulk-filled with generated links up to each checkpoint (three
+per decade up to --rows). At each checkpoint the script times --samples
+single-link creates and primary lookups, plus click flushes of --samples
+codes at a time:
+- A create is the INSERT ... ON CONFLICT DO NOTHING RETURNING and COMMIT
+  that the create path issues.
+- A lookup is the SELECT by short_code behind a redirect cache miss.
+- A click flush is apply_click_deltas.
+Lookups pick codes uniformly, so most of them miss whatever the database
+keeps cached.
+
+By default it runs against a throwaway SQLite file. Pass --database-url for
+Postgres; the database must not have a urls table yet, and the table is
+dropped at the end. Set URLS_PARTITIONS to compare the partitioned layout,
+and --ids uuid4 to compare random primary keys with the time-ordered ones.
+On Postgres the heap and index sizes per link are reported too.
+
+    python -m benchmarks.table_growth --rows 1000000
+    python -m benchmarks.table_growth --database-url postgresql+asyncpg://localhost/scratch --ids uuid4
+    URLS_PARTITIONS=16 python -m benchmarks.table_growth --database-url postgresql+asyncpg://localhost/scratch
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+import sys
+import time
+import uuid
+from collections import Counter
+
+from benchmarks.run import _configure_environment, _percentile
+
+FILL_CHUNK = 1000
+
+
+def _checkpoints(rows: int) -> list[int]:
+    points, decade = [], 10_000
+    while decade < rows:
+        points += [point for point in (decade, 3 * decade) if point < rows]
+        decade *= 10
+    return points + [rows]
+
+
+def _code(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=8))
+
+
+def _row(code: str, new_id) -> dict:
+    return {"id": new_id(), "url": f"https://example.com/page/{code}", "short_code": code, "access_count": 0}
+
+
+def _latencies(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {"p50_ms": round(_percentile(ordered, 0.5) * 1000, 3), "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3)}
+
+
+async def _sizes(db) -> dict:
+    from sqlalchemy import text
+
+    if db.bind.dialect.name != "postgresql":
+        return {}
+    # Summed over the partitions; a plain table is its own only leaf
+    heap, indexes = (await db.execute(text(
+        "SELECT sum(pg_table_size(relid)), sum(pg_indexes_size(relid)) FROM pg_partition_tree('urls') WHERE isleaf"
+    ))).one()
+    return {"heap_bytes": int(heap), "index_bytes": int(indexes)}
+
+
+async def _measure(args: argparse.Namespace) -> dict:
+    from sqlalchemy import inspect, select
+
+    from app.core.config import settings
+    from app.db.dialect import insert
+    from app.db.session import AsyncSessionLocal, Base, engine
+    from app.models.url import URL, uuid7
+    from app.services.click_counter import apply_click_deltas
+
+    async with engine.begin() as conn:
+        if await conn.run_sync(lambda sync: inspect(sync).has_table("urls")):
+            sys.exit("The database already has a urls table; point --database-url at a scratch database")
+        await conn.run_sync(Base.metadata.create_all)
+
+    new_id = uuid7 if args.ids == "uuid7" else uuid.uuid4
+    rng = random.Random(args.seed)
+    codes: list[str] = []
+    print(
+        f"{engine.dialect.name}, {settings.URLS_PARTITIONS or 'no'} partitions, {args.ids} ids, "
+        f"{args.samples} samples per checkpoint"
+    )
+    results = []
+    try:
+        async with AsyncSessionLocal() as db:
+            for checkpoint in _checkpoints(args.rows):
+                filled_from, started = len(codes), time.perf_counter()
+                while len(codes) < checkpoint:
+                    chunk = [_code(rng) for _ in range(min(FILL_CHUNK, checkpoint - len(codes)))]
+                    inserted = await db.scalars(
+                        insert(db, URL)
+                        .values([_row(code, new_id) for code in chunk])
+                        .on_conflict_do_nothing(index_elements=[URL.short_code])
+                        .returning(URL.short_code)
+                    )
+                    codes += inserted.all()
+                    await db.commit()
+                fill_seconds = time.perf_counter() - started
+
+                inserts = []
+                for _ in range(args.samples):
+                    code = _code(rng)
+                    started = time.perf_counter()
+                    inserted = await db.scalar(
+                        insert(db, URL)
+                        .values(_row(code, new_id))
+                        .on_conflict_do_nothing(index_elements=[URL.short_code])
+                        .returning(URL.short_code)
+                    )
+                    await db.commit()
+                    inserts.append(time.perf_counter() - started)
+                    if inserted:
+                        codes.append(inserted)
+
+                lookups = []
+                for _ in range(args.samples):
+                    code = rng.choice(codes)
+                    started = time.perf_counter()
+                    await db.execute(select(URL.url, URL.updated_at).where(URL.short_code == code))
+                    lookups.append(time.perf_counter() - started)
+                await db.commit()
+
+                deltas = Counter(rng.choice(codes) for _ in range(args.samples))
+                started = time.perf_counter()
+                await apply_click_deltas(db, list(deltas.items()))
+                await db.commit()
+                flush_ms = (time.perf_counter() - started) * 1000
+
+                result = {
+                    "rows": len(codes),
+                    "fill_rows_per_sec": round((len(codes) - filled_from) / fill_seconds) if fill_seconds else None,
+                    "insert": _latencies(inserts),
+                    "lookup": _latencies(lookups),
+                    "click_flush_ms": round(flush_ms, 2),
+                    **await _sizes(db),
+                }
+                results.append(result)
+                sizes = (
+                    f"  heap {result['heap_bytes'] / len(codes):>6.1f} B/link  index {result['index_bytes'] / len(codes):>6.1f} B/link"
+                    if "heap_bytes" in result else ""
+                )
+                print(
+                    f"{len(codes):>11,} rows  insert p50 {result['insert']['p50_ms']:>7.3f} ms p95 {result['insert']['p95_ms']:>7.3f} ms  "
+                    f"lookup p50 {result['lookup']['p50_ms']:>7.3f} ms p95 {result['lookup']['p95_ms']:>7.3f} ms  "
+                    f"flush {result['click_flush_ms']:>8.2f} ms{sizes}"
+                )
+    finally:
+        if engine.dialect.name == "postgresql":
+            async with engine.begin() as conn:
+                await conn.run_sync(URL.__table__.drop)
+        await engine.dispose()
+
+    return {
+        "config": {
+            "database": engine.dialect.name, "partitions": settings.URLS_PARTITIONS, "ids": args.ids,
+            "samples": args.samples,
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.table_growth")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Links in the table at the last checkpoint")
+    parser.add_argument("--samples", type=int, default=1000, help="Timed creates and lookups per checkpoint")
+    parser.add_argument("--ids", choices=("uuid7", "uuid4"), default="uuid7", help="Primary keys for new links")
+    parser.add_argument("--database-url", help="SQLAlchemy URL of a scratch database (default: temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON ('-' for stdout)")
+    args = parser.parse_args()
+
+    _configure_environment(argparse.Namespace(
+        database_url=args.database_url, redis_url=None, embedded=False, rate_limits=False,
+        local_cache=False, click_events=False, fast_redirect=False,
+    ))
+    report = asyncio.run(_measure(args))
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
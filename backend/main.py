@@ -1,31 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI, Depends, Request, Response, BackgroundTasks
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 
 from app.core.config import settings
 from app.core.exceptions import http_exception_handler, generic_exception_handler
 from app.api.v1.endpoints import urls
-from app.api.deps import get_url_service
+from app.api.deps import get_url_service, RateLimit
 from app.services.url_service import URLService
+from app.api.fast_redirect import FastRedirectMiddleware
+from app.services.click_buffer import run_click_buffer_flusher, flush_click_buffer
+from app.services.click_counter import run_click_flusher, flush_clicks
+from app.services.redirect_policy import not_modified, redirect_headers
+from app.services import cdn_purge
+from app.services.click_events import run_click_aggregator
+from app.services.link_cache import run_invalidation_listener
+from app.services.link_expiry import run_link_sweeper
+from app.services.code_filter import run_code_filter_rebuilder
+from app.services.cache_warmup import warm_cache_on_startup
+from app.services.storage import get_storage
+from app.core.metrics import MetricsMiddleware, metrics_response
+from app.core.cache_store import cache_store
+from app.core.redis import redis_client
+from app.db.base import create_schema
+from app.db.replicas import run_replica_monitor
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-# Setup Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.STORAGE_BACKEND == "embedded":
+        await create_schema()
+    tasks = [
+        asyncio.create_task(run_click_buffer_flusher()),
+        asyncio.create_task(run_click_flusher()),
+        asyncio.create_task(run_click_aggregator()),
+        asyncio.create_task(run_invalidation_listener()),
+        asyncio.create_task(run_code_filter_rebuilder()),
+        asyncio.create_task(run_replica_monitor()),
+        asyncio.create_task(run_link_sweeper()),
+    ]
+    if settings.CACHE_WARMUP_ON_STARTUP:
+        tasks.append(asyncio.create_task(warm_cache_on_startup()))
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    # Don't leave this worker's last clicks waiting for another worker's recovery pass
+    await flush_click_buffer()
+    await flush_clicks()
+    await (await get_storage()).close()
+    await cdn_purge.close()
+    await cache_store.close()
+    await redis_client.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    default_response_class=JSONResponse
+    # No default_response_class: routes with a response_model then go straight
+    # to JSON bytes in pydantic-core instead of dict -> jsonable_encoder -> json.dumps
 )
 
-# State for limiter
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+# Answers GET /{short_code} before FastAPI routing; redirect_to_url below is the fallback
+if settings.REDIRECT_FAST_PATH:
+    app.add_middleware(FastRedirectMiddleware)
 
 # CORS
 if settings.BACKEND_CORS_ORIGINS:
@@ -37,6 +79,9 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Request count / latency per route
+app.add_middleware(MetricsMiddleware)
+
 # Exception Handlers
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
@@ -48,31 +93,46 @@ app.include_router(urls.router, prefix=settings.API_V1_STR, tags=["urls"])
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
 # Root Redirect Endpoint
 @app.get("/{short_code}", response_class=RedirectResponse, status_code=301)
-@limiter.limit("10/minute")
 async def redirect_to_url(
     request: Request,
     short_code: str,
     background_tasks: BackgroundTasks,
-    service: URLService = Depends(get_url_service)
+    service: URLService = Depends(get_url_service),
+    rate_limit_headers: dict[str, str] = Depends(RateLimit("redirect"))
 ):
     """
     Redirect to original URL.
-    Rate Limit: 10 requests per minute per IP.
+    Rate Limit: settings.RATE_LIMITS["redirect"] (10 requests per minute per IP by default).
+    Status and Cache-Control follow the link's policy (REDIRECT_* settings by default).
     """
-    url = await service.get_url(short_code)
+    link = await service.get_link(short_code)
     
-    if not url:
-        # Per requirements: "Graceful 429" is handled by SlowAPI, but for 404 we return standard 404
+    if not link:
+        # Per requirements: "Graceful 429" is handled by RateLimit, but for 404 we return standard 404
         # Requirement says "Return 404 if not found" for GET /shorten/{shortCode} metadata.
         # For redirect, it also implies 404 if not found.
         # We can throw HTTPException here.
         raise StarletteHTTPException(status_code=404, detail="URL not found")
+    if not await service.storage.admit_click(short_code, link):
+        raise StarletteHTTPException(status_code=410, detail="URL has expired")
 
     # Persist async DB update
-    background_tasks.add_task(service.increment_access_count, short_code)
-    
-    return RedirectResponse(url=url, status_code=301)
-
+    service.schedule_click(
+        background_tasks,
+        short_code,
+        request.headers.get("referer", ""),
+        request.headers.get("user-agent", ""),
+        request.headers.get(settings.CLICK_COUNTRY_HEADER, ""),
+    )
 
+    status_code, policy_headers = redirect_headers(link)
+    headers = {**rate_limit_headers, **{name.decode(): value.decode() for name, value in policy_headers}}
+    if not_modified(link, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return RedirectResponse(url=link.url, status_code=status_code, headers=headers)
@@ -5,4 +5,6 @@ echo "Running migrations..."
 alembic upgrade head
 
 echo "Starting server..."
-exec uvicorn main:app --host 0.0.0.0 --port 8000 --proxy-headers --forwarded-allow-ips '*'
+# Worker count, event loop and HTTP parser come from Settings
+# (WEB_CONCURRENCY, SERVER_LOOP, SERVER_HTTP); see app/server.py.
+exec python -m app.server
@@ -0,0 +1,95 @@
+"""
+The app against a throwaway SQLite file and fakeredis, as in benchmarks/run.py:
+`python -m pytest` from the backend directory.
+
+Settings are read at import time, so the environment is set up here, before
+any app module is imported. Tests share one event loop (the session-scoped
+schema fixture keeps it open). Every test that uses `redis` gets an empty
+fakeredis and empty tables.
+"""
+import argparse
+
+import pytest
+
+from benchmarks.run import _configure_environment
+
+_configure_environment(argparse.Namespace(
+    database_url=None, redis_url=None, embedded=False, rate_limits=False,
+    local_cache=False, click_events=True, fast_redirect=False,
+))
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def schema(anyio_backend):
+    from app.db.base import create_schema
+    from app.db.session import engine
+
+    await create_schema()
+    yield
+    await engine.dispose()
+
+
+@pytest.fixture
+async def redis(schema):
+    import fakeredis
+
+    from app.core.cache_store import cache_store
+    from app.core.redis import redis_client
+    from app.db.base import Base, create_schema
+    from app.db.session import engine
+    from app.services import storage
+
+    redis_client._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    # Singletons built on the previous client
+    cache_store.shards, cache_store._ring = [], None
+    storage._storage = None
+    yield redis_client._redis
+    await redis_client._redis.aclose()
+    async with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            await conn.execute(table.delete())
+    await create_schema()  # seeds the click stream offset again
+
+
+@pytest.fixture
+async def db(redis):
+    from app.db.session import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+async def client(redis):
+    import httpx
+
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def replica(redis, tmp_path, monkeypatch):
+    """A read replica that has replayed nothing: its own empty SQLite file, the only one in read_router."""
+    import itertools
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db.base import Base
+    from app.db.replicas import Replica, read_router
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica = Replica("replica-0", engine)
+    replica.lag = 0.0
+    monkeypatch.setattr(read_router, "replicas", [replica])
+    monkeypatch.setattr(read_router, "_cycle", itertools.cycle([replica]))
+    yield replica
+    await engine.dispose()
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def _bulk(client, items: list[dict]) -> list[dict]:
+    response = await client.post("/api/v1/shorten/bulk", json=items)
+    assert response.status_code == 201
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["error"] for line in lines] == [None] * len(items)
+    return [line["result"] for line in sorted(lines, key=lambda line: line["index"])]
+
+
+async def test_bulk_keeps_policy_and_limits(client):
+    expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    plain, gone, limited = await _bulk(client, [
+        {"url": "https://example.com/plain"},
+        {"url": "https://example.com/expired", "expires_at": expired},
+        {"url": "https://example.com/limited", "max_clicks": 1, "redirect_status": 302, "cache_max_age": 60},
+    ])
+    assert gone["expires_at"] is not None
+    assert (limited["max_clicks"], limited["redirect_status"], limited["cache_max_age"]) == (1, 302, 60)
+
+    assert (await client.get(f"/{plain['short_code']}")).status_code == 301
+    assert (await client.get(f"/{gone['short_code']}")).status_code == 410
+    assert (await client.get(f"/{limited['short_code']}")).status_code == 302
+    assert (await client.get(f"/{limited['short_code']}")).status_code == 410
+
+
+async def test_bulk_dedup_skips_links_with_limits(client, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_URLS", True)
+    url = "https://example.com/shared"
+    first, second, limited = await _bulk(client, [{"url": url}, {"url": url}, {"url": url, "max_clicks": 5}])
+    assert first["short_code"] == second["short_code"]
+    assert limited["short_code"] != first["short_code"]
+    assert limited["max_clicks"] == 5
+
+    again, = await _bulk(client, [{"url": url}])
+    assert again["short_code"] == first["short_code"]
+
+
+async def test_bulk_ndjson_reports_bad_items_by_index(client):
+    body = '{"url": "https://example.com/1"}\n{"url": "https://example.com/2", "max_clicks": 0}\nnot json\n'
+    body += "".join(f'{{"url": "https://example.com/n{i}"}}\n' for i in range(250))
+    response = await client.post(
+        "/api/v1/shorten/bulk", content=body, headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 201
+    lines = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+    assert sorted(lines) == list(range(253))
+    assert [index for index, line in lines.items() if line["error"]] == [1, 2]
+    codes = {line["result"]["short_code"] for line in lines.values() if line["result"]}
+    assert len(codes) == 251
+    assert lines[3]["result"]["url"] == "https://example.com/n0"
+
+
+async def test_bulk_rejects_oversized_arrays(client, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_MAX_BATCH_SIZE", 2)
+    response = await client.post("/api/v1/shorten/bulk", json=[{"url": "https://example.com/"}] * 3)
+    assert response.status_code == 413
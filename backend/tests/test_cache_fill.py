@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.url import URL
+from app.services.cache_warmup import warm_cache
+from app.services.cached_link import CachedLink
+from app.services.link_cache import LinkCache
+from app.services.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+LINK = CachedLink("https://example.com/fill")
+
+
+async def test_concurrent_misses_share_one_load(redis):
+    cache = LinkCache(redis)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        await cache.set("fill1", LINK)
+        return LINK
+
+    assert await asyncio.gather(*(cache.load("fill1", loader) for _ in range(5))) == [LINK] * 5
+    assert calls == 1
+    assert not await redis.exists("lock:short:fill1")
+
+
+async def test_waiters_see_the_loaders_error(redis):
+    cache = LinkCache(redis)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    results = await asyncio.gather(*(cache.load("fill2", loader) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # Nothing is left in flight: the next miss loads again
+    assert await cache.load("fill2", lambda: asyncio.sleep(0, LINK)) == LINK
+
+
+async def test_waits_for_another_workers_fill(redis, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_FILL_WAIT_MS", 2000)
+    cache = LinkCache(redis)
+    await redis.set("lock:short:fill3", "1")  # held by another worker
+
+    async def other_worker():
+        await asyncio.sleep(0.05)
+        await cache.set("fill3", LINK)
+
+    async def loader():
+        raise AssertionError("the database should not be queried")
+
+    filling = asyncio.create_task(other_worker())
+    assert await cache.load("fill3", loader) == LINK
+    await filling
+
+
+async def test_loads_itself_when_the_lock_holder_is_slow(redis, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_FILL_WAIT_MS", 50)
+    cache = LinkCache(redis)
+    await redis.set("lock:short:fill4", "1")
+    assert await cache.load("fill4", lambda: asyncio.sleep(0, LINK)) == LINK
+
+
+async def test_warm_up_loads_the_most_clicked(db, redis):
+    await db.execute(insert(db, URL).values([
+        {"url": f"https://example.com/{count}", "short_code": f"warm{count}", "access_count": count}
+        for count in (5, 50, 500)
+    ]))
+    await db.commit()
+    storage = await get_storage()
+    assert await warm_cache(db, storage, top_n=2) == 2
+    assert await storage.cache.get("warm5") is None
+    assert CachedLink.decode(await storage.cache.get("warm500")).url == "https://example.com/500"
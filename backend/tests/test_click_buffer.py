@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.click_buffer import ClickBuffer
+from app.services.click_counter import PENDING_KEY
+from app.services.click_events import STREAM_KEY
+from app.services.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+CHROME = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+
+async def test_flush_writes_counts_and_events(redis):
+    buffer = ClickBuffer()
+    for _ in range(3):
+        buffer.add("buf1", "https://news.example.com/", CHROME, "de")
+    buffer.add("buf2", "", "", "")
+
+    assert await buffer.flush(await get_storage()) == 4
+    assert await redis.hgetall(PENDING_KEY) == {"buf1": "3", "buf2": "1"}
+    entries = [fields for _, fields in await redis.xrange(STREAM_KEY)]
+    assert entries == [
+        {"c": "buf1", "r": "news.example.com", "u": "chrome", "g": "DE", "n": "3"},
+        {"c": "buf2", "r": "", "u": "", "g": ""},
+    ]
+    assert buffer.pending() == 0
+
+
+@pytest.mark.parametrize("applied", [False, True])
+async def test_failed_batch_is_counted_once(redis, monkeypatch, applied):
+    storage = await get_storage()
+    record_clicks = storage.record_clicks
+
+    async def fail(clicks, events, batch_id):
+        if applied:  # e.g. a timeout after Redis ran the batch
+            await record_clicks(clicks, events, batch_id)
+        raise TimeoutError
+
+    buffer = ClickBuffer()
+    buffer.add("buf3", "", "", "")
+    buffer.add("buf3", "", "", "")
+    monkeypatch.setattr(storage, "record_clicks", fail)
+    with pytest.raises(TimeoutError):
+        await buffer.flush(storage)
+    buffer.add("buf3", "", "", "")
+    with pytest.raises(TimeoutError):
+        await buffer.flush(storage)  # the retry fails too; the new click waits
+    assert buffer.pending() == 3
+
+    monkeypatch.undo()
+    assert await buffer.flush(storage) == 3
+    assert await redis.hget(PENDING_KEY, "buf3") == "3"
+    assert await redis.xlen(STREAM_KEY) == 2
+    assert buffer.pending() == 0
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.click_flush import ClickFlush
+from app.models.url import URL
+from app.services import click_counter
+from app.services.click_counter import BATCH_KEY_PREFIX, BATCHES_KEY, PENDING_KEY, ClickCounter
+
+pytestmark = pytest.mark.anyio
+
+
+async def _link(db, short_code: str) -> None:
+    await db.execute(insert(db, URL).values(url="https://example.com/", short_code=short_code))
+    await db.commit()
+
+
+async def _access_count(db, short_code: str) -> int:
+    db.expire_all()
+    return await db.scalar(select(URL.access_count).where(URL.short_code == short_code))
+
+
+async def test_flush_moves_clicks_into_access_count(db, redis):
+    await _link(db, "cc1")
+    counter = ClickCounter(redis)
+    await counter.incr("cc1", 3)
+
+    assert await counter.pending("cc1") == 3
+    assert await counter.flush(db) == 3
+    assert await _access_count(db, "cc1") == 3
+    assert await counter.pending("cc1") == 0
+    assert not await redis.exists(PENDING_KEY)
+    assert await redis.scard(BATCHES_KEY) == 0
+
+
+async def test_failed_flush_keeps_the_clicks(db, redis, monkeypatch):
+    await _link(db, "cc2")
+    counter = ClickCounter(redis)
+    await counter.incr("cc2", 4)
+
+    async def fail(db, deltas):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(click_counter, "apply_click_deltas", fail)
+    with pytest.raises(RuntimeError):
+        await counter.flush(db)
+    monkeypatch.undo()
+
+    # Counted while the batch waits for a retry, and not lost to new clicks
+    await counter.incr("cc2")
+    assert await counter.pending("cc2") == 5
+    assert await _access_count(db, "cc2") == 0
+
+    # Young batches are left to the worker that made them; past the recovery age anyone retries
+    assert await counter.flush(db) == 1
+    monkeypatch.setattr(settings, "CLICK_FLUSH_RECOVERY_AGE", 0)
+    assert await counter.flush(db) == 4
+    assert await _access_count(db, "cc2") == 5
+    assert await counter.pending("cc2") == 0
+
+
+async def test_batch_is_applied_once(db, redis, monkeypatch):
+    await _link(db, "cc3")
+    counter = ClickCounter(redis)
+    await counter.incr("cc3", 2)
+    await counter.flush(db)
+
+    # A worker that committed and died before deleting its batch key leaves it registered
+    (batch_id,) = await db.scalars(select(ClickFlush.batch_id))
+    batch_key = f"{BATCH_KEY_PREFIX}{batch_id}"
+    await redis.hset(batch_key, "cc3", 2)
+    await redis.sadd(BATCHES_KEY, batch_key)
+
+    monkeypatch.setattr(settings, "CLICK_FLUSH_RECOVERY_AGE", 0)
+    assert await counter.flush(db) == 0
+    assert await _access_count(db, "cc3") == 2
+    assert await redis.scard(BATCHES_KEY) == 0
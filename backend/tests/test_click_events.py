@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models.click_rollup import ClickStreamOffset
+from app.services import click_events
+from app.services.click_events import STREAM_KEY, click_dimensions
+from app.services.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+CHROME = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+
+def test_click_dimensions():
+    assert click_dimensions("https://News.example.com/a?b", CHROME, "de") == ("news.example.com", "chrome", "DE")
+    assert click_dimensions("", "curl/8.4.0", "") == ("", "tool", "")
+    assert click_dimensions("http://[bad", "Googlebot/2.1", "usa") == ("", "bot", "US")
+
+
+async def _stats(client, code: str, granularity: str) -> dict:
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    response = await client.get(
+        f"/api/v1/shorten/{code}/stats", params={"granularity": granularity, "from": start.isoformat()}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_clicks_reach_the_stats(client, db):
+    code = (await client.post("/api/v1/shorten", json={"url": "https://example.com/stats"})).json()["short_code"]
+    storage = await get_storage()
+    for _ in range(2):
+        await storage.record_click(code, "https://news.example.com/", CHROME, "DE")
+    await storage.record_click(code, "", "curl/8.4.0", "")
+
+    assert await storage.aggregate_click_events(db) == 3
+    assert await storage.aggregate_click_events(db) == 0  # the offset moved past them
+
+    for granularity in ("minute", "hour", "day"):
+        stats = await _stats(client, code, granularity)
+        assert sum(bucket["clicks"] for bucket in stats["timeseries"]) == 3
+        assert stats["referrers"] == {"news.example.com": 2, "unknown": 1}
+        assert stats["user_agents"] == {"chrome": 2, "tool": 1}
+        assert stats["countries"] == {"DE": 2, "unknown": 1}
+
+
+async def test_failed_aggregation_counts_the_events_once_later(db, redis, monkeypatch):
+    storage = await get_storage()
+    await storage.record_click("agg1", "", CHROME, "")
+
+    async def fail(db, counts):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(click_events, "write_rollups", fail)
+    with pytest.raises(RuntimeError):
+        await storage.aggregate_click_events(db)
+    monkeypatch.undo()
+    assert await db.scalar(select(ClickStreamOffset.last_id)) == "0-0"
+    assert await redis.xlen(STREAM_KEY) == 1
+
+    await storage.record_click("agg1", "", CHROME, "")
+    assert await storage.aggregate_click_events(db) == 2
+    assert await storage.aggregate_click_events(db) == 0
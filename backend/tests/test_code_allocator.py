@@ -0,0 +1,53 @@
+import asyncio
+import itertools
+
+import pytest
+
+from app.core.config import settings
+from app.services.code_allocator import _STRIDE_QUERY, BASE62_ALPHABET, CODE_LENGTH, SequenceBlockAllocator
+
+pytestmark = pytest.mark.anyio
+
+
+class _Sequence:
+    """Stands in for the session: short_code_blocks with START 1 INCREMENT BY `stride`."""
+
+    def __init__(self, stride: int):
+        self.stride = stride
+        self.values = itertools.count(1, stride)
+        self.calls = 0
+
+    async def scalar(self, statement):
+        await asyncio.sleep(0)
+        if statement is _STRIDE_QUERY:
+            return self.stride
+        self.calls += 1
+        return next(self.values)
+
+
+async def test_sequence_codes_are_distinct_across_blocks_and_workers():
+    sequence = _Sequence(stride=10)
+    workers = [SequenceBlockAllocator() for _ in range(2)]
+    batches = await asyncio.gather(*(worker.allocate(sequence, 7) for worker in workers * 3))
+    codes = [code for batch in batches for code in batch]
+
+    assert len(codes) == len(set(codes)) == 42
+    assert all(len(code) == CODE_LENGTH and set(code) <= set(BASE62_ALPHABET) for code in codes)
+    # One round trip per block of 10, not per code: 21 codes are 3 blocks for each worker
+    assert sequence.calls == 6
+
+
+async def test_block_size_comes_from_the_sequence(monkeypatch):
+    # Workers started with different CODE_BLOCK_SIZE settings still lease disjoint ranges
+    sequence = _Sequence(stride=10)
+    codes = []
+    for block_size in (10, 1000, 3):
+        monkeypatch.setattr(settings, "CODE_BLOCK_SIZE", block_size)
+        codes += await SequenceBlockAllocator().allocate(sequence, 10)
+    assert len(set(codes)) == 30
+
+
+async def test_sequential_ids_are_scattered():
+    codes = await SequenceBlockAllocator().allocate(_Sequence(stride=100), 100)
+    assert codes != sorted(codes)
+    assert len({code[:4] for code in codes}) > 50
@@ -0,0 +1,96 @@
+import pytest
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.url import URL
+from app.services.cached_link import MISSING
+from app.services.code_filter import CodeFilter, known_codes
+from app.services.storage import get_storage
+from app.services.url_service import URLService
+
+pytestmark = pytest.mark.anyio
+
+
+def test_bloom_has_no_false_negatives():
+    bloom = BloomFilter(5000, 0.01)
+    codes = [f"code{i}" for i in range(5000)]
+    for code in codes:
+        bloom.add(code)
+    assert all(code in bloom for code in codes)
+
+    false_positives = sum(f"other{i}" in bloom for i in range(20000))
+    assert false_positives < 20000 * 0.03
+    assert bloom.estimated_false_positive_rate < 0.03
+
+
+class _Scan:
+    """Stands in for the session; the filter learns of `created` codes halfway through the scan."""
+
+    def __init__(self, codes: list[str], code_filter: CodeFilter, created: list[str]):
+        self.codes, self.code_filter, self.created = codes, code_filter, created
+
+    async def stream_scalars(self, statement):
+        async def rows():
+            for index, code in enumerate(self.codes):
+                if index == len(self.codes) // 2:
+                    for created in self.created:
+                        self.code_filter.add(created)
+                yield code
+        return rows()
+
+
+async def test_rebuild_keeps_codes_created_during_the_scan(monkeypatch):
+    monkeypatch.setattr(settings, "BLOOM_CAPACITY", 4)  # too small: the rebuild resizes
+    code_filter = CodeFilter()
+    assert not code_filter.ready and code_filter.might_contain("anything")
+
+    codes = [f"scan{i}" for i in range(10)]
+    await code_filter.rebuild(_Scan(codes, code_filter, ["new1", "new2"]))
+    assert code_filter.ready
+    assert all(code_filter.might_contain(code) for code in [*codes, "new1", "new2"])
+    assert code_filter.bloom.count <= code_filter.bloom.capacity
+
+    code_filter.add("later")  # created after the swap
+    assert code_filter.might_contain("later")
+
+
+@pytest.fixture
+async def ready_filter(db):
+    await db.execute(insert(db, URL).values(url="https://example.com/known", short_code="known1"))
+    await db.commit()
+    await known_codes.rebuild(db)
+    yield known_codes
+    known_codes.mark_stale()
+
+
+async def test_unknown_codes_are_rejected_without_a_query(client, db, ready_filter, monkeypatch):
+    async def no_query(self, short_code):
+        raise AssertionError("queried the database")
+
+    rejected = ready_filter.rejected
+    with monkeypatch.context() as patch:
+        patch.setattr(URLService, "get_url_by_code_read", no_query)
+        assert (await client.get("/nosuchcode")).status_code == 404
+    assert ready_filter.rejected == rejected + 1
+
+    # Known codes still reach the database on a cache miss
+    assert (await client.get("/known1")).headers["location"] == "https://example.com/known"
+
+
+async def test_false_positives_are_cached_as_misses(db, ready_filter):
+    ready_filter.bloom.add("ghost")  # in the filter but not in the table
+    storage = await get_storage()
+    assert await URLService(db, storage).get_uncached_link("ghost") is None
+    assert ready_filter.false_positives == 1
+    assert await storage.cache.get("ghost") == MISSING
+
+
+async def test_stale_filter_falls_back_to_the_database(client, db, ready_filter):
+    await db.execute(insert(db, URL).values(url="https://example.com/unseen", short_code="unseen1"))
+    await db.commit()
+    assert not ready_filter.might_contain("unseen1")  # e.g. a missed create broadcast
+
+    ready_filter.mark_stale()
+    assert ready_filter.might_contain("unseen1")
+    assert (await client.get("/unseen1")).headers["location"] == "https://example.com/unseen"
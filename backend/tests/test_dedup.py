@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models.url import URL
+from app.services.url_service import url_hash
+
+pytestmark = pytest.mark.anyio
+
+FUTURE = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+
+
+async def _create(client, **fields) -> dict:
+    response = await client.post("/api/v1/shorten", json=fields)
+    assert response.status_code == 201
+    return response.json()
+
+
+async def _url_hash(db, short_code: str) -> bytes | None:
+    return await db.scalar(select(URL.url_hash).where(URL.short_code == short_code))
+
+
+async def test_repeat_of_a_normalised_url_returns_the_existing_link(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_URLS", True)
+    first = await _create(client, url="HTTPS://Example.COM:443/a?q=1")
+    again = await _create(client, url="https://example.com/a?q=1")
+    assert (again["id"], again["short_code"]) == (first["id"], first["short_code"])
+    assert await _url_hash(db, first["short_code"]) == url_hash("https://example.com/a?q=1")
+    assert await db.scalar(select(func.count()).select_from(URL)) == 1
+
+    # Only scheme, host and default port are normalised
+    assert (await _create(client, url="https://example.com/A?q=1"))["short_code"] != first["short_code"]
+
+
+@pytest.mark.parametrize("policy", [
+    {"redirect_status": 302}, {"cache_max_age": 0}, {"expires_at": FUTURE}, {"max_clicks": 3},
+])
+async def test_links_with_policy_or_limits_are_never_shared(client, db, monkeypatch, policy):
+    monkeypatch.setattr(settings, "DEDUP_URLS", True)
+    url = "https://example.com/own"
+    own = await _create(client, url=url, **policy)
+    assert await _url_hash(db, own["short_code"]) is None
+
+    assert (await _create(client, url=url, **policy))["short_code"] != own["short_code"]
+    plain = await _create(client, url=url)
+    assert plain["short_code"] != own["short_code"]
+    assert (await _create(client, url=url))["short_code"] == plain["short_code"]
+
+
+async def test_no_sharing_without_dedup(client, db):
+    first = await _create(client, url="https://example.com/b")
+    assert (await _create(client, url="https://example.com/b"))["short_code"] != first["short_code"]
+    assert await _url_hash(db, first["short_code"]) is None
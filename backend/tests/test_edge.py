@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Run in a fresh interpreter: conftest has already configured a database for this one
+EDGE_NODE = """
+import asyncio
+import sys
+
+import httpx
+
+from app.core.config import settings
+from app.services.cached_link import CachedLink
+from app.services.link_snapshot import SnapshotWriter
+
+writer = SnapshotWriter(settings.SNAPSHOT_PATH)
+writer.add("abc123", CachedLink("https://example.com/edge").encode())
+writer.finish()
+
+from app.edge import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://edge") as client:
+            response = await client.get("/abc123")
+    assert (response.status_code, response.headers["location"]) == (301, "https://example.com/edge"), response
+
+asyncio.run(main())
+loaded = [name for name in ("app.db.session", "app.db.replicas", "app.core.redis") if name in sys.modules]
+assert not loaded, loaded
+"""
+
+
+def test_edge_node_runs_without_database_settings(tmp_path):
+    env = {
+        name: value for name, value in os.environ.items()
+        if not name.startswith(("POSTGRES_", "DATABASE_", "REDIS_", "STORAGE_"))
+    }
+    env.update(PYTHONPATH=str(BACKEND), SNAPSHOT_PATH=str(tmp_path / "links.snap"))
+    result = subprocess.run(
+        [sys.executable, "-c", EDGE_NODE], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,76 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import func, select
+
+from app.db.dialect import insert
+from app.models.click_rollup import ClickRollup
+from app.models.url import URL
+from app.services import embedded_storage
+from app.services.cached_link import CachedLink
+from app.services.embedded_storage import EmbeddedStorage
+
+pytestmark = pytest.mark.anyio
+
+
+async def _access_count(db, short_code: str) -> int:
+    db.expire_all()
+    return await db.scalar(select(URL.access_count).where(URL.short_code == short_code))
+
+
+async def test_failed_flush_keeps_the_clicks(db, monkeypatch):
+    await db.execute(insert(db, URL).values(url="https://example.com/", short_code="emb1"))
+    await db.commit()
+    storage = EmbeddedStorage()
+    await storage.record_clicks(Counter({"emb1": 3}), Counter(), "b1")
+
+    async def fail(db, deltas):
+        # A redirect served while the flush is in flight
+        await storage.record_click("emb1")
+        assert await storage.pending_clicks("emb1") == 4
+        raise RuntimeError("database locked")
+
+    monkeypatch.setattr(embedded_storage, "apply_click_deltas", fail)
+    with pytest.raises(RuntimeError):
+        await storage.flush_clicks(db)
+    monkeypatch.undo()
+
+    assert await storage.pending_clicks("emb1") == 4
+    assert await storage.flush_clicks(db) == 4
+    assert await _access_count(db, "emb1") == 4
+    assert await storage.pending_clicks("emb1") == 0
+    assert await storage.flush_clicks(db) == 0
+
+
+async def test_failed_aggregation_keeps_the_events(db, monkeypatch):
+    storage = EmbeddedStorage()
+    await storage.record_click("emb2", referrer="https://news.example/")
+    await storage.record_click("emb2")
+
+    async def fail(db, counts):
+        raise RuntimeError("database locked")
+
+    monkeypatch.setattr(embedded_storage, "write_rollups", fail)
+    with pytest.raises(RuntimeError):
+        await storage.aggregate_click_events(db)
+    monkeypatch.undo()
+
+    assert await storage.aggregate_click_events(db) == 2
+    assert await db.scalar(select(func.count()).select_from(ClickRollup)) > 0
+    assert await storage.aggregate_click_events(db) == 0
+
+
+async def test_click_quota(redis):
+    storage = EmbeddedStorage()
+    link = CachedLink("https://example.com/", max_clicks=2)
+    await storage.set_quota("emb3", link, used=0)
+    assert [await storage.admit_click("emb3", link) for _ in range(3)] == [True, True, False]
+
+    # Without a quota (after a restart) clicks go through until one is set again
+    await storage.clear_quotas(["emb3"])
+    assert await storage.admit_click("emb3", link)
+    await storage.set_quota("emb3", link, used=2, only_if_missing=True)
+    await storage.set_quota("emb3", link, used=0, only_if_missing=True)
+    assert not await storage.admit_click("emb3", link)
+
+    assert not await storage.admit_click("emb4", CachedLink("https://example.com/", expires=1))
@@ -0,0 +1,97 @@
+import pytest
+
+from app.core.cache_store import HashRing
+from app.core.config import settings
+from app.services.cached_link import _SEP, MISSING, CachedLink, pack, unpack
+from app.services.link_cache import LinkCache
+
+pytestmark = pytest.mark.anyio
+
+LONG_URL = "https://www.example.com/products/widget?utm_source=newsletter&utm_medium=email&utm_campaign=spring" * 3
+
+
+@pytest.mark.parametrize("link", [
+    CachedLink("https://example.com/"),
+    CachedLink("https://example.com/ünïcode?q=%20", 302, 60, 1_700_000_000_000, 1_800_000_000_000, 5),
+    CachedLink("https://example.com/", None, 0, 1, 0, None),
+])
+def test_cached_link_round_trip(link):
+    assert CachedLink.decode(link.encode()) == link
+
+
+def test_cached_link_decodes_older_layouts():
+    assert CachedLink.decode("https://example.com/") == CachedLink("https://example.com/")
+    legacy = _SEP.join(("", "302", "", "1700000000000", "https://example.com/"))
+    assert CachedLink.decode(legacy) == CachedLink("https://example.com/", 302, None, 1_700_000_000_000)
+
+
+@pytest.mark.parametrize("url", ["https://example.com/a\x1fb", "https://example.com/\x1f1\x1f2\x1f"])
+def test_cached_link_keeps_separators_in_the_url(url):
+    link = CachedLink(url, 302, None, 1_700_000_000_000, 0, 3)
+    assert CachedLink.decode(link.encode()) == link
+    legacy = _SEP.join(("", "302", "", "1700000000000", url))
+    assert CachedLink.decode(legacy) == CachedLink(url, 302, None, 1_700_000_000_000)
+
+
+@pytest.mark.parametrize("minimum", [0, 64])
+@pytest.mark.parametrize("value", [MISSING, "https://example.com/", LONG_URL, CachedLink(LONG_URL, 301).encode()])
+def test_pack_round_trip(monkeypatch, minimum, value):
+    monkeypatch.setattr(settings, "CACHE_COMPRESS_MIN_BYTES", minimum)
+    packed = pack(value)
+    assert unpack(packed) == value
+    if not minimum or len(value) < minimum:
+        assert packed == value.encode()
+
+
+def test_pack_compresses_only_when_smaller(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_COMPRESS_MIN_BYTES", 16)
+    assert len(pack(LONG_URL)) < len(LONG_URL) // 2
+    # Nothing to share with the dictionary: the deflate header would make it longer
+    assert pack("mailto:Q7kZp9WmT2xVb4Lc@q.zz") == b"mailto:Q7kZp9WmT2xVb4Lc@q.zz"
+
+
+@pytest.mark.parametrize("minimum", [0, 64])
+@pytest.mark.parametrize("encoding", ["string", "dual", "hash"])
+async def test_link_cache_round_trip(redis, monkeypatch, encoding, minimum):
+    monkeypatch.setattr(settings, "CACHE_ENCODING", encoding)
+    monkeypatch.setattr(settings, "CACHE_COMPRESS_MIN_BYTES", minimum)
+    cache = LinkCache(redis)
+    links = {"enc1": CachedLink("https://example.com/"), "enc2": CachedLink(LONG_URL, 302, 60, 1, 0, 10)}
+    await cache.set_many(links, missing=["enc3"])
+
+    for short_code, link in links.items():
+        assert CachedLink.decode(await cache.get(short_code)) == link
+    assert await cache.get("enc3") == MISSING
+    assert await cache.get("enc4") is None
+    assert await cache.get_many(["enc1", "enc2", "enc3", "enc4"]) == {
+        "enc1": links["enc1"].encode(), "enc2": links["enc2"].encode(), "enc3": MISSING,
+    }
+
+    await cache.invalidate("enc1")
+    assert await cache.get("enc1") == MISSING
+
+
+async def test_hash_mode_reads_string_keys_left_from_string_mode(redis, monkeypatch):
+    link = CachedLink(LONG_URL, 301)
+    monkeypatch.setattr(settings, "CACHE_ENCODING", "string")
+    await LinkCache(redis).set("enc5", link)
+
+    monkeypatch.setattr(settings, "CACHE_ENCODING", "hash")
+    cache = LinkCache(redis)
+    assert CachedLink.decode(await cache.get("enc5")) == link
+    monkeypatch.setattr(settings, "CACHE_STRING_FALLBACK", False)
+    assert await cache.get("enc5") is None
+
+
+def test_hash_ring_moves_few_keys_when_a_shard_is_added():
+    keys = [f"code{i}" for i in range(2000)]
+    before = HashRing(["a", "b", "c"], vnodes=64)
+    after = HashRing(["a", "b", "c", "d"], vnodes=64)
+    owners = [before.owner(key) for key in keys]
+    counts = [owners.count(index) for index in range(3)]
+    assert min(counts) > len(keys) / 3 * 0.7
+
+    moved = [(old, after.owner(key)) for key, old in zip(keys, owners) if after.owner(key) != old]
+    # Only keys taken over by the new shard move, about a quarter of them
+    assert all(new == 3 for _, new in moved)
+    assert len(moved) < len(keys) * 0.4
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.dialect import insert
+from app.models.url import URL
+from app.services.cached_link import MISSING, CachedLink
+from app.services.link_expiry import QUOTA_KEY_PREFIX, admit_click, set_quota, sweep_links
+from app.services.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sweep_removes_expired_and_used_up_links(db, redis, monkeypatch):
+    monkeypatch.setattr(settings, "LINK_SWEEP_BATCH", 1)  # one row per transaction: every loop runs
+    now = datetime.now(timezone.utc)
+    rows = {
+        "expired1": {"expires_at": now - timedelta(minutes=5)},
+        "expired2": {"expires_at": now - timedelta(minutes=1)},
+        "future": {"expires_at": now + timedelta(hours=1)},
+        "usedup": {"max_clicks": 2, "access_count": 2},
+        "clicksleft": {"max_clicks": 2, "access_count": 1},
+        "plain": {},
+    }
+    await db.execute(insert(db, URL).values([
+        {
+            "url": f"https://example.com/{code}", "short_code": code,
+            "access_count": 0, "expires_at": None, "max_clicks": None, **columns,
+        }
+        for code, columns in rows.items()
+    ]))
+    await db.commit()
+    storage = await get_storage()
+    links = {
+        code: CachedLink(f"https://example.com/{code}", max_clicks=columns.get("max_clicks"))
+        for code, columns in rows.items()
+    }
+    await storage.cache.set_many(links)
+    await storage.set_quota("usedup", links["usedup"], used=2)
+
+    assert await sweep_links(db, storage) == 3
+    remaining = set(await db.scalars(select(URL.short_code)))
+    assert remaining == {"future", "clicksleft", "plain"}
+    for code in ("expired1", "expired2", "usedup"):
+        assert await storage.cache.get(code) == MISSING
+    assert await storage.cache.get("plain") == links["plain"].encode()
+    assert not await redis.exists(f"{QUOTA_KEY_PREFIX}usedup")
+
+    assert await sweep_links(db, storage) == 0
+
+
+async def test_quota_admits_max_clicks(redis):
+    expires = int((datetime.now(timezone.utc) + timedelta(hours=1)).timestamp() * 1000)
+    link = CachedLink("https://example.com/", expires=expires, max_clicks=3)
+    await set_quota(redis, "quota1", link, used=1)
+    assert [await admit_click(redis, "quota1", link) for _ in range(3)] == [True, True, False]
+    assert 0 < await redis.pttl(f"{QUOTA_KEY_PREFIX}quota1") <= 3600 * 1000
+
+    # Re-seeding after a cache fill leaves a live quota alone
+    await set_quota(redis, "quota1", link, used=0, only_if_missing=True)
+    assert not await admit_click(redis, "quota1", link)
+
+    assert not await admit_click(redis, "quota2", link._replace(expires=1))
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import delete, update
+
+from app.db.dialect import insert
+from app.models.url import URL
+from app.services.cached_link import MISSING, CachedLink
+from app.services.link_snapshot import (
+    Snapshot, SnapshotStore, SnapshotWriter, delta_path, write_delta, write_snapshot,
+)
+
+
+def _write(path, links: dict[str, str], base_id: bytes | None = None) -> bytes:
+    writer = SnapshotWriter(str(path), base_id=base_id)
+    for short_code, value in links.items():
+        writer.add(short_code, value)
+    writer.finish()
+    return writer.id
+
+
+def test_snapshot_round_trip(tmp_path):
+    links = {f"c{i:05d}": CachedLink(f"https://example.com/{i}", 302 if i % 3 else None).encode() for i in range(5000)}
+    links["ünï"] = CachedLink("https://example.com/ünïcode").encode()
+    snapshot_id = _write(tmp_path / "links.snap", links)
+
+    snapshot = Snapshot(str(tmp_path / "links.snap"))
+    try:
+        assert (snapshot.id, snapshot.base_id, snapshot.count) == (snapshot_id, None, len(links))
+        for short_code, value in links.items():
+            assert snapshot.get(short_code) == value
+        assert snapshot.get("absent") is None
+        assert sorted(code for _, code in snapshot.codes()) == sorted(links)
+    finally:
+        snapshot.close()
+
+
+def test_empty_snapshot(tmp_path):
+    _write(tmp_path / "links.snap", {})
+    snapshot = Snapshot(str(tmp_path / "links.snap"))
+    assert (snapshot.count, snapshot.get("abc"), list(snapshot.codes())) == (0, None, [])
+    snapshot.close()
+
+
+def test_rejects_other_files(tmp_path):
+    (tmp_path / "links.snap").write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        Snapshot(str(tmp_path / "links.snap"))
+
+
+def test_store_applies_the_matching_delta(tmp_path):
+    path = tmp_path / "links.snap"
+    old, new = CachedLink("https://example.com/old").encode(), CachedLink("https://example.com/new").encode()
+    base_id = _write(path, {"keep": old, "change": old, "remove": old})
+    store = SnapshotStore(str(path))
+    assert store.reload()
+    assert not store.reload()
+
+    _write(delta_path(str(path)), {"change": new, "remove": MISSING, "add": new}, base_id=base_id)
+    assert store.reload()
+    assert [store.get(code) for code in ("keep", "change", "remove", "add")] == [old, new, None, new]
+
+    # A new snapshot drops the delta, which no longer applies to it
+    _write(path, {"keep": new})
+    assert store.reload()
+    assert [store.get(code) for code in ("keep", "change", "add")] == [new, None, None]
+
+
+@pytest.mark.anyio
+async def test_delta_from_database(db, tmp_path):
+    path = str(tmp_path / "links.snap")
+    await db.execute(insert(db, URL).values([
+        {"url": f"https://example.com/{name}", "short_code": f"snap{name}", "max_clicks": None} for name in "abc"
+    ] + [{"url": "https://example.com/limited", "short_code": "snapl", "max_clicks": 5}]))
+    await db.commit()
+    assert await write_snapshot(db, path) == 3  # click-limited links stay with the origin
+
+    await db.execute(update(URL).where(URL.short_code == "snapa").values(url="https://example.com/a2"))
+    await db.execute(delete(URL).where(URL.short_code == "snapb"))
+    await db.execute(insert(db, URL).values(url="https://example.com/d", short_code="snapd"))
+    await db.commit()
+    base = Snapshot(path)
+    try:
+        assert await write_delta(db, base, delta_path(path)) == (2, 1)
+    finally:
+        base.close()
+
+    store = SnapshotStore(path)
+    store.reload()
+    urls = {
+        code: value and CachedLink.decode(value).url
+        for code in ("snapa", "snapb", "snapc", "snapd", "snapl") for value in [store.get(code)]
+    }
+    assert urls == {
+        "snapa": "https://example.com/a2", "snapb": None, "snapc": "https://example.com/c",
+        "snapd": "https://example.com/d", "snapl": None,
+    }
@@ -0,0 +1,135 @@
+import base64
+import json
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+from app.db.dialect import insert
+from app.db.session import engine
+from app.models.url import URL, uuid7
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# (code, minutes after START, clicks); list2 and list3 share a timestamp, list4 and list5 a click count
+LINKS = [("list1", 0, 7), ("list2", 1, 3), ("list3", 1, 9), ("list4", 2, 3), ("list5", 3, 0), ("list6", 4, 12)]
+
+
+@pytest.fixture
+async def links(db):
+    rows = [
+        {
+            "id": uuid7(), "url": f"https://example.com/{code}", "short_code": code, "access_count": clicks,
+            "created_at": START + timedelta(minutes=minutes), "updated_at": START,
+        }
+        for code, minutes, clicks in LINKS
+    ]
+    await db.execute(insert(db, URL).values(rows))
+    await db.commit()
+    return {row["short_code"]: row for row in rows}
+
+
+async def _walk(client, **params) -> list[str]:
+    codes, cursor = [], None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/shorten", params={**params, "limit": 2})
+        assert response.status_code == 200
+        page = response.json()
+        codes += [item["short_code"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return codes
+
+
+@pytest.mark.parametrize("sort", ["created_at", "access_count"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_pages_cover_every_link_once(client, links, sort, order):
+    expected = sorted(links.values(), key=lambda row: (row[sort], row["id"]), reverse=order == "desc")
+    assert await _walk(client, sort=sort, order=order) == [row["short_code"] for row in expected]
+
+
+async def test_filters(client, links, db):
+    await db.execute(insert(db, URL).values(url="https://other.example/50%_off", short_code="list7"))
+    await db.commit()
+    assert await _walk(client, min_clicks=7, order="asc") == ["list1", "list3", "list6"]
+    window = {"created_from": START + timedelta(minutes=2), "created_to": START + timedelta(minutes=4)}
+    assert await _walk(client, **{name: value.isoformat() for name, value in window.items()}) == ["list5", "list4"]
+    assert await _walk(client, url_prefix="https://example.com/list1") == ["list1"]
+    # LIKE wildcards in the prefix are taken literally
+    assert await _walk(client, url_prefix="https://other.example/50%") == ["list7"]
+    assert await _walk(client, url_prefix="https://other.example/5%") == []
+
+
+@pytest.mark.parametrize("sort", ["created_at", "access_count"])
+async def test_every_sort_key_pages_through_an_index(client, links, db, sort):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "ORDER BY" in statement:
+            statements.append((statement, parameters))
+
+    first = (await client.get("/api/v1/shorten", params={"sort": sort, "limit": 2})).json()
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        response = await client.get("/api/v1/shorten", params={"sort": sort, "limit": 2, "cursor": first["next_cursor"]})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    (statement, parameters), = statements
+
+    conn = await db.connection()
+    plan = " ".join(
+        row[-1] for row in (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+    )
+    assert f"ix_urls_{sort}_id" in plan
+    assert "TEMP B-TREE" not in plan  # no sort of the matching rows
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("sort,cursor", [
+    ("created_at", "not-a-cursor"),
+    ("created_at", _cursor(["2020-01-01T00:00:00+00:00", 5])),
+    ("created_at", _cursor([5, "0190a4b2-7c3d-7e4f-8a1b-2c3d4e5f6a7b"])),
+    ("access_count", _cursor([1.5, "0190a4b2-7c3d-7e4f-8a1b-2c3d4e5f6a7b"])),
+    ("access_count", _cursor([True, "0190a4b2-7c3d-7e4f-8a1b-2c3d4e5f6a7b"])),
+    ("access_count", _cursor({"a": 1, "b": 2})),
+    ("access_count", _cursor(7)),
+])
+async def test_rejects_bad_cursors(client, sort, cursor):
+    response = await client.get("/api/v1/shorten", params={"sort": sort, "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+async def test_pages_of_links_created_through_the_api(client):
+    # created_at comes from the column default here, not from a bound value
+    created = []
+    for index in range(3):
+        response = await client.post("/api/v1/shorten", json={"url": f"https://example.com/api{index}"})
+        created.append(response.json()["short_code"])
+    assert sorted(await _walk(client)) == sorted(created)
+
+
+def test_schema_defaults_match_bound_timestamps():
+    # A fresh interpreter that builds the schema before importing any service module
+    script = (
+        "from sqlalchemy.dialects import sqlite\n"
+        "from sqlalchemy.schema import CreateTable\n"
+        "from app.db.base import Base\n"
+        "print(CreateTable(Base.metadata.tables['urls']).compile(dialect=sqlite.dialect()))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "CURRENT_TIMESTAMP" not in result.stdout
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.core import local_cache
+from app.core.config import settings
+from app.core.local_cache import LocalCache
+from app.services.cached_link import CachedLink
+from app.services.code_filter import known_codes
+from app.services.link_cache import CREATED_CHANNEL, INVALIDATION_CHANNEL, LinkCache, local_links, run_invalidation_listener
+
+pytestmark = pytest.mark.anyio
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(local_cache.time, "monotonic", clock)
+    cache = LocalCache(max_entries=10, max_bytes=1 << 20, ttl=5)
+    cache.set("a", "https://example.com/")
+    clock.now += 4.9
+    assert cache.get("a") == "https://example.com/"
+    clock.now += 0.2
+    assert cache.get("a") is None
+    assert (cache.expirations, len(cache), cache.size_bytes) == (1, 0, 0)
+
+
+def test_bounded_by_entries_and_bytes():
+    cache = LocalCache(max_entries=2, max_bytes=1 << 20, ttl=60)
+    for key in "abc":
+        cache.set(key, key)
+    assert (cache.get("a"), cache.get("c"), cache.evictions) == (None, "c", 1)
+
+    small = LocalCache(max_entries=100, max_bytes=500, ttl=60)
+    for index in range(20):
+        small.set(f"k{index}", "x" * 50)
+    assert 0 < small.size_bytes <= 500 and len(small) < 20
+    small.set("huge", "x" * 1000)  # larger than the whole budget: not stored
+    assert small.get("huge") is None
+
+
+def test_fill_from_before_an_invalidation_is_dropped():
+    cache = LocalCache(max_entries=10, max_bytes=1 << 20, ttl=60)
+    generation = cache.generation
+    cache.invalidate("a")  # arrives while the slower tier is being read
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    cache.set("a", "fresh", cache.generation)
+    assert cache.get("a") == "fresh"
+
+
+@pytest.fixture
+def l1(monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_CACHE_ENABLED", True)
+    local_links.clear()
+    yield local_links
+    local_links.clear()
+
+
+async def test_link_cache_skips_l1_fill_raced_by_an_invalidation(redis, l1, monkeypatch):
+    cache = LinkCache(redis)
+    await cache.set("race1", CachedLink("https://example.com/old"))
+    fetch = LinkCache._fetch
+
+    async def invalidated_meanwhile(self, shard, short_code):
+        result = await fetch(self, shard, short_code)
+        l1.invalidate(short_code)
+        return result
+
+    with monkeypatch.context() as patch:
+        patch.setattr(LinkCache, "_fetch", invalidated_meanwhile)
+        assert CachedLink.decode(await cache.get("race1")).url == "https://example.com/old"
+        assert l1.get("race1") is None
+
+    await cache.get("race1")
+    assert l1.get("race1") is not None
+
+
+async def test_other_workers_invalidations_evict_entries(redis, l1):
+    listener = asyncio.create_task(run_invalidation_listener())
+    try:
+        while (await redis.pubsub_numsub(INVALIDATION_CHANNEL))[0][1] == 0:
+            await asyncio.sleep(0.01)
+        for code in ("sub1", "sub2", "sub3"):
+            l1.set(code, CachedLink(f"https://example.com/{code}").encode())
+
+        # As published by another worker's update and bulk create
+        await redis.publish(INVALIDATION_CHANNEL, "sub1")
+        await redis.publish(CREATED_CHANNEL, "sub2 new1")
+        for _ in range(100):
+            if l1.get("sub1") is None and l1.get("sub2") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert l1.get("sub1") is None and l1.get("sub2") is None
+        assert l1.get("sub3") is not None
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        known_codes.mark_stale()
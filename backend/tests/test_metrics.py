@@ -0,0 +1,32 @@
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+pytestmark = pytest.mark.anyio
+
+
+async def _requests(client) -> dict[tuple[str, str, str], float]:
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    return {
+        (sample.labels["method"], sample.labels["route"], sample.labels["status"]): sample.value
+        for family in text_string_to_metric_families(response.text) if family.name == "http_requests"
+        for sample in family.samples if sample.name == "http_requests_total"
+    }
+
+
+async def test_requests_are_labelled_by_route_template(client):
+    code = (await client.post("/api/v1/shorten", json={"url": "https://example.com/metrics"})).json()["short_code"]
+    before = await _requests(client)
+    for _ in range(2):
+        assert (await client.get(f"/{code}")).status_code == 301
+    assert (await client.get("/nosuchcode")).status_code == 404
+    assert (await client.get("/no/such/route")).status_code == 404
+    after = await _requests(client)
+
+    def added(key) -> float:
+        return after.get(key, 0) - before.get(key, 0)
+
+    assert added(("GET", "/{short_code}", "301")) == 2
+    assert added(("GET", "/{short_code}", "404")) == 1
+    assert added(("GET", "unmatched", "404")) == 1
+    assert not any(code in route or "nosuchcode" in route for _, route, _ in after)
@@ -0,0 +1,55 @@
+import fakeredis
+import pytest
+
+from app.core.config import settings
+from app.core.rate_limit import LocalRateLimiter, Rate, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+def test_parse():
+    assert Rate.parse("10/minute") == Rate(10, 60)
+    assert Rate.parse("100 / days") == Rate(100, 86400)
+    assert Rate(4, 1).interval_ms == 250
+
+
+async def test_limit_is_shared_by_workers(redis):
+    rate = Rate(3, 60)
+    workers = [RateLimiter(), RateLimiter()]
+    results = [await workers[i % 2].hit(redis, "rl:shared", rate) for i in range(4)]
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results[:3]] == [2, 1, 0]
+
+    denied = results[-1].headers()
+    assert denied["X-RateLimit-Remaining"] == "0"
+    assert 1 <= int(denied["Retry-After"]) <= 20
+    # Another client has its own bucket
+    assert (await workers[0].hit(redis, "rl:other", rate)).allowed
+
+
+async def test_leases_never_exceed_the_limit(redis, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_LOCAL_BATCH", 4)
+    rate = Rate(10, 60)
+    first, second = RateLimiter(), RateLimiter()
+    # The first worker leases 4 tokens; the second takes the other 6 (4 + 2 left over, one at a time)
+    assert (await first.hit(redis, "rl:lease", rate)).allowed
+    allowed = [(await second.hit(redis, "rl:lease", rate)).allowed for _ in range(8)]
+    assert allowed == [True] * 6 + [False] * 2
+    # The first still serves the rest of its lease from memory
+    allowed = [(await first.hit(redis, "rl:lease", rate)).allowed for _ in range(4)]
+    assert allowed == [True] * 3 + [False]
+
+
+async def test_fails_open_without_redis():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    assert await RateLimiter().hit(client, "rl:down", Rate(1, 60)) is None
+    await client.aclose()
+
+
+def test_local_limiter_matches():
+    limiter, rate = LocalRateLimiter(), Rate(3, 60)
+    results = [limiter.hit("rl:local", rate) for _ in range(4)]
+    assert [(result.allowed, result.remaining) for result in results] == [(True, 2), (True, 1), (True, 0), (False, 0)]
+    assert results[-1].retry_after_ms > 0
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app.api.fast_redirect import FastRedirectMiddleware
+
+pytestmark = pytest.mark.anyio
+
+POLICY_HEADERS = ("location", "cache-control", "etag", "last-modified", "content-type")
+
+
+def _fast_client() -> httpx.AsyncClient:
+    # The suite runs with REDIRECT_FAST_PATH off, so the middleware is put in front here
+    from main import app
+
+    fast = FastRedirectMiddleware(app)
+
+    async def serve(scope, receive, send):
+        scope["app"] = app  # what Starlette sets before its middleware stack runs
+        await fast(scope, receive, send)
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=serve), base_url="http://test")
+
+
+@pytest.fixture(params=["routed", "fast"])
+async def redirects(request, client):
+    if request.param == "routed":
+        yield client
+        return
+    async with _fast_client() as fast_client:
+        yield fast_client
+
+
+async def _shorten(client, **fields) -> str:
+    response = await client.post("/api/v1/shorten", json=fields)
+    assert response.status_code == 201
+    return response.json()["short_code"]
+
+
+def _policy(response: httpx.Response) -> dict:
+    return {name: response.headers.get(name) for name in POLICY_HEADERS}
+
+
+async def test_redirect_headers(client, redirects):
+    plain = await _shorten(client, url="https://example.com/a b")
+    response = await redirects.get(f"/{plain}")
+    assert response.status_code == 301
+    policy = _policy(response)
+    assert policy["location"] == "https://example.com/a%20b"
+    assert policy["cache-control"] == "public, max-age=300"
+    assert policy["etag"] and policy["last-modified"]
+
+    expiring = await _shorten(
+        client, url="https://example.com/soon", redirect_status=307,
+        expires_at=(datetime.now(timezone.utc) + timedelta(seconds=90)).isoformat(),
+    )
+    response = await redirects.get(f"/{expiring}")
+    assert response.status_code == 307
+    max_age = int(response.headers["cache-control"].removeprefix("public, max-age="))
+    assert 0 < max_age <= 90  # no longer than the link has left
+
+    limited = await _shorten(client, url="https://example.com/limited", max_clicks=1)
+    response = await redirects.get(f"/{limited}")
+    assert response.headers["cache-control"] == "no-store"
+    assert (await redirects.get(f"/{limited}")).status_code == 410
+    assert (await redirects.get("/nosuchcode")).status_code == 404
+
+
+async def test_conditional_requests(client, redirects):
+    code = await _shorten(client, url="https://example.com/cdn")
+    first = await redirects.get(f"/{code}")
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+    assert (await redirects.get(f"/{code}", headers={"if-none-match": f"W/{etag}"})).status_code == 304
+    assert (await redirects.get(f"/{code}", headers={"if-modified-since": last_modified})).status_code == 304
+    assert (await redirects.get(f"/{code}", headers={"if-none-match": '"0"'})).status_code == 301
+
+
+async def test_fast_path_matches_the_route(client):
+    code = await _shorten(client, url="https://example.com/same?q=1&r=ü", redirect_status=308, cache_max_age=0)
+    async with _fast_client() as fast_client:
+        routed, served = await client.get(f"/{code}"), await fast_client.get(f"/{code}")
+        assert (served.status_code, _policy(served)) == (routed.status_code, _policy(routed))
+        # Reserved single-segment paths still reach their routes
+        assert (await fast_client.get("/health")).status_code == 200
+
+
+@pytest.mark.parametrize("url", ["https://example.com/a\x1fb", "https://example.com/\n", "https://example.com/\x7f"])
+async def test_rejects_control_characters(client, url):
+    assert (await client.post("/api/v1/shorten", json={"url": url})).status_code == 422
+    code = await _shorten(client, url="https://example.com/")
+    assert (await client.put(f"/api/v1/shorten/{code}", json={"url": url})).status_code == 422
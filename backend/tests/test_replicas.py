@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.core.config import settings
+from app.db import replicas
+from app.db.replicas import read_router
+from app.models.url import URL
+from app.services.code_filter import known_codes, run_code_filter_rebuilder
+from app.services.storage import get_storage
+from app.services.url_service import URLService
+
+pytestmark = pytest.mark.anyio
+
+
+async def _shorten(client, url: str) -> str:
+    response = await client.post("/api/v1/shorten", json={"url": url})
+    assert response.status_code == 201
+    return response.json()["short_code"]
+
+
+async def test_code_filter_is_rebuilt_from_the_primary(client, replica):
+    code = await _shorten(client, "https://example.com/fresh")  # not on the replica yet
+    known_codes.mark_stale()
+    rebuilder = asyncio.create_task(run_code_filter_rebuilder())
+    try:
+        while not known_codes.ready:
+            await asyncio.sleep(0.01)
+    finally:
+        rebuilder.cancel()
+        await asyncio.gather(rebuilder, return_exceptions=True)
+    assert known_codes.might_contain(code)
+    known_codes.mark_stale()
+
+
+async def _lookup(db, short_code: str):
+    read_db = read_router.session()
+    try:
+        return read_db, await URLService(db, await get_storage(), read_db).get_url_by_code_read(short_code)
+    finally:
+        await read_db.close()
+
+
+async def test_reads_go_to_a_healthy_replica(db, replica):
+    async with replica.engine.begin() as conn:
+        await conn.execute(insert(URL).values(url="https://example.com/replica", short_code="onreplica"))
+    read_db, row = await _lookup(db, "onreplica")
+    assert read_db.info["replica"] is replica
+    assert row.url == "https://example.com/replica"  # served by the replica; the primary has no such row
+
+
+async def test_a_miss_on_the_replica_is_retried_on_the_primary(client, db, replica):
+    code = await _shorten(client, "https://example.com/lagging")
+    _, row = await _lookup(db, code)
+    assert row.url == "https://example.com/lagging"
+    assert replica.healthy  # a miss is not a failure
+
+
+async def test_a_failing_replica_is_benched(client, db, replica, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICA_FAILURE_COOLDOWN", 30)
+    code = await _shorten(client, "https://example.com/failover")
+    async with replica.engine.begin() as conn:
+        await conn.exec_driver_sql("DROP TABLE urls")
+
+    _, row = await _lookup(db, code)
+    assert row.url == "https://example.com/failover"
+    assert not replica.healthy
+    read_db, _ = await _lookup(db, code)
+    assert "replica" not in read_db.info  # the primary until the cooldown ends
+
+    replica.down_until = time.monotonic()
+    assert replica.healthy
+
+
+async def test_lagging_replicas_are_skipped(replica, monkeypatch):
+    monkeypatch.setattr(replicas, "LAG_QUERY", text("SELECT 12.5"))
+    await read_router.check_lag()
+    assert (replica.lag, replica.lagging) == (12.5, True)
+    assert "replica" not in read_router.session().info
+
+    monkeypatch.setattr(replicas, "LAG_QUERY", text("SELECT 0"))
+    await read_router.check_lag()
+    assert read_router.session().info["replica"] is replica
+
+    # A failed lag check benches the replica like a failed query
+    monkeypatch.setattr(replicas, "LAG_QUERY", text("SELECT pg_last_wal_replay_lsn()"))
+    await read_router.check_lag()
+    assert replica.lag is None and not replica.healthy
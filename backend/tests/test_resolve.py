@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.cache_store import string_key
+from app.core.config import settings
+from app.services.cached_link import MISSING, CachedLink
+from app.services.storage import get_storage
+
+pytestmark = pytest.mark.anyio
+
+
+async def _shorten(client, **fields) -> str:
+    response = await client.post("/api/v1/shorten", json=fields)
+    assert response.status_code == 201
+    return response.json()["short_code"]
+
+
+async def test_resolve_keeps_request_order(client, redis):
+    live = await _shorten(client, url="https://example.com/live")
+    expired = await _shorten(
+        client, url="https://example.com/expired",
+        expires_at=(datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat(),
+    )
+    await redis.delete(string_key(live))  # one code from the database, one from the cache
+
+    body = {"short_codes": [live, "nosuchcode", expired, live]}
+    for _ in range(2):
+        response = await client.post("/api/v1/shorten/resolve", json=body)
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"short_code": live, "url": "https://example.com/live", "error": None},
+            {"short_code": "nosuchcode", "url": None, "error": "not_found"},
+            {"short_code": expired, "url": None, "error": "expired"},
+            {"short_code": live, "url": "https://example.com/live", "error": None},
+        ]
+    storage = await get_storage()
+    assert CachedLink.decode(await storage.cache.get(live)).url == "https://example.com/live"
+    assert await storage.cache.get("nosuchcode") == MISSING
+
+
+async def test_resolve_limits_the_batch(client, monkeypatch):
+    monkeypatch.setattr(settings, "RESOLVE_MAX_CODES", 2)
+    response = await client.post("/api/v1/shorten/resolve", json={"short_codes": ["a", "b", "c"]})
+    assert response.status_code == 413
+    assert (await client.post("/api/v1/shorten/resolve", json={"short_codes": []})).status_code == 422
@@ -0,0 +1,18 @@
+import uvicorn
+
+from app import server
+
+
+def _run_config(monkeypatch) -> uvicorn.Config:
+    captured = {}
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: captured.update(kwargs, app=app))
+    server.main()
+    return uvicorn.Config(**captured)
+
+
+def test_forwarded_headers_only_trusted_from_configured_proxies(monkeypatch):
+    monkeypatch.delenv("FORWARDED_ALLOW_IPS", raising=False)
+    assert "*" not in _run_config(monkeypatch).forwarded_allow_ips
+
+    monkeypatch.setenv("FORWARDED_ALLOW_IPS", "10.0.0.5")
+    assert _run_config(monkeypatch).forwarded_allow_ips == "10.0.0.5"
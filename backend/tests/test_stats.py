@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def _create(client) -> str:
+    response = await client.post("/api/v1/shorten", json={"url": "https://example.com/stats"})
+    return response.json()["short_code"]
+
+
+async def test_naive_from_without_to(client):
+    code = await _create(client)
+    start = (datetime.now(timezone.utc) - timedelta(minutes=30)).replace(tzinfo=None)
+    response = await client.get(
+        f"/api/v1/shorten/{code}/stats", params={"granularity": "minute", "from": start.isoformat()}
+    )
+    assert response.status_code == 200
+    assert response.json()["granularity"] == "minute"
+
+
+async def test_mixed_naive_and_aware_bounds(client):
+    code = await _create(client)
+    response = await client.get(f"/api/v1/shorten/{code}/stats", params={
+        "granularity": "hour", "from": "2026-01-01T00:00:00", "to": "2026-01-02T00:00:00+02:00",
+    })
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("params", [
+    {"from": "2026-01-02T00:00:00", "to": "2026-01-01T00:00:00+00:00"},
+    {"from": "2026-01-01T02:00:00+02:00", "to": "2026-01-01T00:00:00"},
+    {"to": "0001-01-01T00:00:00"},
+    {"from": "2025-01-01T00:00:00", "to": "2026-01-01T00:00:00"},
+])
+async def test_invalid_ranges_are_400(client, params):
+    code = await _create(client)
+    response = await client.get(f"/api/v1/shorten/{code}/stats", params={"granularity": "minute", **params})
+    assert response.status_code == 400
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.models.url import URL
+
+pytestmark = pytest.mark.anyio
+
+
+async def _import(client, records: list[dict]) -> dict:
+    body = "".join(json.dumps(record) + "\n" for record in records)
+    response = await client.post("/api/v1/import", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    return json.loads(response.text.splitlines()[-1])
+
+
+async def _shorten(client, url: str) -> str:
+    response = await client.post("/api/v1/shorten", json={"url": url})
+    assert response.status_code == 201
+    return response.json()["short_code"]
+
+
+async def test_imported_links_are_shared_by_dedup(client, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_URLS", True)
+    totals = await _import(client, [
+        {"short_code": "imp1", "url": "HTTPS://Example.com:443/a"},
+        {"short_code": "imp2", "url": "https://example.com/a"},
+        {"short_code": "imp3", "url": "https://example.com/b", "max_clicks": 3},
+    ])
+    assert (totals["imported"], totals["skipped"]) == (3, 0)
+
+    # Same normalisation as create_short_url; the repeat keeps its own code
+    assert await _shorten(client, "https://example.com/a") == "imp1"
+    assert await _shorten(client, "https://example.com/b") != "imp3"
+
+
+async def test_import_keeps_rows_whose_url_is_already_shared(client, monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_URLS", True)
+    existing = await _shorten(client, "https://example.com/c")
+    totals = await _import(client, [{"short_code": "imp4", "url": "https://example.com/c"}])
+    assert (totals["imported"], totals["skipped"]) == (1, 0)
+
+    assert await _shorten(client, "https://example.com/c") == existing
+    assert (await client.get("/imp4")).headers["location"] == "https://example.com/c"
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+@pytest.mark.parametrize("compress", [False, True])
+async def test_export_import_round_trip(client, redis, db, monkeypatch, fmt, compress):
+    monkeypatch.setattr(settings, "EXPORT_CHUNK", 2)
+    monkeypatch.setattr(settings, "IMPORT_CHUNK", 2)
+    await _import(client, [
+        {"short_code": "rt1", "url": "https://example.com/a,b\"c", "access_count": 4, "created_at": "2026-01-01T00:00:00Z"},
+        {"short_code": "rt2", "url": "https://example.com/ünï", "redirect_status": 302, "cache_max_age": 60},
+        {"short_code": "rt3", "url": "https://example.com/x", "expires_at": "2030-01-01T00:00:00+00:00", "max_clicks": 9},
+    ])
+    response = await client.get("/api/v1/export", params={"format": fmt, "gzip": compress})
+    assert response.status_code == 200
+    exported = response.content
+    before = (await client.get("/api/v1/shorten", params={"order": "asc"})).json()["items"]
+
+    await db.execute(delete(URL))
+    await db.commit()
+    await redis.flushall()
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    response = await client.post("/api/v1/import", content=exported, headers={"content-type": content_type})
+    totals = json.loads(response.text.splitlines()[-1])
+    assert (totals["read"], totals["imported"], totals["invalid"]) == (3, 3, 0)
+
+    after = (await client.get("/api/v1/shorten", params={"order": "asc"})).json()["items"]
+    assert [{**item, "id": None} for item in after] == [{**item, "id": None} for item in before]
+    assert (await client.get("/rt2")).status_code == 302
+
+
+async def test_import_skips_taken_codes_and_counts_bad_lines(client):
+    await _import(client, [{"short_code": "tk1", "url": "https://example.com/first"}])
+    body = '{"short_code": "tk1", "url": "https://example.com/second"}\nnot json\n{"url": "https://example.com/nocode"}\n'
+    response = await client.post("/api/v1/import", content=body, headers={"content-type": "application/x-ndjson"})
+    totals = json.loads(response.text.splitlines()[-1])
+    assert (totals["read"], totals["imported"], totals["skipped"], totals["invalid"]) == (3, 0, 1, 2)
+    assert (await client.get("/tk1")).headers["location"] == "https://example.com/first"
@@ -1,6 +1,8 @@
 import requests
 import time
 import sys
+import json
+from datetime import datetime, timedelta, timezone
 
 # Configuration
 BASE_URL = "http://localhost:8000"
@@ -71,6 +73,28 @@ def test_stats(short_code):
     except Exception as e:
         print(f"❌ Failed: {e}")
 
+def test_stats_granularity(short_code):
+    print(f"\n[13] Testing Stats Timeseries for '{short_code}'...")
+    try:
+        for granularity in ("minute", "hour", "day"):
+            response = requests.get(f"{API_URL}/{short_code}/stats", params={"granularity": granularity})
+            response.raise_for_status()
+            data = response.json()
+            if data["granularity"] != granularity or data["timeseries"] is None:
+                print(f"❌ Failed: No {granularity} timeseries in {data}")
+                return
+        clicks = sum(bucket["clicks"] for bucket in data["timeseries"])
+        print(f"✅ Success: minute/hour/day timeseries returned ({clicks} clicks rolled up so far)")
+
+        inverted = {"granularity": "minute", "from": "2026-01-02T00:00:00", "to": "2026-01-01T00:00:00"}
+        response = requests.get(f"{API_URL}/{short_code}/stats", params=inverted)
+        if response.status_code == 400:
+            print("✅ Success: Inverted range returns 400")
+        else:
+            print(f"❌ Failed: Inverted range returned {response.status_code}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+
 def test_update(short_code):
     print(f"\n[6] Testing Update for '{short_code}'...")
     new_url = "https://www.example.com"
@@ -111,6 +135,104 @@ def test_delete(short_code):
     except Exception as e:
         print(f"❌ Failed: {e}")
 
+def test_expiry_and_click_limit():
+    print("\n[8] Testing Expiry and Click Limits...")
+    expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    try:
+        response = requests.post(API_URL, json={"url": "https://www.example.com/expired", "expires_at": expired})
+        response.raise_for_status()
+        check_resp = requests.get(f"{REDIRECT_URL}/{response.json()['short_code']}", allow_redirects=False)
+        if check_resp.status_code == 410:
+            print("✅ Success: Expired link returns 410")
+        else:
+            print(f"❌ Failed: Expired link returned {check_resp.status_code}")
+
+        response = requests.post(API_URL, json={"url": "https://www.example.com/once", "max_clicks": 1})
+        response.raise_for_status()
+        code = response.json()['short_code']
+        statuses = [requests.get(f"{REDIRECT_URL}/{code}", allow_redirects=False).status_code for _ in range(2)]
+        if statuses == [301, 410]:
+            print("✅ Success: Link with max_clicks=1 redirects once, then returns 410")
+        else:
+            print(f"❌ Failed: Expected [301, 410], got {statuses}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+
+def test_bulk_create():
+    print("\n[9] Testing Bulk Create...")
+    payload = [{"url": "https://www.example.com/a"}, {"url": "https://www.example.com/c", "max_clicks": 0}, {"url": "https://www.example.com/b"}]
+    try:
+        response = requests.post(f"{API_URL}/bulk", json=payload)
+        response.raise_for_status()
+        lines = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"])
+        created = [line["result"]["short_code"] for line in lines if line["result"]]
+        if len(lines) == 3 and len(created) == 2 and lines[1]["error"]:
+            print(f"✅ Success: Created {created}, rejected item 1 ({lines[1]['error'][:40]})")
+            return created
+        else:
+            print(f"❌ Failed: Unexpected results {lines}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+    return None
+
+def test_resolve(short_codes):
+    print(f"\n[10] Testing Batch Resolve for {short_codes}...")
+    payload = {"short_codes": short_codes + ["doesnotexist"]}
+    try:
+        response = requests.post(f"{API_URL}/resolve", json=payload)
+        response.raise_for_status()
+        results = response.json()["results"]
+        if [r["short_code"] for r in results] == payload["short_codes"] and all(r["url"] for r in results[:-1]) \
+                and results[-1]["error"] == "not_found":
+            print(f"✅ Success: Resolved {len(results) - 1} codes in order, unknown code is not_found")
+        else:
+            print(f"❌ Failed: Unexpected results {results}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+
+def test_list():
+    print("\n[11] Testing Paginated Listing...")
+    try:
+        response = requests.get(API_URL, params={"limit": 1})
+        response.raise_for_status()
+        first = response.json()
+        response = requests.get(API_URL, params={"limit": 1, "cursor": first["next_cursor"]})
+        response.raise_for_status()
+        second = response.json()
+        codes = [page["items"][0]["short_code"] for page in (first, second)]
+        if codes[0] != codes[1]:
+            print(f"✅ Success: Pages 1 and 2 hold {codes}")
+        else:
+            print(f"❌ Failed: Second page repeated {codes[0]}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+
+def test_export_import():
+    print("\n[12] Testing Export / Import...")
+    new_code = f"imported{int(time.time())}"
+    try:
+        response = requests.get(f"{BASE_URL}/api/v1/export", params={"format": "ndjson"})
+        response.raise_for_status()
+        exported = response.content
+        body = exported + json.dumps({"short_code": new_code, "url": "https://www.example.com/imported"}).encode() + b"\n"
+        response = requests.post(
+            f"{BASE_URL}/api/v1/import", data=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        response.raise_for_status()
+        totals = json.loads(response.text.splitlines()[-1])
+        exported_rows = len(exported.splitlines())
+        if totals["imported"] == 1 and totals["skipped"] == exported_rows:
+            print(f"✅ Success: Re-import skipped {exported_rows} existing codes and added '{new_code}'")
+        else:
+            print(f"❌ Failed: Unexpected totals {totals}")
+        check_resp = requests.get(f"{API_URL}/{new_code}")
+        if check_resp.status_code == 200:
+            print("✅ Success: Imported link has metadata")
+        else:
+            print(f"❌ Failed: Imported link returned {check_resp.status_code}")
+    except Exception as e:
+        print(f"❌ Failed: {e}")
+
 if __name__ == "__main__":
     print("🚀 Starting API Verification Verification...")
     print("Ensure Docker containers are running (docker-compose up)")
@@ -122,8 +244,15 @@ if __name__ == "__main__":
         test_get_metadata(code)
         test_redirect(code)
         test_stats(code) # Should be at least 1
+        test_stats_granularity(code)
         test_update(code)
         test_delete(code)
+        test_expiry_and_click_limit()
+        bulk_codes = test_bulk_create()
+        if bulk_codes:
+            test_resolve(bulk_codes)
+        test_list()
+        test_export_import()
         
         # Run rate limiting LAST so we don't get 429 blocks for previous functional tests
         test_rate_limiting(code)